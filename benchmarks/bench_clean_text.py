@@ -0,0 +1,99 @@
+import argparse
+import html
+import json
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from parser_hh_token import HHDataParser
+from corpus import synthetic_description, configure_logging
+
+
+def legacy_clean_text(text):
+    '''
+    Исходная реализация HHDataParser.clean_text (нескомпилированные шаблоны, без декодирования HTML-сущностей).
+    '''
+    clean_text = re.sub('<.*?>', '', text)
+    clean_text = re.sub(r'[^\w\s,^a-zA-Zа-яА-Я]', ' ', clean_text)
+    return clean_text
+
+
+def legacy_clean_text_unescaped(text):
+    '''
+    Исходная реализация с декодированием HTML-сущностей: тот же объем работы, что у clean_text.
+    '''
+    clean_text = re.sub('<.*?>', '', text)
+    clean_text = html.unescape(clean_text)
+    clean_text = re.sub(r'[^\w\s,^a-zA-Zа-яА-Я]', ' ', clean_text)
+    return clean_text
+
+
+def load_corpus(folder, limit):
+    '''
+    Загружает описания из JSON-файлов вакансий (например, ./docs/vacancies).
+    '''
+    texts = []
+    for filename in os.listdir(folder):
+        if filename.endswith('.json'):
+            with open(os.path.join(folder, filename), encoding='utf-8-sig') as f:
+                description = json.load(f).get('description')
+            if description:
+                texts.append(description)
+            if len(texts) >= limit:
+                break
+    return texts
+
+
+def measure(func, repeat):
+    '''
+    Возвращает лучшее время выполнения func из repeat запусков.
+    '''
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description='Сравнение скорости очистки описаний вакансий')
+    arg_parser.add_argument('--folder', help='Папка с JSON-файлами вакансий (по умолчанию - синтетический корпус)')
+    arg_parser.add_argument('--count', type=int, default=20000, help='Количество описаний')
+    arg_parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Количество процессов для clean_texts')
+    arg_parser.add_argument('--repeat', type=int, default=3, help='Количество повторов каждого замера')
+    arg_parser.add_argument('--log-file', help='Файл лога парсера (по умолчанию - во временной папке)')
+    args = arg_parser.parse_args()
+    configure_logging(args.log_file)
+
+    if args.folder:
+        corpus = load_corpus(args.folder, args.count)
+    else:
+        rng = random.Random(42)
+        corpus = [synthetic_description(rng) for _ in range(args.count)]
+
+    parser = HHDataParser()
+    size_mb = sum(len(text) for text in corpus) / 2 ** 20
+    print(f'Корпус: {len(corpus)} описаний, {size_mb:.1f} МБ текста')
+
+    # Исходная реализация превращает HTML-сущности в мусорные слова (&quot; -> " quot ")
+    entities = sum(1 for text in corpus if re.search(r'\b(quot|nbsp|laquo|raquo|mdash|ndash|amp)\b',
+                                                     legacy_clean_text(text)))
+    print(f'Описаний с недекодированными HTML-сущностями в исходной реализации: {entities}')
+
+    results = [
+        ('legacy clean_text (re.sub)', measure(lambda: [legacy_clean_text(text) for text in corpus], args.repeat)),
+        ('legacy clean_text + html.unescape', measure(lambda: [legacy_clean_text_unescaped(text) for text in corpus],
+                                                      args.repeat)),
+        ('clean_texts (один процесс)', measure(lambda: parser.clean_texts(corpus), args.repeat)),
+        (f'clean_texts (процессов: {args.workers})', measure(lambda: parser.clean_texts(corpus, workers=args.workers),
+                                                             args.repeat)),
+    ]
+
+    baseline = results[0][1]
+    for name, seconds in results:
+        print(f'{name:45} {seconds:8.3f} с  {len(corpus) / seconds:10.0f} описаний/с  x{baseline / seconds:.2f}')
@@ -0,0 +1,112 @@
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from parser_hh_token import (HHHttpClient, CrawlMetrics, OAuthTokenManager, HHDataFetcher, AdaptiveRateLimiter,
+                             RetryPolicy)
+from mock_hh_api import MockHHApi
+from corpus import configure_logging
+
+
+def make_fetcher(api, args, metrics):
+    '''
+    Создает HHDataFetcher, направленный на локальный сервер api, с токеном от его /oauth/token.
+    '''
+    http_client = HHHttpClient(pool_size=max(10, args.workers), metrics=metrics)
+    token_manager = OAuthTokenManager('mock-client', 'mock-secret', None, http_client=http_client,
+                                      token_file='token_info.txt', api_url=api.url,
+                                      oauth_url=f'{api.url}/oauth/token')
+    return HHDataFetcher(professional_roles=args.roles, access_token=token_manager.get_oauth_token(),
+                         http_client=http_client, token_manager=token_manager, storage=args.storage,
+                         rate_limiter=AdaptiveRateLimiter(rate=args.rate, max_rate=args.rate * 2),
+                         retry_policy=RetryPolicy(base_delay=0.05, max_delay=2.0), api_url=api.url)
+
+
+def measure_stage(name, func, metrics, items_counter):
+    '''
+    Выполняет этап обхода и возвращает строку результатов: время, запросы, ответы 429 и задержки.
+    '''
+    requests_before = metrics.counter_total('http_requests_total')
+    throttled_before = metrics.counter_total('http_requests_total', status='429')
+    items_before = metrics.counter_total(items_counter)
+    started = time.perf_counter()
+    func()
+    seconds = time.perf_counter() - started
+    return {
+        'stage': name,
+        'seconds': seconds,
+        'requests': metrics.counter_total('http_requests_total') - requests_before,
+        'throttled': metrics.counter_total('http_requests_total', status='429') - throttled_before,
+        'items': metrics.counter_total(items_counter) - items_before,
+        'p50': metrics.quantile('http_request_seconds', 0.5),
+        'p95': metrics.quantile('http_request_seconds', 0.95),
+    }
+
+
+def run(args):
+    '''
+    Замеры на локальном сервере: двухпроходный обход (страницы поиска, затем вакансии), потоковый обход
+    и приоритетный обход в пределах бюджета запросов (два запуска подряд: полный и повторный).
+    Каждый режим выполняется в отдельной временной папке, чтобы индекс вакансий не влиял на результат.
+    '''
+    results = []
+    with MockHHApi(found=args.found, regions=args.regions, latency=args.latency, jitter=args.jitter,
+                   error_rate=args.error_rate, captcha_rate=args.captcha_rate, retry_after=0) as api:
+        for mode in args.modes:
+            workdir = tempfile.mkdtemp(prefix=f'bench_crawl_{mode}_')
+            cwd = os.getcwd()
+            os.chdir(workdir)
+            try:
+                metrics = CrawlMetrics()
+                fetcher = make_fetcher(api, args, metrics)
+                if mode == 'two-pass':
+                    results.append(measure_stage('pagination (fetch_data)', fetcher.fetch_data, metrics,
+                                                 'pages_fetched_total'))
+                    results.append(measure_stage('details (fetch_vacancy_details)', fetcher.fetch_vacancy_details,
+                                                 metrics, 'vacancies_fetched_total'))
+                elif mode == 'prioritized':
+                    for run_name in ('первый запуск', 'повторный запуск'):
+                        results.append(measure_stage(f'prioritized ({run_name}, бюджет: {args.budget})',
+                                                     lambda: fetcher.fetch_prioritized(budget=args.budget), metrics,
+                                                     'vacancies_fetched_total'))
+                else:
+                    results.append(measure_stage(f'streaming (fetch_streaming, потоков: {args.workers})',
+                                                 lambda: fetcher.fetch_streaming(workers=args.workers), metrics,
+                                                 'vacancies_fetched_total'))
+                fetcher.vacancy_index.close()
+            finally:
+                os.chdir(cwd)
+                shutil.rmtree(workdir, ignore_errors=True)
+        print(f'Запросов к серверу: {api.counts}')
+    return results
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description='Замер скорости обхода на локальном сервере, имитирующем API hh.ru')
+    arg_parser.add_argument('--found', type=int, default=300, help='Вакансий на комбинацию профессии и региона')
+    arg_parser.add_argument('--regions', type=int, default=3, help='Количество регионов')
+    arg_parser.add_argument('--roles', nargs='+', default=['96', '10'], help='Профессиональные роли')
+    arg_parser.add_argument('--latency', type=float, default=0.02, help='Задержка ответа сервера, с')
+    arg_parser.add_argument('--jitter', type=float, default=0.01, help='Случайная добавка к задержке, с')
+    arg_parser.add_argument('--error-rate', type=float, default=0.0, help='Доля ответов 429')
+    arg_parser.add_argument('--captcha-rate', type=float, default=0.0, help='Доля ответов с капчей')
+    arg_parser.add_argument('--rate', type=float, default=200.0, help='Ограничение частоты запросов, запросов/с')
+    arg_parser.add_argument('--workers', type=int, default=8, help='Потоков загрузки в потоковом режиме')
+    arg_parser.add_argument('--storage', choices=('files', 'segments'), default='files')
+    arg_parser.add_argument('--budget', type=int, help='Бюджет запросов приоритетного обхода')
+    arg_parser.add_argument('--log-file', help='Файл лога парсера (по умолчанию - во временной папке)')
+    arg_parser.add_argument('--modes', nargs='+', choices=('two-pass', 'streaming', 'prioritized'),
+                            default=['two-pass', 'streaming'])
+    args = arg_parser.parse_args()
+    configure_logging(args.log_file)
+
+    for result in run(args):
+        latency = '' if result['p50'] is None else f"  p50/p95 {result['p50'] * 1000:.0f}/{result['p95'] * 1000:.0f} мс"
+        print(f"{result['stage']:45} {result['seconds']:8.2f} с  запросов {int(result['requests']):6d} "
+              f"({result['requests'] / result['seconds']:7.1f}/с)  объектов {int(result['items']):6d} "
+              f"({result['items'] / result['seconds']:7.1f}/с)  429: {int(result['throttled'])}{latency}")
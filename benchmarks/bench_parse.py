@@ -0,0 +1,83 @@
+import argparse
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import resource
+except ImportError:
+    # Пиковый объем памяти измеряется только на Unix
+    resource = None
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from parser_hh_token import HHDataParser
+from corpus import write_corpus, configure_logging
+
+
+def peak_rss_mb():
+    '''
+    Пиковый объем резидентной памяти (МБ) текущего процесса и его завершенных дочерних процессов.
+    '''
+    if resource is None:
+        return None, None
+    # ru_maxrss в Linux - в килобайтах, в macOS - в байтах
+    scale = 2 ** 20 if sys.platform == 'darwin' else 2 ** 10
+    return (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale,
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale)
+
+
+def run_parse(input_folder, output_path, streaming, workers, batch_size, format, fields=None, log_file=None):
+    '''
+    Один замер parse_json_files (выполняется в отдельном процессе, чтобы пиковая память не накапливалась).
+    '''
+    configure_logging(log_file)
+    parser = HHDataParser()
+    started = time.perf_counter()
+    parser.parse_json_files(input_folder, output_path, streaming=streaming, workers=workers, batch_size=batch_size,
+                            format=format, fields=fields)
+    seconds = time.perf_counter() - started
+    return seconds, parser.metrics.counter_total('parsed_records_total'), peak_rss_mb()
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description='Замер скорости и памяти parse_json_files')
+    arg_parser.add_argument('--folder', help='Папка с вакансиями (по умолчанию - синтетический корпус)')
+    arg_parser.add_argument('--count', type=int, default=20000, help='Размер синтетического корпуса')
+    arg_parser.add_argument('--storage', choices=('files', 'segments'), default='files',
+                            help='Формат синтетического корпуса')
+    arg_parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Процессов в потоковом режиме')
+    arg_parser.add_argument('--batch-size', type=int, default=2000, help='Пачка потокового режима')
+    arg_parser.add_argument('--format', choices=('csv', 'parquet', 'arrow'), default='csv')
+    arg_parser.add_argument('--fields', nargs='+', help='Выводимые столбцы (по умолчанию - все)')
+    arg_parser.add_argument('--log-file', help='Файл лога парсера (по умолчанию - во временной папке)')
+    args = arg_parser.parse_args()
+    log_file = configure_logging(args.log_file)
+
+    workdir = tempfile.mkdtemp(prefix='bench_parse_')
+    try:
+        folder = args.folder
+        if folder is None:
+            folder = os.path.join(workdir, 'vacancies')
+            started = time.perf_counter()
+            size = write_corpus(folder, args.count, storage=args.storage)
+            print(f'Корпус: {args.count} вакансий, {size / 2 ** 20:.1f} МБ JSON '
+                  f'(сгенерирован за {time.perf_counter() - started:.1f} с)')
+
+        runs = [('parse_json_files', False, None),
+                (f'parse_json_files streaming (процессов: {args.workers})', True, args.workers)]
+        context = multiprocessing.get_context('spawn')
+        for name, streaming, workers in runs:
+            output_path = os.path.join(workdir, f'out.{args.format}')
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                seconds, records, (rss, children_rss) = executor.submit(
+                    run_parse, folder, output_path, streaming, workers, args.batch_size, args.format,
+                    args.fields, log_file).result()
+            memory = '' if rss is None else f'  пиковая память {rss:.0f} МБ (дочерние процессы: {children_rss:.0f} МБ)'
+            print(f'{name:50} {seconds:8.2f} с  {int(records):8d} записей  {records / seconds:9.0f} записей/с{memory}')
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
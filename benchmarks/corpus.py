@@ -0,0 +1,216 @@
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from parser_hh_token import RawSegmentStore
+
+# Фрагменты для синтетических описаний, похожих на описания вакансий hh.ru
+PHRASES = [
+    'Мы ищем опытного Python-разработчика в команду платформы данных',
+    'Разработка и поддержка микросервисов на FastAPI и Django',
+    'Опыт работы с PostgreSQL, Redis, Kafka от 3 лет',
+    'Официальное оформление по ТК РФ, ДМС со стоматологией',
+    'Гибкий график, возможность удаленной работы',
+    'Конкурентная заработная плата &mdash; обсуждается по итогам собеседования',
+    'Компания &laquo;Рога и копыта&raquo; &ndash; лидер рынка',
+    'Знание английского языка на уровне B2 &amp; выше',
+    'Стек: Python 3.11, asyncio, SQLAlchemy, Docker, Kubernetes',
+    'Участие в code review &quot;на равных&quot;, менторство',
+]
+
+SKILLS = ['Python', 'SQL', 'PostgreSQL', 'Docker', 'Kubernetes', 'Git', 'Linux', 'Django', 'FastAPI', 'Kafka',
+          'Redis', 'Pandas', 'Airflow', 'Spark', 'Java', 'Go', 'TypeScript', 'React', '1С', 'Excel']
+NAMES = ['Python-разработчик', 'Аналитик данных', 'Инженер данных', 'Backend-разработчик', 'DevOps-инженер',
+         'Тестировщик', 'Системный аналитик', 'Frontend-разработчик', 'Бухгалтер', 'Менеджер по продажам']
+EXPERIENCE = [('noExperience', 'Нет опыта'), ('between1And3', 'От 1 года до 3 лет'),
+              ('between3And6', 'От 3 до 6 лет'), ('moreThan6', 'Более 6 лет')]
+SCHEDULE = [('fullDay', 'Полный день'), ('remote', 'Удаленная работа'), ('flexible', 'Гибкий график'),
+            ('shift', 'Сменный график')]
+EMPLOYMENT = [('full', 'Полная занятость'), ('part', 'Частичная занятость'), ('project', 'Проектная работа')]
+ROLES = {'96': 'Программист, разработчик', '10': 'Аналитик', '156': 'BI-аналитик, аналитик данных',
+         '160': 'DevOps-инженер', '124': 'Тестировщик'}
+
+# Начало отсчета дат публикации синтетических вакансий
+EPOCH = datetime(2024, 1, 1, tzinfo=timezone(timedelta(hours=3)))
+
+
+def synthetic_description(rng):
+    '''
+    Генерирует HTML-описание вакансии: абзацы, списки обязанностей и требований, выделения и HTML-сущности.
+    '''
+    parts = [f'<p><strong>{rng.choice(PHRASES)}</strong></p>']
+    for title in ('Обязанности:', 'Требования:', 'Условия:'):
+        parts.append(f'<p><strong>{title}</strong></p><ul>')
+        for _ in range(rng.randint(3, 8)):
+            parts.append(f'<li>{rng.choice(PHRASES)};</li>')
+        parts.append('</ul>')
+    parts.append(f'<p>{rng.choice(PHRASES)}&nbsp;<em>{rng.choice(PHRASES)}</em></p>')
+    return ''.join(parts)
+
+
+def format_date(moment):
+    """
+    Дата в формате API hh.ru ('2024-01-31T10:00:00+0300').
+    """
+    return moment.strftime('%Y-%m-%dT%H:%M:%S%z')
+
+
+def synthetic_vacancy(vacancy_id, base_url='https://api.hh.ru', area=None, role=None, published_at=None, seed=42):
+    '''
+    Генерирует детальные данные вакансии в формате ответа /vacancies/{id} API hh.ru.
+    Данные детерминированы: одинаковые vacancy_id и seed дают одинаковую вакансию.
+
+    :param area: Кортеж (id, название) региона; по умолчанию выбирается случайно.
+    :param role: Id профессиональной роли; по умолчанию выбирается случайно.
+    :param published_at: Дата публикации (datetime); по умолчанию выбирается случайно в пределах 30 дней от EPOCH.
+    '''
+    rng = random.Random(f'{seed}:{vacancy_id}')
+    area_id, area_name = area or rng.choice([('1', 'Москва'), ('2', 'Санкт-Петербург'), ('4', 'Новосибирск')])
+    role = role or rng.choice(list(ROLES))
+    published_at = published_at or EPOCH + timedelta(seconds=rng.randint(0, 30 * 86400))
+    employer_id = str(rng.randint(1, 5000))
+    salary_from = rng.choice([None, rng.randint(30, 300) * 1000])
+    experience = rng.choice(EXPERIENCE)
+    schedule = rng.choice(SCHEDULE)
+    employment = rng.choice(EMPLOYMENT)
+    return {
+        'id': str(vacancy_id),
+        'premium': rng.random() < 0.05,
+        'billing_type': {'id': 'standard', 'name': 'Стандарт'},
+        'relations': [],
+        'name': rng.choice(NAMES),
+        'insider_interview': None,
+        'response_letter_required': rng.random() < 0.1,
+        'area': {'id': area_id, 'name': area_name, 'url': f'{base_url}/areas/{area_id}'},
+        'salary': None if salary_from is None else {
+            'from': salary_from, 'to': rng.choice([None, salary_from + rng.randint(10, 100) * 1000]),
+            'currency': 'RUR', 'gross': rng.random() < 0.5,
+        },
+        'type': {'id': 'open', 'name': 'Открытая'},
+        'address': None,
+        'allow_messages': True,
+        'experience': {'id': experience[0], 'name': experience[1]},
+        'schedule': {'id': schedule[0], 'name': schedule[1]},
+        'employment': {'id': employment[0], 'name': employment[1]},
+        'department': None,
+        'contacts': None,
+        'description': synthetic_description(rng),
+        'branded_description': None,
+        'vacancy_constructor_template': None,
+        'key_skills': [{'name': skill} for skill in rng.sample(SKILLS, rng.randint(0, 8))],
+        'accept_handicapped': False,
+        'accept_kids': False,
+        'archived': False,
+        'response_url': None,
+        'specializations': [],
+        'professional_roles': [{'id': role, 'name': ROLES.get(role, 'Другое')}],
+        'code': None,
+        'hidden': False,
+        'quick_responses_allowed': False,
+        'driver_license_types': [],
+        'accept_incomplete_resumes': rng.random() < 0.3,
+        'employer': {
+            'id': employer_id,
+            'name': f'Компания {employer_id}',
+            'url': f'{base_url}/employers/{employer_id}',
+            'alternate_url': f'https://hh.ru/employer/{employer_id}',
+            'logo_urls': {'original': f'https://img.hhcdn.ru/employer-logo/{employer_id}.png',
+                          '240': f'https://img.hhcdn.ru/employer-logo/{employer_id}_240.png',
+                          '90': f'https://img.hhcdn.ru/employer-logo/{employer_id}_90.png'},
+            'vacancies_url': f'{base_url}/vacancies?employer_id={employer_id}',
+            'accredited_it_employer': rng.random() < 0.2,
+            'trusted': True,
+        },
+        'published_at': format_date(published_at),
+        'created_at': format_date(published_at),
+        'initial_created_at': format_date(published_at),
+        'negotiations_url': None,
+        'suitable_resumes_url': None,
+        'apply_alternate_url': f'https://hh.ru/applicant/vacancy_response?vacancyId={vacancy_id}',
+        'has_test': False,
+        'test': None,
+        'alternate_url': f'https://hh.ru/vacancy/{vacancy_id}',
+        'working_days': [],
+        'working_time_intervals': [],
+        'working_time_modes': [],
+        'accept_temporary': rng.random() < 0.1,
+        'languages': [],
+    }
+
+
+def listing_item(vacancy, base_url='https://api.hh.ru'):
+    '''
+    Преобразует детальные данные вакансии в элемент выдачи поиска /vacancies
+    (без описания и навыков, с фрагментами snippet и ссылкой на детальные данные).
+    '''
+    item = {key: vacancy[key] for key in (
+        'id', 'premium', 'name', 'department', 'has_test', 'response_letter_required', 'area', 'salary', 'type',
+        'address', 'response_url', 'published_at', 'created_at', 'archived', 'apply_alternate_url',
+        'insider_interview', 'alternate_url', 'relations', 'employer', 'working_days', 'working_time_intervals',
+        'working_time_modes', 'accept_temporary', 'professional_roles', 'accept_incomplete_resumes',
+        'experience', 'employment', 'schedule', 'contacts')}
+    item['url'] = f"{base_url}/vacancies/{vacancy['id']}?host=hh.ru"
+    item['snippet'] = {'requirement': 'Опыт работы с <highlighttext>Python</highlighttext> от 3 лет',
+                       'responsibility': 'Разработка и поддержка сервисов'}
+    item['counters'] = {'responses': 0}
+    return item
+
+
+def configure_logging(log_file=None):
+    '''
+    Направляет лог парсера в файл log_file (по умолчанию - во временную папку), чтобы замеры
+    не создавали parser_hh.log в текущей папке. Вызывается до создания HHDataParser и HHDataFetcher
+    (в том числе в дочерних процессах замеров): их logging.basicConfig не меняет уже настроенный лог.
+
+    :return: Путь к файлу лога.
+    '''
+    log_file = log_file or os.path.join(tempfile.gettempdir(), 'parser_hh_bench.log')
+    logging.basicConfig(filename=log_file, level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    return log_file
+
+
+def write_corpus(folder, count, seed=42, storage='files'):
+    '''
+    Записывает count синтетических вакансий в папку folder: по JSON-файлу на вакансию (storage='files',
+    как ./docs/vacancies) или в хранилище сегментов RawSegmentStore (storage='segments').
+
+    :return: Общий размер записанных JSON-документов в байтах.
+    '''
+    os.makedirs(folder, exist_ok=True)
+    store = RawSegmentStore(folder) if storage == 'segments' else None
+    size = 0
+    for i in range(count):
+        vacancy_id = 90000000 + i
+        text = json.dumps(synthetic_vacancy(vacancy_id, seed=seed), ensure_ascii=False)
+        size += len(text.encode('utf8'))
+        if store is not None:
+            store.append(vacancy_id, text)
+        else:
+            with open(os.path.join(folder, f'{vacancy_id}.json'), 'w', encoding='utf8') as f:
+                f.write(text)
+    if store is not None:
+        store.close()
+    return size
+
+
+if __name__ == "__main__":
+    import argparse
+
+    arg_parser = argparse.ArgumentParser(description='Генератор синтетического корпуса вакансий hh.ru')
+    arg_parser.add_argument('folder', help='Папка для записи корпуса')
+    arg_parser.add_argument('--count', type=int, default=10000, help='Количество вакансий')
+    arg_parser.add_argument('--seed', type=int, default=42, help='Начальное значение генератора')
+    arg_parser.add_argument('--storage', choices=('files', 'segments'), default='files',
+                            help='Формат: файл на вакансию или хранилище сегментов')
+    args = arg_parser.parse_args()
+
+    started = time.perf_counter()
+    size = write_corpus(args.folder, args.count, seed=args.seed, storage=args.storage)
+    print(f'Записано вакансий: {args.count}, {size / 2 ** 20:.1f} МБ за {time.perf_counter() - started:.1f} с')
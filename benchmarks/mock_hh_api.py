@@ -0,0 +1,262 @@
+import json
+import math
+import random
+import threading
+import time
+from datetime import datetime, timezone, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+from corpus import synthetic_vacancy, listing_item
+
+
+class MockHHApi:
+    '''
+    Локальный сервер, имитирующий API hh.ru для воспроизводимых замеров без обращения к api.hh.ru:
+    /areas - дерево регионов (Россия, id 113, и regions регионов),
+    /vacancies - выдача поиска с пагинацией: для каждой комбинации профессии и региона найдено found вакансий,
+    даты публикации равномерно распределены по 30 дням до запуска сервера, поддерживаются фильтры date_from и date_to
+    и ограничение глубины выдачи 2000,
+    /vacancies/{id} - детальные данные синтетической вакансии,
+    /oauth/token (POST) и /me - выдача и проверка токена.
+    Вакансии с одинаковым номером в регионе совпадают для всех профессий (как пересечения выдачи на hh.ru),
+    поэтому на сервере можно проверять дедупликацию.
+
+    :param latency: Задержка каждого ответа в секундах (плюс случайная добавка до jitter секунд).
+    :param error_rate: Доля ответов 429 с заголовком Retry-After.
+    :param captcha_rate: Доля ответов 403 с ошибкой captcha_required.
+    :param gone: Идентификаторы удаленных вакансий: /vacancies/{id} отвечает для них 404,
+                 а в выдаче поиска они остаются (как в устаревшем поисковом индексе hh.ru).
+    '''
+    SEARCH_DEPTH_LIMIT = 2000
+    WINDOW = 30 * 86400
+
+    def __init__(self, host='127.0.0.1', port=0, found=500, regions=3, latency=0.0, jitter=0.0, error_rate=0.0,
+                 captcha_rate=0.0, retry_after=1, seed=42, gone=()):
+        self.found = found
+        self.regions = regions
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.captcha_rate = captcha_rate
+        self.retry_after = retry_after
+        self.seed = seed
+        self.gone = set(gone)
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.counts = {}
+        self.tokens = set()
+        # Дата публикации самой новой вакансии: шарды HHDataFetcher отсчитываются от текущего времени
+        self.now = datetime.now(timezone.utc).replace(microsecond=0)
+        self.server = ThreadingHTTPServer((host, port), self.handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self):
+        """
+        Запускает сервер в фоновом потоке.
+        """
+        self.thread = threading.Thread(target=self.server.serve_forever, name='mock-hh-api', daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """
+        Останавливает сервер.
+        """
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def count(self, key):
+        with self.lock:
+            self.counts[key] = self.counts.get(key, 0) + 1
+
+    def roll(self):
+        """
+        Случайное число для инъекции ошибок (генератор общий для потоков сервера).
+        """
+        with self.lock:
+            return self.rng.random()
+
+    def areas(self):
+        """
+        Дерево регионов в формате /areas.
+        """
+        regions = [{'id': str(i), 'parent_id': '113', 'name': f'Регион {i}', 'areas': []}
+                   for i in range(1, self.regions + 1)]
+        return [{'id': '113', 'parent_id': None, 'name': 'Россия', 'areas': regions}]
+
+    def published_at(self, index):
+        """
+        Дата публикации вакансии с номером index (новые вакансии - с меньшими номерами).
+        """
+        return self.now - timedelta(seconds=index * self.WINDOW / self.found)
+
+    def vacancy_id(self, area, index):
+        return str(int(area) * 10 ** 7 + index)
+
+    def search(self, params):
+        '''
+        Страница выдачи /vacancies для параметров запроса (page, per_page, area, professional_role,
+        date_from, date_to).
+        '''
+        page = int(params.get('page', 0))
+        per_page = int(params.get('per_page', 20))
+        area = params.get('area', '1')
+        role = params.get('professional_role')
+
+        # Номера вакансий, попадающих в окно дат публикации
+        first, last = 0, self.found
+        if params.get('date_to'):
+            moment = datetime.strptime(params['date_to'], '%Y-%m-%dT%H:%M:%S%z')
+            offset = (self.now - moment).total_seconds()
+            first = max(first, math.ceil(offset * self.found / self.WINDOW))
+        if params.get('date_from'):
+            moment = datetime.strptime(params['date_from'], '%Y-%m-%dT%H:%M:%S%z')
+            offset = (self.now - moment).total_seconds()
+            last = min(last, math.floor(offset * self.found / self.WINDOW) + 1)
+        found = max(0, last - first)
+
+        visible = min(found, self.SEARCH_DEPTH_LIMIT)
+        pages = math.ceil(visible / per_page)
+        start = first + page * per_page
+        end = min(first + min((page + 1) * per_page, visible), last)
+        items = []
+        for index in range(start, end):
+            vacancy = synthetic_vacancy(self.vacancy_id(area, index), self.url, area=(area, f'Регион {area}'),
+                                        role=role, published_at=self.published_at(index), seed=self.seed)
+            items.append(listing_item(vacancy, self.url))
+        return {'items': items, 'found': found, 'pages': pages, 'page': page, 'per_page': per_page}
+
+    def detail(self, vacancy_id):
+        """
+        Детальные данные вакансии /vacancies/{id}.
+        """
+        area, index = divmod(int(vacancy_id), 10 ** 7)
+        return synthetic_vacancy(vacancy_id, self.url, area=(str(area), f'Регион {area}'),
+                                 published_at=self.published_at(index), seed=self.seed)
+
+    def issue_token(self):
+        token = f'MOCK{int(self.roll() * 10 ** 16):016X}'
+        with self.lock:
+            self.tokens.add(token)
+        return {'access_token': token, 'token_type': 'bearer', 'expires_in': 1209600,
+                'refresh_token': f'R{token}'}
+
+    def handler(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def send_json(self, status, data, headers=None):
+                body = json.dumps(data, ensure_ascii=False).encode('utf8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def delay(self):
+                if api.latency or api.jitter:
+                    time.sleep(api.latency + api.roll() * api.jitter)
+
+            def inject(self, endpoint):
+                '''
+                Случайный ответ 429 или капча (только для запросов вакансий).
+                '''
+                if api.error_rate and api.roll() < api.error_rate:
+                    api.count(f'{endpoint} 429')
+                    self.send_json(429, {'errors': [{'type': 'too_many_requests'}]},
+                                   {'Retry-After': str(api.retry_after)})
+                    return True
+                if api.captcha_rate and api.roll() < api.captcha_rate:
+                    api.count(f'{endpoint} captcha')
+                    captcha_url = 'https://hh.ru/account/captcha?backurl=mock'
+                    self.send_json(403, {'errors': [{'type': 'captcha_required', 'value': 'captcha_required',
+                                                     'captcha_url': captcha_url}],
+                                         'captcha_url': captcha_url})
+                    return True
+                return False
+
+            def do_GET(self):
+                parts = urlsplit(self.path)
+                params = {key: values[-1] for key, values in parse_qs(parts.query).items()}
+                path = parts.path.rstrip('/')
+                self.delay()
+                if path == '/areas':
+                    api.count('/areas')
+                    self.send_json(200, api.areas(), {'ETag': '"mock-areas"'})
+                elif path == '/me':
+                    api.count('/me')
+                    token = self.headers.get('Authorization', '').replace('Bearer ', '')
+                    if token:
+                        self.send_json(200, {'id': '1', 'is_applicant': False})
+                    else:
+                        self.send_json(403, {'errors': [{'type': 'forbidden'}]})
+                elif path == '/vacancies':
+                    if not self.inject('/vacancies'):
+                        api.count('/vacancies')
+                        self.send_json(200, api.search(params))
+                elif path.startswith('/vacancies/') and path[len('/vacancies/'):] in api.gone:
+                    api.count('/vacancies/{id} 404')
+                    self.send_json(404, {'errors': [{'type': 'not_found'}]})
+                elif path.startswith('/vacancies/') and path[len('/vacancies/'):].isdigit():
+                    if not self.inject('/vacancies/{id}'):
+                        api.count('/vacancies/{id}')
+                        self.send_json(200, api.detail(path[len('/vacancies/'):]))
+                else:
+                    self.send_json(404, {'errors': [{'type': 'not_found'}]})
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                self.rfile.read(length)
+                self.delay()
+                if urlsplit(self.path).path.rstrip('/') == '/oauth/token':
+                    api.count('/oauth/token')
+                    self.send_json(200, api.issue_token())
+                else:
+                    self.send_json(404, {'errors': [{'type': 'not_found'}]})
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+if __name__ == "__main__":
+    import argparse
+
+    arg_parser = argparse.ArgumentParser(description='Локальный сервер, имитирующий API hh.ru')
+    arg_parser.add_argument('--port', type=int, default=8088)
+    arg_parser.add_argument('--found', type=int, default=500, help='Вакансий на комбинацию профессии и региона')
+    arg_parser.add_argument('--regions', type=int, default=3, help='Количество регионов в /areas')
+    arg_parser.add_argument('--latency', type=float, default=0.0, help='Задержка ответа, с')
+    arg_parser.add_argument('--jitter', type=float, default=0.0, help='Случайная добавка к задержке, с')
+    arg_parser.add_argument('--error-rate', type=float, default=0.0, help='Доля ответов 429')
+    arg_parser.add_argument('--captcha-rate', type=float, default=0.0, help='Доля ответов с капчей')
+    args = arg_parser.parse_args()
+
+    api = MockHHApi(port=args.port, found=args.found, regions=args.regions, latency=args.latency,
+                    jitter=args.jitter, error_rate=args.error_rate, captcha_rate=args.captcha_rate)
+    print(f'Сервер запущен: {api.url} (Ctrl+C для остановки)')
+    try:
+        api.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(api.counts)
+        api.server.server_close()
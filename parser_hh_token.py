@@ -1,481 +1,4986 @@
 import requests
 import time
-from concurrent.futures import ThreadPoolExecutor
+import random
+import heapq
+import itertools
+import asyncio
+import threading
+import socket
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from collections import deque
+from queue import Queue
+from datetime import datetime, timezone
 from fake_useragent import UserAgent
 import os
 import json
+import hashlib
+import gzip
+import zlib
+import sqlite3
 import logging
 import re
+import html
+import operator
+import sys
+import io
+import mmap
 import pandas as pd
+from requests.adapters import HTTPAdapter
+
+try:
+    import aiohttp
+except ImportError:
+    # aiohttp нужен только для асинхронного режима (AsyncHHDataFetcher)
+    aiohttp = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:
+    # pyarrow нужен только для вывода в форматах Parquet и Arrow IPC
+    pa = None
+    pc = None
+    pq = None
+
+try:
+    import zstandard
+except ImportError:
+    # zstandard нужен только для сжатия сегментов RawSegmentStore кодеком zstd
+    zstandard = None
+
+try:
+    import fcntl
+except ImportError:
+    # fcntl (блокировка файлов между процессами) есть только в Unix; без него хранилище сегментов
+    # RawSegmentStore может записывать только один процесс
+    fcntl = None
+
+try:
+    import orjson
+except ImportError:
+    # orjson ускоряет разбор JSON; без него используется стандартный модуль json
+    orjson = None
+
+# Библиотека разбора JSON: 'orjson' (если установлен) или 'json' (см. set_json_backend)
+JSON_BACKEND = 'orjson' if orjson is not None else 'json'
+
+def set_json_backend(name):
+    '''
+    Выбирает библиотеку разбора JSON для json_loads: 'orjson' или 'json'.
+    '''
+    global JSON_BACKEND
+    if name not in ('orjson', 'json'):
+        raise ValueError(f"Неизвестная библиотека JSON {name}, допустимые значения: orjson, json")
+    if name == 'orjson' and orjson is None:
+        raise ImportError("Для разбора JSON через orjson необходим пакет orjson (pip install orjson)")
+    JSON_BACKEND = name
+
+def json_loads(data):
+    '''
+    Разбирает JSON из str или bytes (UTF-8, допускается BOM) библиотекой JSON_BACKEND.
+    '''
+    if JSON_BACKEND == 'orjson':
+        if data[:3] == b'\xef\xbb\xbf':
+            data = data[3:]
+        elif data[:1] == '\ufeff':
+            data = data[1:]
+        return orjson.loads(data)
+    return json.loads(data)
+
+#Метрики обхода и парсинга: счетчики, гистограммы задержек и показатели пропускной способности
+class CrawlMetrics:
+    '''
+    Потокобезопасный набор метрик в модели Prometheus: счетчики (inc), гистограммы (observe)
+    и показатели (set_gauge) с метками. Метрики выгружаются в текстовом формате Prometheus
+    в файл (write_textfile, например для node_exporter textfile collector) или по HTTP (start_http_server),
+    а start_reporter периодически выводит краткую сводку о ходе обхода.
+    '''
+    # Границы корзин гистограмм по умолчанию (секунды): задержки HTTP-запросов
+    DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+    # Границы корзин времени разбора одной записи (секунды)
+    PARSE_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1)
+    # Нормализация путей API для метки endpoint: числовые идентификаторы заменяются на {id}
+    ENDPOINT_ID_RE = re.compile(r'/\d+')
+
+    def __init__(self, prefix='hh'):
+        self.prefix = prefix
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        self.started_at = time.time()
+        self.server = None
+        self.reporter = None
+        self.last_report = (time.monotonic(), 0.0, 0.0)
+
+    @staticmethod
+    def key(name, labels):
+        """
+        Ключ метрики: имя и отсортированные пары меток.
+        """
+        return name, tuple(sorted((label, str(value)) for label, value in labels.items()))
+
+    @classmethod
+    def endpoint(cls, url):
+        """
+        Метка endpoint по URL запроса: путь без числовых идентификаторов (например, /vacancies/{id}).
+        """
+        path = url.split('://', 1)[-1]
+        path = path[path.find('/'):] if '/' in path else '/'
+        return cls.ENDPOINT_ID_RE.sub('/{id}', path.split('?', 1)[0])
+
+    def inc(self, name, value=1, **labels):
+        """
+        Увеличивает счетчик name на value.
+        """
+        key = self.key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set_gauge(self, name, value, **labels):
+        """
+        Устанавливает текущее значение показателя name.
+        """
+        with self.lock:
+            self.gauges[self.key(name, labels)] = value
+
+    def observe(self, name, value, count=1, buckets=None, **labels):
+        '''
+        Добавляет наблюдение value в гистограмму name.
+
+        :param count: Количество одинаковых наблюдений (например, среднее время разбора записи пачки).
+        :param buckets: Границы корзин (по умолчанию DEFAULT_BUCKETS); задаются при первом наблюдении.
+        '''
+        key = self.key(name, labels)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                bounds = tuple(buckets or self.DEFAULT_BUCKETS)
+                # [границы, количество в корзинах (последняя - +Inf), сумма, количество]
+                histogram = self.histograms[key] = [bounds, [0] * (len(bounds) + 1), 0.0, 0]
+            bounds, counts = histogram[0], histogram[1]
+            i = 0
+            while i < len(bounds) and value > bounds[i]:
+                i += 1
+            counts[i] += count
+            histogram[2] += value * count
+            histogram[3] += count
+
+    def timer(self, name, buckets=None, **labels):
+        """
+        Контекстный менеджер, записывающий длительность блока в гистограмму name.
+        """
+        metrics = self
+
+        class Timer:
+            def __enter__(self):
+                self.started = time.perf_counter()
+                return self
+
+            def __exit__(self, exc_type, exc, tb):
+                metrics.observe(name, time.perf_counter() - self.started, buckets=buckets, **labels)
+
+        return Timer()
+
+    def counter_total(self, name, **labels):
+        """
+        Сумма значений счетчика name по всем меткам (или по записям, содержащим заданные метки).
+        """
+        wanted = set((label, str(value)) for label, value in labels.items())
+        with self.lock:
+            return sum(value for (metric, metric_labels), value in self.counters.items()
+                       if metric == name and wanted <= set(metric_labels))
+
+    def quantile(self, name, q, **labels):
+        '''
+        Оценка квантиля q гистограммы name по корзинам (линейная интерполяция внутри корзины),
+        объединяя все записи с заданными метками. Возвращает None, если наблюдений нет.
+        '''
+        wanted = set((label, str(value)) for label, value in labels.items())
+        with self.lock:
+            selected = [h for (metric, metric_labels), h in self.histograms.items()
+                        if metric == name and wanted <= set(metric_labels)]
+            if not selected:
+                return None
+            bounds = selected[0][0]
+            counts = [sum(h[1][i] for h in selected if h[0] == bounds) for i in range(len(bounds) + 1)]
+        total = sum(counts)
+        if not total:
+            return None
+        rank = q * total
+        seen = 0
+        for i, count in enumerate(counts):
+            if count and seen + count >= rank:
+                lower = bounds[i - 1] if i > 0 else 0.0
+                if i == len(bounds):
+                    return lower
+                return lower + (bounds[i] - lower) * (rank - seen) / count
+            seen += count
+        return bounds[-1]
+
+    @staticmethod
+    def format_labels(labels, extra=()):
+        pairs = list(labels) + list(extra)
+        if not pairs:
+            return ''
+        escaped = (f'{label}="{value}"'.replace('\n', ' ') for label, value in pairs)
+        return '{' + ','.join(escaped) + '}'
+
+    def snapshot(self):
+        '''
+        Копия всех метрик (например, для передачи из дочернего процесса в основной и merge).
+        '''
+        with self.lock:
+            return (dict(self.counters), dict(self.gauges),
+                    {key: (h[0], list(h[1]), h[2], h[3]) for key, h in self.histograms.items()})
+
+    def merge(self, snapshot):
+        '''
+        Добавляет метрики снимка snapshot: счетчики и гистограммы суммируются, показатели заменяются.
+        '''
+        counters, gauges, histograms = snapshot
+        with self.lock:
+            for key, value in counters.items():
+                self.counters[key] = self.counters.get(key, 0) + value
+            self.gauges.update(gauges)
+            for key, (bounds, counts, total, count) in histograms.items():
+                histogram = self.histograms.get(key)
+                if histogram is None:
+                    self.histograms[key] = [bounds, list(counts), total, count]
+                    continue
+                histogram[1] = [a + b for a, b in zip(histogram[1], counts)]
+                histogram[2] += total
+                histogram[3] += count
+
+    def render(self):
+        '''
+        Возвращает все метрики в текстовом формате Prometheus (exposition format 0.0.4).
+        '''
+        with self.lock:
+            counters = sorted(self.counters.items())
+            gauges = sorted(self.gauges.items())
+            histograms = sorted((key, (h[0], list(h[1]), h[2], h[3])) for key, h in self.histograms.items())
+
+        lines = []
+        declared = set()
+
+        def declare(name, kind):
+            if name not in declared:
+                declared.add(name)
+                lines.append(f'# TYPE {name} {kind}')
+
+        for (name, labels), value in counters:
+            full = f'{self.prefix}_{name}'
+            declare(full, 'counter')
+            lines.append(f'{full}{self.format_labels(labels)} {value}')
+        for (name, labels), value in gauges:
+            full = f'{self.prefix}_{name}'
+            declare(full, 'gauge')
+            lines.append(f'{full}{self.format_labels(labels)} {value}')
+        for (name, labels), (bounds, counts, total, count) in histograms:
+            full = f'{self.prefix}_{name}'
+            declare(full, 'histogram')
+            cumulative = 0
+            for bound, bucket in zip(list(bounds) + ['+Inf'], counts):
+                cumulative += bucket
+                lines.append(f'{full}_bucket{self.format_labels(labels, [("le", bound)])} {cumulative}')
+            lines.append(f'{full}_sum{self.format_labels(labels)} {total}')
+            lines.append(f'{full}_count{self.format_labels(labels)} {count}')
+        return '\n'.join(lines) + '\n'
+
+    def write_textfile(self, path):
+        """
+        Атомарно записывает метрики в текстовый файл Prometheus (через временный файл и os.replace).
+        """
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w', encoding='utf8') as f:
+            f.write(self.render())
+        os.replace(tmp_path, path)
+
+    def start_http_server(self, port=9108, host='127.0.0.1'):
+        '''
+        Запускает в фоновом потоке HTTP-сервер, отдающий метрики по адресу http://host:port/metrics.
+        '''
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?', 1)[0] not in ('/', '/metrics'):
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode('utf8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self.server.serve_forever, name='metrics-http', daemon=True).start()
+        logging.info(f'Метрики доступны по адресу http://{host}:{self.server.server_address[1]}/metrics')
+        return self.server
+
+    def summary(self):
+        '''
+        Краткая сводка о ходе обхода: запросы в секунду за период с прошлой сводки, доля ответов 429,
+        объем загруженных данных, квантили задержки, разобранные записи и размеры очередей.
+        '''
+        now = time.monotonic()
+        requests_total = self.counter_total('http_requests_total')
+        records_total = self.counter_total('parsed_records_total')
+        last_at, last_requests, last_records = self.last_report
+        self.last_report = (now, requests_total, records_total)
+        elapsed = max(now - last_at, 1e-9)
+        requests_rate = (requests_total - last_requests) / elapsed
+        records_rate = (records_total - last_records) / elapsed
+        self.set_gauge('requests_per_second', round(requests_rate, 3))
+        self.set_gauge('parsed_records_per_second', round(records_rate, 3))
+
+        throttled = self.counter_total('http_requests_total', status='429')
+        megabytes = self.counter_total('http_response_bytes_total') / 2 ** 20
+        p50 = self.quantile('http_request_seconds', 0.5)
+        p95 = self.quantile('http_request_seconds', 0.95)
+        parts = [f'запросов: {int(requests_total)} ({requests_rate:.1f}/с)',
+                 f'429: {int(throttled)} ({throttled / requests_total:.1%})' if requests_total else '429: 0',
+                 f'ошибок сети: {int(self.counter_total("http_errors_total"))}',
+                 f'загружено: {megabytes:.1f} МБ']
+        if p50 is not None:
+            parts.append(f'задержка p50/p95: {p50:.2f}/{p95:.2f} с')
+        parts.append(f'вакансий загружено: {int(self.counter_total("vacancies_fetched_total"))}')
+        if records_total:
+            parts.append(f'разобрано записей: {int(records_total)} ({records_rate:.0f}/с)')
+        with self.lock:
+            queues = [(dict(labels).get('queue', name), value) for (name, labels), value in self.gauges.items()
+                      if name == 'queue_depth']
+        parts.extend(f'очередь {queue}: {value}' for queue, value in queues)
+        return ', '.join(parts)
+
+    def start_reporter(self, interval=30.0, textfile=None):
+        '''
+        Запускает фоновый поток, который каждые interval секунд выводит сводку (summary) в лог и на экран
+        и, если задан textfile, обновляет файл метрик Prometheus.
+        '''
+        stop = threading.Event()
+
+        def report():
+            while not stop.wait(interval):
+                try:
+                    line = self.summary()
+                    logging.info(f'Прогресс: {line}')
+                    print(f'Прогресс: {line}')
+                    if textfile:
+                        self.write_textfile(textfile)
+                except Exception as e:
+                    logging.error(f'Ошибка при выводе метрик: {str(e)}')
+
+        self.reporter = stop
+        threading.Thread(target=report, name='metrics-reporter', daemon=True).start()
+        return stop
+
+    def stop(self):
+        """
+        Останавливает поток сводок и HTTP-сервер метрик.
+        """
+        if self.reporter is not None:
+            self.reporter.set()
+            self.reporter = None
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+#HTTP-клиент с пулом соединений для всех запросов к API HH
+class HHHttpClient:
+    '''
+    Общий HTTP-клиент для запросов к hh.ru.
+    Использует одну requests.Session с пулом keep-alive соединений, поэтому TCP- и TLS-рукопожатие
+    выполняется один раз на соединение, а не на каждый запрос. Ответы запрашиваются в сжатом виде (gzip/deflate).
+    Один экземпляр можно разделять между OAuthTokenManager, HHDataFetcher и потоками.
+    Для каждого запроса в metrics записываются код ответа, задержка и объем данных по endpoint.
+    '''
+    def __init__(self, pool_size=10, timeout=30, metrics=None):
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.metrics = metrics or CrawlMetrics()
+        self.session = requests.Session()
+
+        # Пул соединений: pool_maxsize соединений на хост, которые переиспользуются между запросами
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({
+            'Accept-Encoding': 'gzip, deflate',
+            'Connection': 'keep-alive',
+        })
+
+    def request(self, method, url, **kwargs):
+        """
+        Запрос через общий пул соединений с записью метрик.
+        """
+        kwargs.setdefault('timeout', self.timeout)
+        endpoint = self.metrics.endpoint(url)
+        started = time.perf_counter()
+        try:
+            response = self.session.request(method, url, **kwargs)
+        except requests.RequestException as e:
+            self.metrics.inc('http_errors_total', endpoint=endpoint, error=type(e).__name__)
+            raise
+        self.metrics.observe('http_request_seconds', time.perf_counter() - started, endpoint=endpoint)
+        self.metrics.inc('http_requests_total', endpoint=endpoint, status=response.status_code)
+        self.metrics.inc('http_response_bytes_total', len(response.content), endpoint=endpoint)
+        return response
+
+    def get(self, url, **kwargs):
+        """
+        GET-запрос через общий пул соединений.
+        """
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        """
+        POST-запрос через общий пул соединений.
+        """
+        return self.request('POST', url, **kwargs)
+
+    def close(self):
+        """
+        Закрывает все соединения пула.
+        """
+        self.session.close()
+
+#Ограничитель частоты запросов к API HH (token bucket)
+class RateLimiter:
+    '''
+    Глобальный ограничитель частоты запросов по алгоритму token bucket.
+    Один экземпляр разделяется всеми потоками и корутинами, поэтому суммарная частота запросов
+    никогда не превышает rate запросов в секунду (с допустимым всплеском burst).
+    '''
+    def __init__(self, rate=5.0, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst if burst is not None else max(1.0, self.rate))
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def refill(self):
+        """
+        Начисляет токены за время, прошедшее с последнего обращения. Вызывается под блокировкой.
+        """
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def reserve(self):
+        '''
+        Резервирует один токен и возвращает время ожидания (в секундах) до момента, когда запрос можно выполнять.
+        Токены могут уходить в минус: так очередь ожидающих обслуживается в порядке резервирования.
+        '''
+        with self.lock:
+            self.refill()
+            self.tokens -= 1
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+    def acquire(self):
+        """
+        Блокирующее ожидание токена (для потоков).
+        """
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        """
+        Неблокирующее ожидание токена (для корутин asyncio).
+        """
+        wait = self.reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def on_success(self):
+        """
+        Сообщение об успешном ответе API. Фиксированная частота не меняется (см. AdaptiveRateLimiter).
+        """
+
+    def on_throttle(self, retry_after=None):
+        """
+        Сообщение об ответе 429. Фиксированная частота не меняется (см. AdaptiveRateLimiter).
+        """
+
+#Ограничитель частоты, подстраивающийся под ответы 429 от API HH
+class AdaptiveRateLimiter(RateLimiter):
+    '''
+    Ограничитель частоты с адаптацией по схеме AIMD.
+    При ответе 429 (капча/троттлинг) частота уменьшается в decrease_factor раз (не ниже min_rate), а все ожидающие
+    запросы приостанавливаются на время Retry-After. После каждых success_threshold успешных ответов подряд частота
+    увеличивается на increase_step (не выше max_rate). Так обход держится вблизи максимальной допустимой частоты.
+    '''
+    def __init__(self, rate=5.0, burst=None, min_rate=0.5, max_rate=None, decrease_factor=0.5, increase_step=0.25,
+                 success_threshold=20, cooldown=1.0):
+        super().__init__(rate, burst)
+        self.min_rate = min_rate
+        self.max_rate = max_rate if max_rate is not None else self.rate
+        self.decrease_factor = decrease_factor
+        self.increase_step = increase_step
+        self.success_threshold = success_threshold
+        self.cooldown = cooldown
+        self.successes = 0
+        self.throttled_at = 0.0
+
+    def on_success(self):
+        """
+        Учитывает успешный ответ и при необходимости увеличивает частоту запросов.
+        """
+        with self.lock:
+            self.successes += 1
+            if self.successes >= self.success_threshold and self.rate < self.max_rate:
+                self.successes = 0
+                self.refill()
+                self.rate = min(self.max_rate, self.rate + self.increase_step)
+
+    def on_throttle(self, retry_after=None):
+        '''
+        Учитывает ответ 429: снижает частоту и приостанавливает выдачу токенов на retry_after секунд.
+        Повторные 429 в течение cooldown секунд (ответы на уже отправленные запросы) частоту повторно не снижают.
+        '''
+        with self.lock:
+            self.successes = 0
+            self.refill()
+            now = time.monotonic()
+            if now - self.throttled_at >= self.cooldown:
+                self.throttled_at = now
+                self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+                logging.warning(f"Получен ответ 429, частота запросов снижена до {self.rate:.2f} в секунду")
+            if retry_after:
+                self.tokens = min(self.tokens, -retry_after * self.rate)
+
+#Политика повторов запросов с экспоненциальной задержкой
+class RetryPolicy:
+    '''
+    Определяет, какие ответы нужно повторять, и сколько ждать перед повтором:
+    экспоненциальная задержка base_delay * 2^attempt (не более max_delay) со случайным разбросом (full jitter),
+    либо значение заголовка Retry-After, если сервер его прислал.
+    '''
+    def __init__(self, max_retries=5, base_delay=1.0, max_delay=60.0, retry_statuses=(429, 500, 502, 503, 504)):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retry_statuses = set(retry_statuses)
+
+    def parse_retry_after(self, headers):
+        """
+        Возвращает значение заголовка Retry-After в секундах или None.
+        """
+        value = headers.get('Retry-After') if headers else None
+        try:
+            return max(0.0, float(value))
+        except (TypeError, ValueError):
+            return None
+
+    def get_delay(self, attempt, retry_after=None):
+        """
+        Возвращает задержку в секундах перед повтором номер attempt (нумерация с нуля).
+        """
+        if retry_after is not None:
+            return min(self.max_delay, retry_after)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+#Очередь заданий с отложенными повторами
+class RetryQueue:
+    '''
+    Очередь заданий, упорядоченная по времени готовности. Новые задания выдаются в порядке добавления,
+    а неудачные возвращаются в очередь с задержкой и выдаются, когда она истечет.
+    '''
+    def __init__(self):
+        self.heap = []
+        self.counter = itertools.count()
+
+    def push(self, item, attempt=0, delay=0.0):
+        """
+        Добавляет задание, которое станет доступно через delay секунд.
+        """
+        heapq.heappush(self.heap, (time.monotonic() + delay, next(self.counter), item, attempt))
+
+    def pop(self):
+        """
+        Возвращает ближайшее задание в виде (задание, номер попытки), при необходимости дожидаясь его готовности.
+        """
+        ready_at, _, item, attempt = heapq.heappop(self.heap)
+        wait = ready_at - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        return item, attempt
+
+    def __len__(self):
+        return len(self.heap)
+
+#Локальный индекс загруженных вакансий для инкрементального обхода
+class VacancyIndex:
+    '''
+    Постоянный индекс загруженных вакансий в SQLite: id -> время загрузки, published_at, хеш содержимого,
+    код ответа и хеш данных из выдачи поиска. Индекс целиком загружается в память при создании, поэтому
+    решение о повторной загрузке вакансии принимается без обращения к файловой системе.
+    При первом создании индекс заполняется по уже существующим файлам в папке vacancies.
+    '''
+    # Поля выдачи поиска, которые меняются без изменения самой вакансии и не учитываются в хеше
+    VOLATILE_LISTING_FIELDS = ('counters', 'relations', 'sort_point_distance')
+    # Коды ответа для удаленных и снятых с публикации вакансий: повторять такой запрос бесполезно
+    GONE_STATUSES = (404, 410)
+
+    def __init__(self, db_path='./docs/vacancy_index.sqlite', vacancies_folder='./docs/vacancies', batch_size=500):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.lock = threading.Lock()
+        self.pending = []
+        self.connection = sqlite3.connect(db_path, timeout=60, check_same_thread=False)
+        self.connection.execute('''
+            CREATE TABLE IF NOT EXISTS vacancies (
+                id TEXT PRIMARY KEY,
+                fetched_at REAL,
+                published_at TEXT,
+                content_hash TEXT,
+                status INTEGER,
+                listing_hash TEXT
+            )''')
+        self.connection.commit()
+
+        # Загружаем индекс в память одним запросом
+        self.entries = {row[0]: list(row[1:]) for row in self.connection.execute('SELECT * FROM vacancies')}
+        if not self.entries and vacancies_folder and os.path.isdir(vacancies_folder):
+            self.import_folder(vacancies_folder)
+
+    def import_folder(self, folder, min_size=1060):
+        '''
+        Заполняет индекс по существующим файлам вакансий (однократная миграция со старого формата хранения).
+        Файлы размером не больше min_size байт считаются незагруженными, как и раньше.
+        '''
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                if entry.name.endswith('.json') and entry.stat().st_size > min_size:
+                    self.entries[entry.name[:-5]] = [entry.stat().st_mtime, None, None, 200, None]
+                    self.pending.append((entry.name[:-5], entry.stat().st_mtime, None, None, 200, None))
+        self.flush()
+        logging.info(f'Индекс вакансий заполнен по папке {folder}: {len(self.entries)} записей')
+
+    def listing_hash(self, item):
+        """
+        Хеш данных вакансии из выдачи поиска (без изменчивых полей).
+        """
+        stable = {key: value for key, value in item.items() if key not in self.VOLATILE_LISTING_FIELDS}
+        return hashlib.sha1(json.dumps(stable, sort_keys=True, ensure_ascii=False).encode('utf8')).hexdigest()
+
+    def compact(self, item):
+        '''
+        Возвращает компактное представление вакансии из выдачи поиска для очереди загрузки:
+        id, url, published_at и хеш данных выдачи.
+        '''
+        return {'id': item['id'], 'url': item['url'], 'published_at': item.get('published_at'),
+                'listing_hash': item['listing_hash'] if 'listing_hash' in item else self.listing_hash(item)}
+
+    def needs_fetch(self, item):
+        '''
+        Проверяет, нужно ли загружать детальные данные вакансии.
+
+        :param item: Словарь вакансии из выдачи поиска (полный или результат compact).
+        :return: True для новых вакансий, вакансий с неудачной загрузкой и вакансий, данные которых в выдаче изменились.
+                 Удаленные вакансии (GONE_STATUSES) загружаются повторно, только если изменились их данные в выдаче.
+        '''
+        entry = self.entries.get(str(item['id']))
+        if entry is None or (entry[3] != 200 and entry[3] not in self.GONE_STATUSES):
+            return True
+        listing_hash = item['listing_hash'] if 'listing_hash' in item else self.listing_hash(item)
+        if entry[4] is None:
+            # Запись перенесена из старого формата хранения: запоминаем текущие данные выдачи без повторной загрузки
+            self.update(item['id'], published_at=item.get('published_at'), listing_hash=listing_hash)
+            return False
+        return entry[4] != listing_hash
+
+    def mark_fetched(self, item, content, status=200, content_hash=None):
+        '''
+        Запоминает результат загрузки вакансии.
+
+        :param item: Словарь вакансии из выдачи поиска.
+        :param content: Тело ответа (bytes или str); None - данных нет (например, вакансия удалена),
+                        хеш содержимого предыдущей загрузки сохраняется.
+        :param status: Код ответа (200 или один из GONE_STATUSES).
+        :param content_hash: Хеш содержимого, если он уже вычислен (см. VacancyHistory.normalize).
+        '''
+        fields = {}
+        if content_hash is None and content is not None:
+            if isinstance(content, str):
+                content = content.encode('utf8')
+            content_hash = hashlib.sha1(content).hexdigest()
+        if content_hash is not None:
+            fields['content_hash'] = content_hash
+        self.update(item['id'], fetched_at=time.time(), published_at=item.get('published_at'), status=status,
+                    listing_hash=item['listing_hash'] if 'listing_hash' in item else self.listing_hash(item),
+                    **fields)
+
+    def update(self, vacancy_id, **fields):
+        """
+        Обновляет запись индекса в памяти и ставит её в очередь на запись в базу.
+        """
+        columns = ('fetched_at', 'published_at', 'content_hash', 'status', 'listing_hash')
+        with self.lock:
+            entry = self.entries.setdefault(str(vacancy_id), [None] * len(columns))
+            for i, column in enumerate(columns):
+                if column in fields:
+                    entry[i] = fields[column]
+            self.pending.append((str(vacancy_id), *entry))
+            flush = len(self.pending) >= self.batch_size
+        if flush:
+            self.flush()
+
+    def flush(self):
+        """
+        Записывает накопленные изменения в базу одной транзакцией.
+        """
+        with self.lock:
+            if not self.pending:
+                return
+            self.connection.executemany('INSERT OR REPLACE INTO vacancies VALUES (?, ?, ?, ?, ?, ?)', self.pending)
+            self.connection.commit()
+            self.pending = []
+
+    def close(self):
+        """
+        Записывает накопленные изменения и закрывает базу.
+        """
+        self.flush()
+        self.connection.close()
+
+    def __contains__(self, vacancy_id):
+        return str(vacancy_id) in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+#История изменений вакансий
+class VacancyHistory:
+    '''
+    История ревизий детальных данных вакансий в SQLite.
+    Данные вакансии нормализуются (без изменчивых полей, см. normalize) и хешируются; новая ревизия
+    сохраняется только при изменении хеша, поэтому размер истории растет с числом реальных изменений,
+    а не с числом загрузок. Первая ревизия и каждая snapshot_every-я хранятся целиком, остальные - в виде
+    разницы с предыдущей ревизией по полям верхнего уровня ('set' - новые значения, 'unset' - удаленные поля).
+    Все записи сжаты zlib. Номер и хеш последней ревизии каждой вакансии загружаются в память при открытии.
+    '''
+    # Поля детальных данных, которые меняются без изменения самой вакансии и не учитываются в хеше
+    VOLATILE_FIELDS = ('counters', 'relations', 'negotiations_url', 'suitable_resumes_url')
+
+    def __init__(self, db_path='./docs/vacancy_history.sqlite', snapshot_every=16):
+        self.db_path = db_path
+        self.snapshot_every = snapshot_every
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(db_path, timeout=60, check_same_thread=False)
+        # WAL позволяет нескольким процессам-обработчикам очереди дописывать историю одновременно
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('''
+            CREATE TABLE IF NOT EXISTS revisions (
+                id TEXT,
+                revision INTEGER,
+                fetched_at REAL,
+                content_hash TEXT,
+                kind TEXT,
+                data BLOB,
+                PRIMARY KEY (id, revision)
+            ) WITHOUT ROWID''')
+        self.connection.commit()
+
+        # id -> (номер последней ревизии, её хеш)
+        self.heads = {}
+        for vacancy_id, revision, content_hash in self.connection.execute(
+                'SELECT id, revision, content_hash FROM revisions ORDER BY id, revision'):
+            self.heads[vacancy_id] = (revision, content_hash)
+
+    @classmethod
+    def normalize(cls, data):
+        '''
+        Нормализует детальные данные вакансии: удаляет изменчивые поля.
+
+        :param data: Словарь вакансии (разобранный ответ /vacancies/{id}).
+        :return: Кортеж (нормализованный словарь, хеш SHA-1 его канонического JSON).
+        '''
+        stable = {key: value for key, value in data.items() if key not in cls.VOLATILE_FIELDS}
+        text = json.dumps(stable, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+        return stable, hashlib.sha1(text.encode('utf8')).hexdigest()
+
+    @staticmethod
+    def pack(value):
+        return zlib.compress(json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf8'))
+
+    @staticmethod
+    def unpack(blob):
+        return json.loads(zlib.decompress(blob))
+
+    def head(self, vacancy_id):
+        """
+        Номер и хеш последней ревизии вакансии или None, если истории нет.
+        """
+        return self.heads.get(str(vacancy_id))
+
+    def record(self, vacancy_id, data, fetched_at=None, content_hash=None):
+        '''
+        Добавляет ревизию вакансии, если её нормализованные данные изменились с последней ревизии.
+
+        :param data: Словарь вакансии (нормализуется, если не передан content_hash).
+        :param content_hash: Хеш нормализованных данных, если он уже вычислен (тогда data должен быть нормализован).
+        :return: Номер новой ревизии или None, если данные не изменились.
+        '''
+        vacancy_id = str(vacancy_id)
+        if content_hash is None:
+            data, content_hash = self.normalize(data)
+        fetched_at = fetched_at or time.time()
+        with self.lock:
+            head = self.heads.get(vacancy_id)
+            if head is not None and head[1] == content_hash:
+                return None
+            revision = 1 if head is None else head[0] + 1
+            if head is None or (revision - 1) % self.snapshot_every == 0:
+                kind, value = 'full', data
+            else:
+                previous = self.get_revision(vacancy_id, head[0])
+                kind = 'delta'
+                value = {'set': {key: item for key, item in data.items()
+                                 if key not in previous or previous[key] != item},
+                         'unset': [key for key in previous if key not in data]}
+            self.connection.execute('INSERT OR REPLACE INTO revisions VALUES (?, ?, ?, ?, ?, ?)',
+                                    (vacancy_id, revision, fetched_at, content_hash, kind, self.pack(value)))
+            self.heads[vacancy_id] = (revision, content_hash)
+        return revision
+
+    def flush(self):
+        """
+        Фиксирует добавленные ревизии в базе.
+        """
+        with self.lock:
+            self.connection.commit()
+
+    def close(self):
+        """
+        Фиксирует изменения и закрывает базу.
+        """
+        self.flush()
+        self.connection.close()
+
+    def rows(self, vacancy_id, revision=None):
+        """
+        Строки ревизий вакансии (до revision включительно) в порядке номеров.
+        """
+        query = 'SELECT revision, fetched_at, content_hash, kind, data FROM revisions WHERE id = ?'
+        params = [str(vacancy_id)]
+        if revision is not None:
+            query += ' AND revision <= ?'
+            params.append(revision)
+        return self.connection.execute(query + ' ORDER BY revision', params).fetchall()
+
+    def revisions(self, vacancy_id):
+        '''
+        Список ревизий вакансии: словари с ключами revision, fetched_at, content_hash и changed
+        (поля, изменившиеся относительно предыдущей ревизии; для полных ревизий - все поля,
+        изменившиеся относительно восстановленной предыдущей ревизии, для первой - None).
+        '''
+        result = []
+        previous = None
+        current = None
+        for revision, fetched_at, content_hash, kind, blob in self.rows(vacancy_id):
+            value = self.unpack(blob)
+            if kind == 'full':
+                current = value
+                changed = None if previous is None else sorted(
+                    key for key in set(previous) | set(current) if previous.get(key) != current.get(key))
+            else:
+                current = dict(current)
+                current.update(value['set'])
+                for key in value['unset']:
+                    current.pop(key, None)
+                changed = sorted(list(value['set']) + value['unset'])
+            result.append({'revision': revision, 'fetched_at': fetched_at, 'content_hash': content_hash,
+                           'changed': changed})
+            previous = current
+        return result
+
+    def get_revision(self, vacancy_id, revision=None):
+        '''
+        Восстанавливает нормализованные данные вакансии на ревизию revision (по умолчанию - последнюю).
+
+        :return: Словарь вакансии или None, если такой ревизии нет.
+        '''
+        if revision is None:
+            head = self.heads.get(str(vacancy_id))
+            if head is None:
+                return None
+            revision = head[0]
+        # Читаем ревизии начиная с ближайшей полной
+        rows = self.connection.execute(
+            'SELECT revision, kind, data FROM revisions WHERE id = ? AND revision <= ? AND revision >= '
+            "(SELECT MAX(revision) FROM revisions WHERE id = ? AND revision <= ? AND kind = 'full') "
+            'ORDER BY revision', (str(vacancy_id), revision, str(vacancy_id), revision)).fetchall()
+        if not rows or rows[-1][0] != revision:
+            return None
+        data = None
+        for number, kind, blob in rows:
+            value = self.unpack(blob)
+            if kind == 'full':
+                data = value
+            else:
+                data.update(value['set'])
+                for key in value['unset']:
+                    data.pop(key, None)
+        return data
+
+    def field_history(self, vacancy_id, field):
+        '''
+        История значений поля верхнего уровня (например, 'salary' или 'description').
+
+        :return: Список кортежей (ревизия, время загрузки, значение) для ревизий, в которых значение менялось.
+        '''
+        result = []
+        current = {}
+        for revision, fetched_at, content_hash, kind, blob in self.rows(vacancy_id):
+            value = self.unpack(blob)
+            if kind == 'full':
+                current = value
+            else:
+                current.update(value['set'])
+                for key in value['unset']:
+                    current.pop(key, None)
+            if not result or result[-1][2] != current.get(field):
+                result.append((revision, fetched_at, current.get(field)))
+        return result
+
+    def __contains__(self, vacancy_id):
+        return str(vacancy_id) in self.heads
+
+    def __len__(self):
+        return len(self.heads)
+
+#Хранилище сырых ответов API в сжатых сегментах
+class RawSegmentStore:
+    '''
+    Хранилище сырых JSON-ответов API (вакансий или страниц поиска) в виде сжатых сегментов JSONL
+    вместо отдельного файла на каждую запись.
+    Записи дописываются в конец текущего сегмента блоками по block_records строк; каждый блок сжимается
+    отдельно (gzip или zstd), поэтому любую запись можно прочитать, распаковав только её блок.
+    Индекс id -> (сегмент, смещение блока, длина блока, номер строки) хранится в SQLite рядом с сегментами
+    и загружается в память при открытии. При повторной записи того же id актуальной становится последняя версия.
+    В одно хранилище могут писать несколько процессов (например, обработчики run_queue_workers): запись блока
+    выполняется под блокировкой файла LOCK_FILE (fcntl.flock), которая делает атомарными выбор сегмента,
+    определение смещения и запись. Без fcntl (Windows) в хранилище может писать только один процесс.
+    '''
+    INDEX_FILE = 'index.sqlite'
+    LOCK_FILE = 'segments.lock'
+    CODECS = {'gzip': 'gz', 'zstd': 'zst'}
+
+    def __init__(self, folder, codec='gzip', block_records=64, segment_size=256 * 2 ** 20):
+        if codec not in self.CODECS:
+            raise ValueError(f"Неизвестный кодек {codec}, допустимые значения: {', '.join(self.CODECS)}")
+        if codec == 'zstd' and zstandard is None:
+            raise ImportError("Для кодека zstd необходим пакет zstandard (pip install zstandard)")
+        os.makedirs(folder, exist_ok=True)
+        self.folder = folder
+        self.codec = codec
+        self.block_records = block_records
+        self.segment_size = segment_size
+        self.lock = threading.RLock()
+        self.block = []
+
+        self.connection = sqlite3.connect(os.path.join(folder, self.INDEX_FILE), timeout=60, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('''
+            CREATE TABLE IF NOT EXISTS records (
+                id TEXT PRIMARY KEY,
+                segment TEXT,
+                offset INTEGER,
+                length INTEGER,
+                line INTEGER
+            )''')
+        self.connection.commit()
+
+        # Загружаем индекс в память одним запросом
+        self.locations = {row[0]: tuple(row[1:]) for row in self.connection.execute('SELECT * FROM records')}
+
+        # Продолжаем запись в последний сегмент
+        self.segment_number = self.last_segment_number()
+        # Файл межпроцессной блокировки записи блоков
+        self.lock_file = open(os.path.join(folder, self.LOCK_FILE), 'a') if fcntl is not None else None
+
+    def last_segment_number(self):
+        """
+        Номер последнего сегмента в папке хранилища (1, если сегментов еще нет).
+        """
+        segments = sorted(name for name in os.listdir(self.folder) if name.startswith('segment-'))
+        return int(segments[-1].split('-')[1].split('.')[0]) if segments else 1
+
+    @classmethod
+    def is_store(cls, folder):
+        """
+        Проверяет, является ли папка хранилищем сегментов.
+        """
+        return os.path.exists(os.path.join(folder, cls.INDEX_FILE))
+
+    def segment_name(self, number):
+        """
+        Имя файла сегмента с номером number.
+        """
+        return f'segment-{number:06d}.jsonl.{self.CODECS[self.codec]}'
+
+    def compress(self, data):
+        """
+        Сжимает блок кодеком хранилища.
+        """
+        if self.codec == 'zstd':
+            return zstandard.ZstdCompressor(level=3).compress(data)
+        return gzip.compress(data, compresslevel=6)
+
+    def decompress(self, data, segment):
+        """
+        Распаковывает блок сегмента segment.
+        """
+        # Кодек определяется по расширению сегмента, поэтому хранилище читается при любом кодеке записи
+        if segment.endswith('.zst'):
+            return zstandard.ZstdDecompressor().decompress(data)
+        return gzip.decompress(data)
+
+    def append(self, record_id, text):
+        '''
+        Добавляет запись в хранилище. Запись попадает на диск при заполнении блока или при вызове flush.
+
+        :param record_id: Идентификатор записи (id вакансии или имя страницы поиска).
+        :param text: Сырой JSON-ответ (str или bytes).
+        '''
+        if isinstance(text, str):
+            text = text.encode('utf8')
+        # Переводы строк вне строковых значений JSON - это пробельные символы, внутри строк они экранированы
+        line = text.replace(b'\r', b' ').replace(b'\n', b' ')
+        with self.lock:
+            self.block.append((str(record_id), line))
+            if len(self.block) >= self.block_records:
+                self.flush_block()
+
+    def flush_block(self):
+        """
+        Сжимает накопленный блок, дописывает его в текущий сегмент и обновляет индекс.
+        """
+        if not self.block:
+            return
+        data = self.compress(b'\n'.join(line for _, line in self.block) + b'\n')
+        if self.lock_file is not None:
+            fcntl.flock(self.lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            if self.lock_file is not None:
+                # Другие процессы могли начать новый сегмент
+                self.segment_number = max(self.segment_number, self.last_segment_number())
+            path = os.path.join(self.folder, self.segment_name(self.segment_number))
+            if os.path.exists(path) and os.path.getsize(path) + len(data) > self.segment_size:
+                self.segment_number += 1
+                path = os.path.join(self.folder, self.segment_name(self.segment_number))
+
+            with open(path, 'ab') as f:
+                offset = f.tell()
+                f.write(data)
+
+            segment = os.path.basename(path)
+            rows = [(record_id, segment, offset, len(data), line) for line, (record_id, _) in enumerate(self.block)]
+            self.connection.executemany('INSERT OR REPLACE INTO records VALUES (?, ?, ?, ?, ?)', rows)
+            self.connection.commit()
+        finally:
+            if self.lock_file is not None:
+                fcntl.flock(self.lock_file.fileno(), fcntl.LOCK_UN)
+        for row in rows:
+            self.locations[row[0]] = row[1:]
+        self.block = []
+
+    def flush(self):
+        """
+        Записывает на диск неполный текущий блок.
+        """
+        with self.lock:
+            self.flush_block()
+
+    def close(self):
+        """
+        Записывает неполный блок и закрывает индекс.
+        """
+        self.flush()
+        self.connection.close()
+        if self.lock_file is not None:
+            self.lock_file.close()
+
+    def read_block(self, segment, offset, length, file=None):
+        """
+        Читает и распаковывает блок, возвращает список строк-записей (bytes).
+        """
+        if file is None:
+            with open(os.path.join(self.folder, segment), 'rb') as f:
+                f.seek(offset)
+                data = f.read(length)
+        else:
+            file.seek(offset)
+            data = file.read(length)
+        return self.decompress(data, segment).split(b'\n')[:-1]
+
+    def get(self, record_id):
+        '''
+        Возвращает сырой JSON записи в виде строки или None, если записи нет.
+        '''
+        record_id = str(record_id)
+        with self.lock:
+            for pending_id, line in reversed(self.block):
+                if pending_id == record_id:
+                    return line.decode('utf8')
+            location = self.locations.get(record_id)
+            if location is None:
+                # Запись могла быть добавлена другим процессом после открытия хранилища
+                row = self.connection.execute('SELECT segment, offset, length, line FROM records WHERE id = ?',
+                                              (record_id,)).fetchone()
+                if row is not None:
+                    location = self.locations[record_id] = tuple(row)
+        if location is None:
+            return None
+        segment, offset, length, line = location
+        return self.read_block(segment, offset, length)[line].decode('utf8')
+
+    def iter_records(self):
+        '''
+        Последовательно читает хранилище и возвращает пары (id, сырой JSON) для актуальных версий записей.
+        Сегменты читаются блоками в порядке записи, каждый блок распаковывается один раз.
+        '''
+        self.flush()
+        with self.lock:
+            current = {(segment, offset, line): record_id
+                       for record_id, (segment, offset, length, line) in self.locations.items()}
+            blocks = sorted({(segment, offset, length) for segment, offset, length, _ in self.locations.values()})
+
+        opened_segment, file = None, None
+        try:
+            for segment, offset, length in blocks:
+                if segment != opened_segment:
+                    if file is not None:
+                        file.close()
+                    file = open(os.path.join(self.folder, segment), 'rb')
+                    opened_segment = segment
+                for line_number, line in enumerate(self.read_block(segment, offset, length, file)):
+                    record_id = current.get((segment, offset, line_number))
+                    if record_id is not None:
+                        yield record_id, line.decode('utf8')
+        finally:
+            if file is not None:
+                file.close()
+
+    def import_folder(self, folder):
+        '''
+        Переносит в хранилище JSON-файлы из папки (например, ./docs/vacancies); id записи - имя файла без .json.
+
+        :return: Количество перенесенных файлов.
+        '''
+        count = 0
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                if entry.name.endswith('.json'):
+                    with open(entry.path, 'rb') as f:
+                        self.append(entry.name[:-5], f.read())
+                    count += 1
+        self.flush()
+        logging.info(f'В хранилище {self.folder} перенесено файлов: {count}')
+        return count
+
+    def __contains__(self, record_id):
+        return str(record_id) in self.locations
+
+    def __len__(self):
+        return len(self.locations)
+
+#Ленивое чтение сырых вакансий с произвольным доступом по индексу метаданных
+class RawCorpusReader:
+    '''
+    Чтение сырых вакансий с произвольным доступом: из папки с JSON-файлами (./docs/vacancies)
+    или из хранилища сегментов RawSegmentStore. Вне папки с данными ведется индекс метаданных
+    (по умолчанию {папка}_corpus_index.sqlite рядом с ней, см. default_index_path):
+    id -> employer_id, area_id, published_at (timestamp) и расположение записи
+    (файл или сегмент, смещение и длина блока, номер строки). По индексу выбираются нужные записи
+    (см. select), а разбираются только они и только при обращении (см. iter_raw, get), поэтому выборка
+    по работодателю или диапазону дат стоит пропорционально размеру выборки, а не всего корпуса.
+    Сегменты и файлы больше mmap_threshold байт читаются через mmap без копирования файла в память.
+    При открытии индекс обновляется инкрементально: метаданные извлекаются только для новых
+    и изменившихся файлов (по размеру и времени изменения) или записей хранилища (по расположению).
+    Папка с файлами сканируется, только если изменилось время изменения самой папки (файлы добавлены
+    или удалены); файлы, перезаписанные на месте, учитываются при refresh(full=True).
+    '''
+    INDEX_FILE = 'corpus_index.sqlite'
+    META_FIELDS = ('employer_id', 'area_id', 'published_at')
+
+    def __init__(self, folder='./docs/vacancies', index_path=None, refresh=True, mmap_threshold=2 ** 20):
+        self.folder = folder
+        self.mmap_threshold = mmap_threshold
+        self.maps = {}
+        self.store = RawSegmentStore(folder) if RawSegmentStore.is_store(folder) else None
+        self.index_path = index_path or self.default_index_path(folder)
+        self.connection = sqlite3.connect(self.index_path, check_same_thread=False)
+        self.connection.execute('''
+            CREATE TABLE IF NOT EXISTS records (
+                id TEXT PRIMARY KEY,
+                employer_id TEXT,
+                area_id TEXT,
+                published_at REAL,
+                location TEXT,
+                offset INTEGER,
+                length INTEGER,
+                line INTEGER,
+                stamp TEXT
+            )''')
+        for column in self.META_FIELDS:
+            self.connection.execute(f'CREATE INDEX IF NOT EXISTS records_{column} ON records ({column})')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value)')
+        self.connection.commit()
+
+        # Расположение записей целиком в памяти: id -> (файл или сегмент, смещение, длина, строка, отметка)
+        self.locations = {row[0]: tuple(row[1:]) for row in self.connection.execute(
+            'SELECT id, location, offset, length, line, stamp FROM records')}
+        if refresh:
+            self.refresh()
+
+    @classmethod
+    def default_index_path(cls, folder):
+        """
+        Путь индекса метаданных по умолчанию: файл {имя папки}_corpus_index.sqlite рядом с папкой данных.
+        """
+        folder = os.path.abspath(folder)
+        return os.path.join(os.path.dirname(folder), f'{os.path.basename(folder)}_{cls.INDEX_FILE}')
+
+    @staticmethod
+    def to_timestamp(value):
+        '''
+        Переводит дату в timestamp: число, datetime или строку в формате API hh.ru ('2024-01-31T10:00:00+0300')
+        или ISO 8601 ('2024-01-31'). Возвращает None для пустых и неразобранных значений.
+        '''
+        if value is None or isinstance(value, (int, float)):
+            return value
+        if isinstance(value, datetime):
+            return value.timestamp()
+        try:
+            return datetime.strptime(value, '%Y-%m-%dT%H:%M:%S%z').timestamp()
+        except (TypeError, ValueError):
+            pass
+        try:
+            return datetime.fromisoformat(value).timestamp()
+        except (TypeError, ValueError):
+            return None
+
+    def metadata(self, raw):
+        """
+        Извлекает метаданные индекса (employer_id, area_id, published_at) из сырого JSON вакансии.
+        """
+        try:
+            data = json_loads(raw)
+        except Exception as e:
+            logging.error(f'Ошибка при разборе вакансии для индекса {self.folder}: {str(e)}')
+            return None, None, None
+        if not isinstance(data, dict):
+            return None, None, None
+        employer = data.get('employer') or {}
+        area = data.get('area') or {}
+        return employer.get('id'), area.get('id'), self.to_timestamp(data.get('published_at'))
+
+    def refresh(self, full=False):
+        '''
+        Обновляет индекс метаданных по текущему содержимому папки или хранилища.
+
+        :param full: Если True, папка с файлами сканируется, даже если время её изменения не изменилось.
+        :return: Количество записей, для которых метаданные извлечены заново.
+        '''
+        rows = []
+        if self.store is None:
+            # Время изменения папки запоминается до сканирования: файлы, добавленные во время сканирования,
+            # будут учтены при следующем обновлении
+            folder_mtime = os.stat(self.folder).st_mtime_ns
+            row = self.connection.execute("SELECT value FROM meta WHERE name = 'folder_mtime'").fetchone()
+            if not full and row is not None and row[0] == folder_mtime:
+                return 0
+            current = set()
+            with os.scandir(self.folder) as entries:
+                for entry in entries:
+                    if not entry.name.endswith('.json'):
+                        continue
+                    record_id = entry.name[:-5]
+                    current.add(record_id)
+                    stat = entry.stat()
+                    stamp = f'{stat.st_mtime_ns}:{stat.st_size}'
+                    location = self.locations.get(record_id)
+                    if location is not None and location[4] == stamp:
+                        continue
+                    rows.append((record_id, *self.metadata(self.read_file(entry.name, stat.st_size)),
+                                 entry.name, 0, stat.st_size, None, stamp))
+        else:
+            self.store.flush()
+            current = set(self.store.locations)
+            changed = {}
+            for record_id, (segment, offset, length, line) in self.store.locations.items():
+                location = self.locations.get(record_id)
+                if location is None or location[:4] != (segment, offset, length, line):
+                    changed[record_id] = (segment, offset, length, line)
+            for record_id, raw in self.iter_locations(changed):
+                segment, offset, length, line = changed[record_id]
+                rows.append((record_id, *self.metadata(raw), segment, offset, length, line, None))
+
+        removed = [record_id for record_id in self.locations if record_id not in current]
+        if self.store is None:
+            self.connection.execute("INSERT OR REPLACE INTO meta VALUES ('folder_mtime', ?)", (folder_mtime,))
+        if rows:
+            self.connection.executemany('INSERT OR REPLACE INTO records VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', rows)
+            for row in rows:
+                self.locations[row[0]] = row[4:]
+        if removed:
+            self.connection.executemany('DELETE FROM records WHERE id = ?', [(record_id,) for record_id in removed])
+            for record_id in removed:
+                del self.locations[record_id]
+        self.connection.commit()
+        if rows or removed:
+            logging.info(f'Индекс метаданных {self.folder} обновлен: изменено {len(rows)}, удалено {len(removed)}')
+        return len(rows)
+
+    def mapped(self, name):
+        '''
+        Возвращает mmap файла name (файлы отображаются один раз и переиспользуются).
+        Если файл вырос после отображения (в сегмент дописаны блоки), он отображается заново.
+        '''
+        path = os.path.join(self.folder, name)
+        size = os.path.getsize(path)
+        current = self.maps.get(name)
+        if current is not None and len(current) >= size:
+            return current
+        if current is not None:
+            current.close()
+        with open(path, 'rb') as f:
+            self.maps[name] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return self.maps[name]
+
+    def read_file(self, name, size=None, offset=0):
+        """
+        Читает файл name (или его часть с offset длиной size): большие файлы - через mmap.
+        """
+        if size is None:
+            size = os.path.getsize(os.path.join(self.folder, name)) - offset
+        if size == 0:
+            return b''
+        if offset + size >= self.mmap_threshold:
+            return self.mapped(name)[offset:offset + size]
+        with open(os.path.join(self.folder, name), 'rb') as f:
+            f.seek(offset)
+            return f.read(size)
+
+    def iter_locations(self, locations):
+        '''
+        Читает записи по расположению в порядке хранения и возвращает пары (id, сырой JSON в байтах).
+        Каждый блок хранилища сегментов распаковывается один раз.
+
+        :param locations: Словарь id -> (файл или сегмент, смещение, длина, строка).
+        '''
+        ordered = sorted(locations.items(), key=lambda item: (item[1][0], item[1][1] or 0, item[1][3] or 0))
+        block_key, lines = None, None
+        for record_id, (name, offset, length, line) in ordered:
+            if line is None:
+                # Файл вакансии читается целиком: он мог быть перезаписан после обновления индекса
+                yield record_id, self.read_file(name, offset=offset)
+                continue
+            if (name, offset) != block_key:
+                lines = self.store.decompress(self.read_file(name, length, offset), name).split(b'\n')[:-1]
+                block_key = (name, offset)
+            yield record_id, lines[line]
+
+    def select(self, ids=None, employer_id=None, area_id=None, date_from=None, date_to=None, limit=None):
+        '''
+        Выбирает id вакансий по индексу метаданных, не читая данные.
+
+        :param ids: Список id или None.
+        :param employer_id: Id работодателя или список id.
+        :param area_id: Id региона или список id.
+        :param date_from: Начало диапазона даты публикации включительно (см. to_timestamp).
+        :param date_to: Конец диапазона даты публикации включительно.
+        :return: Список id в порядке хранения (для последовательного чтения).
+        '''
+        conditions, params = [], []
+        for column, value in (('id', ids), ('employer_id', employer_id), ('area_id', area_id)):
+            if value is None:
+                continue
+            values = [str(item) for item in value] if isinstance(value, (list, tuple, set)) else [str(value)]
+            conditions.append(f"{column} IN ({', '.join('?' * len(values))})")
+            params.extend(values)
+        for operator_sql, value in (('>=', date_from), ('<=', date_to)):
+            if value is not None:
+                conditions.append(f'published_at {operator_sql} ?')
+                params.append(self.to_timestamp(value))
+        query = 'SELECT id FROM records'
+        if conditions:
+            query += ' WHERE ' + ' AND '.join(conditions)
+        query += ' ORDER BY location, offset, line'
+        if limit is not None:
+            query += f' LIMIT {int(limit)}'
+        return [row[0] for row in self.connection.execute(query, params)]
+
+    def iter_raw(self, ids=None, **filters):
+        '''
+        Генератор пар (id, сырой JSON в байтах) для выбранных вакансий: по списку ids или по фильтрам select.
+        Записи читаются лениво, в порядке хранения.
+        '''
+        if ids is None or filters:
+            ids = self.select(ids=ids, **filters)
+        locations = {}
+        for record_id in ids:
+            location = self.locations.get(str(record_id))
+            if location is not None:
+                locations[str(record_id)] = location[:4]
+        yield from self.iter_locations(locations)
+
+    def iter_records(self, ids=None, **filters):
+        '''
+        Генератор пар (id, разобранный JSON вакансии) для выбранных вакансий (см. iter_raw).
+        '''
+        for record_id, raw in self.iter_raw(ids, **filters):
+            yield record_id, json_loads(raw)
+
+    def get_raw(self, record_id):
+        """
+        Возвращает сырой JSON вакансии в байтах или None, если вакансии нет.
+        """
+        for _, raw in self.iter_raw([record_id]):
+            return raw
+        return None
+
+    def get(self, record_id):
+        """
+        Возвращает разобранный JSON вакансии или None, если вакансии нет.
+        """
+        raw = self.get_raw(record_id)
+        return None if raw is None else json_loads(raw)
+
+    def path(self, record_id):
+        """
+        Путь к JSON-файлу вакансии (только для папки с файлами) или None.
+        """
+        location = self.locations.get(str(record_id))
+        if location is None or self.store is not None:
+            return None
+        return os.path.join(self.folder, location[0])
+
+    def close(self):
+        """
+        Закрывает отображения файлов, индекс метаданных и хранилище сегментов.
+        """
+        for current in self.maps.values():
+            current.close()
+        self.maps = {}
+        self.connection.close()
+        if self.store is not None:
+            self.store.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def __contains__(self, record_id):
+        return str(record_id) in self.locations
+
+    def __len__(self):
+        return len(self.locations)
+
+#Кэшируемое дерево регионов hh.ru с индексами для быстрого поиска
+class AreaTree:
+    '''
+    Дерево регионов API hh.ru (/areas) с локальным кэшем на диске.
+    Кэш хранит дерево в плоском виде (id, parent_id, name) и ETag ответа. Пока кэш моложе ttl секунд,
+    дерево загружается с диска без обращения к сети; устаревший кэш перепроверяется условным запросом
+    (If-None-Match), и при ответе 304 дерево не скачивается повторно. В памяти строятся индексы
+    id -> узел, parent_id -> дочерние узлы и название -> id, поэтому поиск региона и его подрегионов не требует
+    перебора всего дерева.
+    '''
+    def __init__(self, http_client=None, cache_path='./docs/areas.json', ttl=7 * 86400,
+                 url='https://api.hh.ru/areas'):
+        self.http_client = http_client or HHHttpClient()
+        self.cache_path = cache_path
+        self.ttl = ttl
+        self.url = url
+        self.etag = None
+        self.fetched_at = 0
+        self.nodes = {}
+        self.children = {}
+        self.names = {}
+        self.loaded = False
+
+    def load(self):
+        '''
+        Загружает дерево из кэша или из API (с перепроверкой устаревшего кэша по ETag).
+        Если API недоступен, используется устаревший кэш.
+        '''
+        flat = self.read_cache()
+        if flat is not None and time.time() - self.fetched_at < self.ttl:
+            self.build_index(flat)
+            return
+
+        headers = {'If-None-Match': self.etag} if flat is not None and self.etag else {}
+        try:
+            response = self.http_client.get(self.url, headers=headers)
+        except requests.RequestException as e:
+            logging.error(f"Ошибка при запросе дерева регионов: {str(e)}")
+            response = None
+
+        if response is not None and response.status_code == 304:
+            # Дерево не изменилось: продлеваем срок действия кэша
+            self.fetched_at = time.time()
+            self.write_cache(flat)
+        elif response is not None and response.status_code == 200:
+            flat = self.flatten(response.json())
+            self.etag = response.headers.get('ETag')
+            self.fetched_at = time.time()
+            self.write_cache(flat)
+        elif flat is None:
+            status = response.status_code if response is not None else None
+            logging.error(f"Ошибка при запросе: {status}")
+            flat = []
+        else:
+            logging.warning("Дерево регионов не обновлено, используется устаревший кэш")
+        self.build_index(flat)
+
+    def flatten(self, areas, parent_id=None):
+        """
+        Преобразует вложенное дерево регионов в плоский список [id, parent_id, name].
+        """
+        flat = []
+        stack = [(area, parent_id) for area in reversed(areas)]
+        while stack:
+            area, parent = stack.pop()
+            flat.append([area['id'], area.get('parent_id', parent), area['name']])
+            stack.extend((child, area['id']) for child in reversed(area.get('areas') or []))
+        return flat
+
+    def read_cache(self):
+        """
+        Читает плоское дерево из кэша или возвращает None, если кэша нет.
+        """
+        try:
+            with open(self.cache_path, encoding='utf8') as f:
+                cache = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        self.etag = cache.get('etag')
+        self.fetched_at = cache.get('fetched_at', 0)
+        return cache.get('nodes', [])
+
+    def write_cache(self, flat):
+        """
+        Атомарно записывает кэш (через временный файл и os.replace).
+        """
+        directory = os.path.dirname(self.cache_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = self.cache_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf8') as f:
+            json.dump({'etag': self.etag, 'fetched_at': self.fetched_at, 'nodes': flat}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.cache_path)
+
+    def build_index(self, flat):
+        """
+        Строит индексы id -> узел, parent_id -> список id дочерних узлов и название -> список id.
+        """
+        self.nodes = {}
+        self.children = {}
+        self.names = {}
+        for area_id, parent_id, name in flat:
+            self.nodes[area_id] = {'id': area_id, 'parent_id': parent_id, 'name': name}
+            self.children.setdefault(parent_id, []).append(area_id)
+            self.names.setdefault(name.lower(), []).append(area_id)
+        self.loaded = True
+
+    def ensure_loaded(self):
+        """
+        Загружает дерево при первом обращении.
+        """
+        if not self.loaded:
+            self.load()
+
+    def get(self, area_id):
+        """
+        Возвращает узел региона по id или None.
+        """
+        self.ensure_loaded()
+        return self.nodes.get(str(area_id))
+
+    def children_of(self, area_id):
+        """
+        Возвращает список дочерних регионов.
+        """
+        self.ensure_loaded()
+        return [self.nodes[child_id] for child_id in self.children.get(str(area_id), [])]
+
+    def descendants(self, area_id):
+        """
+        Возвращает список всех вложенных регионов (на любой глубине).
+        """
+        self.ensure_loaded()
+        result = []
+        stack = list(reversed(self.children.get(str(area_id), [])))
+        while stack:
+            child_id = stack.pop()
+            result.append(self.nodes[child_id])
+            stack.extend(reversed(self.children.get(child_id, [])))
+        return result
+
+    def find(self, name):
+        """
+        Возвращает список id регионов с заданным названием (без учета регистра).
+        """
+        self.ensure_loaded()
+        return list(self.names.get(name.lower(), []))
+
+#Постоянная очередь заданий обхода для нескольких процессов
+class CrawlJobQueue:
+    '''
+    Постоянная очередь заданий обхода в SQLite: страницы поиска (role, area, shard, page) и загрузка
+    детальных данных вакансий. Задания выдаются обработчикам в аренду (lease) на lease_seconds секунд:
+    подтвержденные (ack) задания считаются выполненными, неудачные возвращаются в очередь с задержкой (nack),
+    а задания упавшего обработчика снова становятся доступны после истечения аренды; истечение аренды считается
+    неудачной попыткой, поэтому задание, которое каждый раз роняет обработчик, после max_attempts попыток
+    помечается как невыполнимое. Подтвердить, вернуть или отклонить задание может только обработчик,
+    которому оно выдано в аренду, и только пока аренда не передана другому обработчику. Поэтому обход можно
+    остановить в любой момент и продолжить, а обработчики могут работать в нескольких процессах
+    (и на нескольких машинах с общим хранилищем, если файловая система корректно поддерживает блокировки SQLite).
+    Задания дедуплицируются по ключу: повторно добавленное задание игнорируется, пока не начат новый обход.
+    '''
+    def __init__(self, db_path='./docs/crawl_queue.sqlite', lease_seconds=300, max_attempts=8):
+        self.db_path = db_path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(db_path, timeout=60, isolation_level=None, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('''
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT,
+                key TEXT UNIQUE,
+                payload TEXT,
+                status TEXT,
+                attempts INTEGER DEFAULT 0,
+                available_at REAL,
+                lease_owner TEXT,
+                lease_until REAL,
+                updated_at REAL,
+                error TEXT
+            )''')
+        self.connection.execute('CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, available_at)')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value)')
+
+    def execute(self, sql, params=(), many=False):
+        """
+        Выполняет запрос в отдельной транзакции с немедленной блокировкой базы на запись.
+        """
+        with self.lock:
+            self.connection.execute('BEGIN IMMEDIATE')
+            try:
+                cursor = (self.connection.executemany if many else self.connection.execute)(sql, params)
+                rows = cursor.fetchall()
+                self.connection.execute('COMMIT')
+                return rows
+            except Exception:
+                self.connection.execute('ROLLBACK')
+                raise
+
+    def start_crawl(self):
+        '''
+        Отмечает начало нового обхода: выполненные ранее задания с теми же ключами снова можно добавить в очередь.
+        '''
+        self.execute("INSERT OR REPLACE INTO meta VALUES ('crawl_started_at', ?)", (time.time(),))
+
+    def put(self, kind, key, payload, delay=0.0):
+        """
+        Добавляет задание (см. put_many).
+        """
+        self.put_many([(kind, key, payload)], delay)
+
+    def put_many(self, jobs, delay=0.0):
+        '''
+        Добавляет задания в очередь одной транзакцией.
+        Задание с уже существующим ключом игнорируется, если оно еще не выполнено или выполнено в текущем обходе.
+
+        :param jobs: Список кортежей (вид задания, ключ, данные задания в виде словаря).
+        '''
+        if not jobs:
+            return
+        now = time.time()
+        rows = [(kind, key, json.dumps(payload, ensure_ascii=False), now + delay, now) for kind, key, payload in jobs]
+        self.execute('''
+            INSERT INTO jobs (kind, key, payload, status, attempts, available_at, updated_at)
+            VALUES (?, ?, ?, 'pending', 0, ?, ?)
+            ON CONFLICT(key) DO UPDATE SET
+                payload = excluded.payload, status = 'pending', attempts = 0, error = NULL,
+                available_at = excluded.available_at, updated_at = excluded.updated_at
+            WHERE jobs.status IN ('done', 'failed')
+                AND jobs.updated_at < (SELECT value FROM meta WHERE name = 'crawl_started_at')
+            ''', rows, many=True)
+
+    def lease(self, worker_id, limit=1, kinds=None):
+        '''
+        Выдает обработчику worker_id до limit доступных заданий в аренду.
+        Доступны ожидающие задания, время повтора которых наступило, и задания с истекшей арендой: у них
+        увеличивается число попыток, а исчерпавшие max_attempts попыток помечаются как невыполнимые ('failed').
+
+        :return: Список словарей с ключами 'id', 'kind', 'key', 'payload', 'attempts' и 'lease_until'.
+        '''
+        now = time.time()
+        kinds_filter = ''
+        params = [now, now]
+        if kinds:
+            kinds_filter = f"AND kind IN ({', '.join('?' * len(kinds))})"
+            params.extend(kinds)
+        with self.lock:
+            self.connection.execute('BEGIN IMMEDIATE')
+            try:
+                # Задания, обработчики которых не успели выполнить их за max_attempts аренд, больше не выдаются
+                self.connection.execute('''
+                    UPDATE jobs SET attempts = attempts + 1, status = 'failed', lease_owner = NULL, updated_at = ?,
+                        error = 'Аренда истекла'
+                    WHERE status = 'leased' AND lease_until < ? AND attempts + 1 >= ?''',
+                    (now, now, self.max_attempts))
+                rows = self.connection.execute(f'''
+                    SELECT id, kind, key, payload, attempts, status FROM jobs
+                    WHERE ((status = 'pending' AND available_at <= ?) OR (status = 'leased' AND lease_until < ?))
+                        {kinds_filter}
+                    ORDER BY id LIMIT ?''', (*params, limit)).fetchall()
+                # Истекшая аренда - неудачная попытка предыдущего обработчика
+                rows = [(*row[:4], row[4] + (row[5] == 'leased')) for row in rows]
+                self.connection.executemany('''
+                    UPDATE jobs SET status = 'leased', attempts = ?, lease_owner = ?, lease_until = ?, updated_at = ?
+                    WHERE id = ?''', [(row[4], worker_id, now + self.lease_seconds, now, row[0]) for row in rows])
+                self.connection.execute('COMMIT')
+            except Exception:
+                self.connection.execute('ROLLBACK')
+                raise
+        return [{'id': row[0], 'kind': row[1], 'key': row[2], 'payload': json.loads(row[3]), 'attempts': row[4],
+                 'lease_until': now + self.lease_seconds} for row in rows]
+
+    def ack(self, worker_id, job_ids):
+        '''
+        Подтверждает выполнение заданий (список id), выданных в аренду обработчику worker_id.
+        Задания, аренда которых уже передана другому обработчику, не меняются.
+        '''
+        now = time.time()
+        self.execute('''
+            UPDATE jobs SET status = 'done', lease_owner = NULL, updated_at = ?
+            WHERE id = ? AND lease_owner = ? AND status = 'leased'
+            ''', [(now, job_id, worker_id) for job_id in job_ids], many=True)
+
+    def nack(self, worker_id, job_id, delay=0.0, error=None):
+        '''
+        Возвращает задание, выданное в аренду обработчику worker_id, в очередь с задержкой delay секунд.
+        После max_attempts неудачных попыток задание помечается как невыполнимое ('failed').
+        '''
+        now = time.time()
+        self.execute('''
+            UPDATE jobs SET
+                attempts = attempts + 1,
+                status = CASE WHEN attempts + 1 >= ? THEN 'failed' ELSE 'pending' END,
+                available_at = ?, lease_owner = NULL, updated_at = ?, error = ?
+            WHERE id = ? AND lease_owner = ? AND status = 'leased'
+            ''', (self.max_attempts, now + delay, now, error, job_id, worker_id))
+
+    def fail(self, worker_id, job_id, error=None):
+        """
+        Помечает задание, выданное в аренду обработчику worker_id, как невыполнимое (повторять его бессмысленно).
+        """
+        self.execute('''
+            UPDATE jobs SET status = 'failed', lease_owner = NULL, updated_at = ?, error = ?
+            WHERE id = ? AND lease_owner = ? AND status = 'leased'
+            ''', (time.time(), error, job_id, worker_id))
+
+    def next_available_in(self):
+        '''
+        Возвращает количество секунд до появления доступного задания, 0 - если задания доступны сейчас,
+        или None, если незавершенных заданий нет (обход закончен).
+        '''
+        with self.lock:
+            row = self.connection.execute('''
+                SELECT MIN(CASE WHEN status = 'pending' THEN available_at ELSE lease_until END) FROM jobs
+                WHERE status IN ('pending', 'leased')''').fetchone()
+        if row[0] is None:
+            return None
+        return max(0.0, row[0] - time.time())
+
+    def stats(self):
+        """
+        Возвращает количество заданий по видам и статусам: {(вид, статус): количество}.
+        """
+        with self.lock:
+            rows = self.connection.execute('SELECT kind, status, COUNT(*) FROM jobs GROUP BY kind, status').fetchall()
+        return {(kind, status): count for kind, status, count in rows}
+
+    def close(self):
+        """
+        Закрывает соединение с базой очереди.
+        """
+        self.connection.close()
+
+#Бюджет запросов на один запуск обхода (квота API или ограничение по времени)
+class RequestBudget:
+    '''
+    Ограничение количества запросов к API и (или) времени работы одного запуска обхода.
+    Каждая попытка запроса (включая повторы) расходует единицу бюджета; после исчерпания бюджета
+    запросы не выполняются. Счетчик общий для всех потоков.
+
+    :param limit: Максимальное количество запросов или None (без ограничения).
+    :param seconds: Максимальное время работы в секундах от создания бюджета или None.
+    '''
+    def __init__(self, limit=None, seconds=None):
+        self.limit = limit
+        self.deadline = None if seconds is None else time.monotonic() + seconds
+        self.used = 0
+        self.lock = threading.Lock()
+
+    @property
+    def remaining(self):
+        """
+        Количество оставшихся запросов (None, если количество не ограничено).
+        """
+        return None if self.limit is None else max(0, self.limit - self.used)
+
+    @property
+    def exhausted(self):
+        """
+        True, если бюджет запросов или времени исчерпан.
+        """
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            return True
+        return self.limit is not None and self.used >= self.limit
+
+    def share_used(self, share):
+        """
+        Проверяет, израсходована ли доля share бюджета запросов (для бюджета без лимита - всегда False).
+        """
+        return self.limit is not None and self.used >= self.limit * share
+
+    def take(self):
+        '''
+        Расходует один запрос из бюджета.
+
+        :return: True, если запрос можно выполнить, и False, если бюджет исчерпан.
+        '''
+        with self.lock:
+            if self.exhausted:
+                return False
+            self.used += 1
+            return True
+
+#Планировщик обхода: порядок комбинаций профессий и регионов и загрузки вакансий по ожидаемой пользе
+class CrawlScheduler:
+    '''
+    Планировщик приоритетного обхода. Для каждой комбинации профессии и региона в SQLite хранятся
+    количество найденных вакансий (found), время последнего обхода, оценка скорости изменений
+    (новых и изменившихся вакансий в час) и количество вакансий, которые не успели загрузить
+    в пределах бюджета (backlog). Приоритет комбинации - ожидаемое количество вакансий к загрузке:
+    для еще не обходившихся комбинаций он бесконечен, для остальных равен
+    min(found, backlog + скорость * часы с последнего обхода). Пока скорость не измерена, она оценивается как
+    found за max_age_days дней (срок жизни вакансии в выдаче); после каждого обхода скорость
+    обновляется экспоненциальным сглаживанием наблюдаемого значения.
+    Загрузка детальных данных упорядочивается так: сначала новые вакансии, затем изменившиеся,
+    внутри групп - по убыванию даты публикации.
+
+    :param smoothing: Вес последнего наблюдения в оценке скорости изменений (от 0 до 1).
+    :param max_age_days: Срок жизни вакансии в выдаче в днях для начальной оценки скорости изменений.
+    '''
+    def __init__(self, db_path='./docs/crawl_schedule.sqlite', smoothing=0.5, max_age_days=30):
+        self.db_path = db_path
+        self.smoothing = smoothing
+        self.max_age_days = max_age_days
+        self.connection = sqlite3.connect(db_path, timeout=60, check_same_thread=False)
+        self.connection.execute('''
+            CREATE TABLE IF NOT EXISTS combos (
+                role TEXT,
+                area TEXT,
+                found INTEGER,
+                crawled_at REAL,
+                change_rate REAL,
+                crawls INTEGER,
+                backlog INTEGER,
+                PRIMARY KEY (role, area)
+            )''')
+        self.connection.commit()
+
+        # Состояние комбинаций целиком в памяти: (role, area) -> [found, crawled_at, change_rate, crawls, backlog]
+        self.combos = {(row[0], row[1]): list(row[2:]) for row in self.connection.execute('SELECT * FROM combos')}
+
+    def known(self, role, area):
+        """
+        Проверяет, обходилась ли комбинация профессии и региона раньше.
+        """
+        return (str(role), str(area)) in self.combos
+
+    def change_rate(self, role, area):
+        """
+        Оценка скорости изменений комбинации (вакансий в час) или None для необходившейся комбинации.
+        """
+        entry = self.combos.get((str(role), str(area)))
+        if entry is None:
+            return None
+        if entry[2] is not None:
+            return entry[2]
+        return (entry[0] or 0) / (self.max_age_days * 24)
+
+    def last_crawled(self, role, area):
+        """
+        Время последнего обхода комбинации (timestamp) или None.
+        """
+        entry = self.combos.get((str(role), str(area)))
+        return None if entry is None else entry[1]
+
+    def priority(self, role, area, now=None):
+        '''
+        Ожидаемое количество вакансий комбинации к загрузке: незагруженные при прошлом обходе
+        и новые и изменившиеся с момента последнего обхода.
+        '''
+        entry = self.combos.get((str(role), str(area)))
+        if entry is None:
+            return float('inf')
+        hours = max(0.0, ((now or time.time()) - (entry[1] or 0)) / 3600)
+        return min(entry[0] or 0, (entry[4] or 0) + self.change_rate(role, area) * hours)
+
+    def rank(self, combos, now=None):
+        '''
+        Упорядочивает комбинации профессий и регионов по убыванию приоритета.
+        При равном приоритете (например, у необходившихся комбинаций) сохраняется исходный порядок.
+
+        :param combos: Итерируемое пар (профессия, регион).
+        :return: Список кортежей (приоритет, профессия, регион).
+        '''
+        now = now or time.time()
+        ranked = [(self.priority(role, area, now), role, area) for role, area in combos]
+        ranked.sort(key=lambda combo: -combo[0])
+        return ranked
+
+    def is_change(self, item, vacancy_index, since):
+        '''
+        Проверяет, является ли вакансия к загрузке изменением с момента since: вакансия опубликована
+        после since или уже загружалась и изменилась в выдаче. Незагруженные старые вакансии
+        (остаток прошлых запусков) изменениями не считаются и не завышают оценку скорости.
+        '''
+        if since is None or self.published_timestamp(item.get('published_at')) >= since:
+            return True
+        entry = vacancy_index.entries.get(str(item['id']))
+        return entry is not None and entry[3] == 200
+
+    def record(self, role, area, found, changes, crawled_at=None, backlog=0):
+        '''
+        Запоминает результат обхода комбинации и обновляет оценку скорости изменений.
+
+        :param found: Количество найденных вакансий (поле found нулевой страницы).
+        :param changes: Количество изменений с прошлого обхода (см. is_change).
+        :param crawled_at: Время начала обхода комбинации (timestamp).
+        :param backlog: Количество вакансий к загрузке, которые не загружены в этом запуске.
+        '''
+        key = (str(role), str(area))
+        crawled_at = crawled_at or time.time()
+        entry = self.combos.get(key)
+        if entry is None or entry[1] is None:
+            # Первый обход: наблюдение охватывает всю выдачу, оставляем априорную оценку
+            rate, crawls = None, 0
+        else:
+            hours = max((crawled_at - entry[1]) / 3600, 1 / 60)
+            previous = self.change_rate(role, area)
+            rate = self.smoothing * (changes / hours) + (1 - self.smoothing) * previous
+            crawls = entry[3] or 0
+        self.combos[key] = [found, crawled_at, rate, crawls + 1, backlog]
+        self.connection.execute('INSERT OR REPLACE INTO combos VALUES (?, ?, ?, ?, ?, ?, ?)',
+                                (key[0], key[1], found, crawled_at, rate, crawls + 1, backlog))
+        self.connection.commit()
+
+    @staticmethod
+    def published_timestamp(value):
+        """
+        Дата публикации в формате API hh.ru ('2024-01-31T10:00:00+0300') в виде timestamp (0, если не разобрана).
+        """
+        try:
+            return datetime.strptime(value, '%Y-%m-%dT%H:%M:%S%z').timestamp()
+        except (TypeError, ValueError):
+            return 0.0
+
+    def rank_vacancies(self, items, vacancy_index):
+        '''
+        Упорядочивает вакансии для загрузки детальных данных: сначала новые (отсутствующие в индексе),
+        затем изменившиеся; внутри групп - от новых публикаций к старым.
+
+        :param items: Вакансии из выдачи поиска (результаты VacancyIndex.compact).
+        '''
+        return sorted(items, key=lambda item: (str(item['id']) in vacancy_index.entries,
+                                               -self.published_timestamp(item.get('published_at'))))
+
+    def stats(self):
+        """
+        Состояние комбинаций: {(профессия, регион): {'found', 'crawled_at', 'change_rate', 'crawls', 'backlog'}}.
+        """
+        return {key: {'found': entry[0], 'crawled_at': entry[1], 'change_rate': self.change_rate(*key),
+                      'crawls': entry[3], 'backlog': entry[4]} for key, entry in self.combos.items()}
+
+    def close(self):
+        """
+        Закрывает соединение с базой планировщика.
+        """
+        self.connection.close()
 
 #Класс для API HH (Получение токена OAuth 2.0)
 class OAuthTokenManager:
     '''
-    Класс управляет жизненным циклом OAuth-токенов, обеспечивая их актуальность и обновление при необходимости,
-    чтобы приложение всегда имело доступ к данным на сайте hh.ru
+    Класс управляет жизненным циклом OAuth-токенов, обеспечивая их актуальность и обновление при необходимости,
+    чтобы приложение всегда имело доступ к данным на сайте hh.ru
+    Токен кэшируется в памяти: файл 'token_info.txt' читается один раз, а проверка действительности выполняется
+    по сроку expires_at без запросов к API. Токен с неизвестным сроком действия (например, переданный
+    в конструктор) проверяется запросом к /me не чаще раза в validation_ttl секунд и не обновляется, пока
+    проверка проходит. Обновление токена выполняется под блокировкой (одновременно только одно обновление
+    на все потоки), за refresh_margin секунд до истечения expires_at - в фоновом потоке, а файл с токенами
+    записывается атомарно. Метод on_401 позволяет обработчикам запросов принудительно запросить одно общее
+    обновление токена после ответа 401.
+    '''
+    def __init__(self, client_id, client_secret, access_token, http_client=None, token_file='token_info.txt',
+                 refresh_margin=300, validation_ttl=600, api_url='https://api.hh.ru',
+                 oauth_url='https://hh.ru/oauth/token'):
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.access_token = access_token
+        self.http_client = http_client or HHHttpClient()
+        # Срок действия токена из ответа сервера авторизации (0 - неизвестен)
+        self.expires_at = 0
+        # До какого времени токен с неизвестным сроком действия считается проверенным через /me
+        self.validated_until = 0
+        self.refresh_token = None
+        self.token_file = token_file
+        self.refresh_margin = refresh_margin
+        # Сколько секунд считать действительным токен с неизвестным сроком действия после проверки через /me
+        self.validation_ttl = validation_ttl
+        self.lock = threading.RLock()
+        # Отдельная блокировка запуска фонового обновления: self.lock удерживается на время сетевого запроса
+        self.background_lock = threading.Lock()
+        self.loaded = False
+        self.background_refresh = None
+        # Адреса API и сервера авторизации (можно заменить, например, на локальный тестовый сервер)
+        self.api_url = api_url
+        self.oauth_url = oauth_url
+
+    def read_token_info(self):
+        """
+        Метод для чтения информации о токенах из файла 'token_info.txt'.
+        При наличии файла с данными токенов, он считывает их и сохраняет в атрибуты объекта.
+        """
+        try:
+            with open(self.token_file, 'r') as file:
+                lines = file.readlines()
+                if len(lines) >= 3:
+                    self.access_token = lines[0].strip()
+                    self.expires_at = float(lines[1].strip())
+                    self.refresh_token = lines[2].strip() or None
+        except FileNotFoundError:
+            pass
+        self.loaded = True
+
+    def save_token_info(self):
+        """
+        Метод для сохранения информации о токенах в файл 'token_info.txt'.
+        Записывает текущие токены и срок их действия в указанный файл.
+        Запись выполняется во временный файл, который затем атомарно заменяет основной.
+        """
+        tmp_file = f'{self.token_file}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_file, 'w') as file:
+            file.write(self.access_token + '\n')
+            file.write(str(self.expires_at) + '\n')
+            file.write((self.refresh_token or '') + '\n')
+        os.replace(tmp_file, self.token_file)
+
+    def is_token_valid(self):
+        """
+        Метод для проверки действительности токена.
+        Токен с известным сроком действия проверяется без обращения к API. Токен с неизвестным сроком
+        проверяется запросом к /me, и при успехе считается действительным validation_ttl секунд
+        (validated_until), после чего проверяется снова.
+        """
+        if not self.access_token:
+            return False
+        now = time.time()
+        if now < self.expires_at or now < self.validated_until:
+            return True
+        if self.expires_at:
+            # Срок действия токена истек
+            return False
+
+        # Выполните тестовый запрос к API, например, к /me или /user
+        test_url = f'{self.api_url}/me'
+        headers = {
+            'Authorization': f'Bearer {self.access_token}',
+        }
+
+        try:
+            response = self.http_client.get(test_url, headers=headers)
+        except requests.RequestException as e:
+            logging.error(f"Ошибка при проверке токена: {str(e)}")
+            return False
+        if response.status_code == 200:
+            # Токен действителен, запоминаем результат проверки (срок действия токена остается неизвестным)
+            self.validated_until = time.time() + self.validation_ttl
+            return True
+
+        # Токен недействителен, возвращаем False
+        return False
+
+    def get_oauth_token(self):
+        """
+        Метод для получения OAuth-токена.
+        Если у текущего токена еще не истек срок действия (или не истек срок проверки через /me), он возвращается
+        из памяти без блокировок и запросов. Если до истечения срока действия из ответа сервера авторизации
+        осталось меньше refresh_margin секунд, запускается фоновое обновление.
+        В противном случае токен обновляется под блокировкой: если у нас есть refresh_token, происходит попытка
+        обновления токена, если нет refresh_token, выполняется запрос для получения новой пары токенов.
+        """
+        token, expires_at, validated_until = self.access_token, self.expires_at, self.validated_until
+        now = time.time()
+        if self.loaded and token and now < expires_at:
+            if expires_at - now < self.refresh_margin:
+                self.start_background_refresh()
+            return token
+        if self.loaded and token and now < validated_until:
+            return token
+
+        with self.lock:
+            if not self.loaded:
+                self.read_token_info()
+
+            if self.is_token_valid():
+                # Токен действителен (или был обновлен другим потоком), возвращаем его
+                return self.access_token
+
+            return self.refresh()
+
+    def start_background_refresh(self):
+        """
+        Запускает обновление токена в фоновом потоке (не больше одного потока одновременно).
+        Не ждет ни самого обновления, ни других потоков: если запуск уже выполняется, сразу возвращает управление.
+        """
+        if not self.background_lock.acquire(blocking=False):
+            return
+        try:
+            if self.background_refresh is not None and self.background_refresh.is_alive():
+                return
+            self.background_refresh = threading.Thread(target=self.refresh_ahead, daemon=True)
+            self.background_refresh.start()
+        finally:
+            self.background_lock.release()
+
+    def refresh_ahead(self):
+        """
+        Фоновое обновление токена, срок действия которого (из ответа сервера авторизации) скоро истечет.
+        Ошибки обновления записываются в лог: до истечения срока используется текущий токен.
+        """
+        try:
+            with self.lock:
+                if self.expires_at and self.expires_at - time.time() < self.refresh_margin:
+                    self.refresh()
+        except Exception as e:
+            logging.error(f"Ошибка при фоновом обновлении токена: {str(e)}")
+
+    def on_401(self, failed_token=None):
+        '''
+        Обработчик ответа 401 для HHDataFetcher: принудительно обновляет токен и возвращает новый.
+        Если токен уже обновлен другим потоком после того, как был получен failed_token,
+        повторное обновление не выполняется и возвращается текущий токен.
+
+        :param failed_token: Токен, с которым был получен ответ 401.
+        '''
+        with self.lock:
+            if failed_token is not None and self.access_token != failed_token and self.is_token_valid():
+                return self.access_token
+            self.expires_at = self.validated_until = 0
+            return self.refresh()
+
+    def refresh(self):
+        """
+        Метод для обновления токена (одновременно выполняется не больше одного обновления).
+        Если у нас есть refresh_token, происходит попытка обновления токена.
+        Если нет refresh_token, выполняется запрос для получения новой пары токенов.
+        При сетевой ошибке она записывается в лог и возвращается текущий токен.
+        """
+        with self.lock:
+            if self.refresh_token:
+                refresh_token_url = self.oauth_url
+                data = {
+                    'grant_type': 'refresh_token',
+                    'refresh_token': self.refresh_token,
+                    'client_id': self.client_id,
+                    'client_secret': self.client_secret,
+                }
+                # Запрос на обновление токена
+                headers = {
+                    'Content-Type': 'application/x-www-form-urlencoded'
+                }
+
+                try:
+                    response = self.http_client.post(refresh_token_url, data=data, headers=headers)
+                except requests.RequestException as e:
+                    logging.error(f"Ошибка при обновлении токена OAuth: {str(e)}")
+                    return self.access_token
+
+                if response.status_code == 200:
+                    # Обработка успешного ответа и сохранение нового токена
+                    response_data = response.json()
+                    access_token = response_data.get('access_token')
+                    expires_in = response_data.get('expires_in')
+
+                    if access_token and expires_in:
+                        self.access_token = access_token
+                        self.refresh_token = response_data.get('refresh_token') or self.refresh_token
+                        self.expires_at = time.time() + expires_in
+                        self.save_token_info()
+                        return self.access_token
+                    else:
+                        logging.error("Не удалось получить токен OAuth. Данные ответа неполные.")
+                else:
+                    logging.error(f"Не удалось получить токен OAuth. Код состояния: {response.status_code}")
+                    logging.error(response.text)
+            else:
+                # Если у нас нет refresh_token, то делаем запрос для получения новой пары токенов
+                initial_token_url = self.oauth_url
+                data = {
+                    'grant_type': 'client_credentials',
+                    'client_id': self.client_id,
+                    'client_secret': self.client_secret,
+                }
+                # Запрос на получение новой пары токенов
+                try:
+                    response = self.http_client.post(initial_token_url, data=data)
+                except requests.RequestException as e:
+                    logging.error(f"Ошибка при получении токена OAuth: {str(e)}")
+                    return self.access_token
+
+                if response.status_code == 200:
+                    # Обработка успешного ответа и сохранение новой пары токенов
+                    response_data = response.json()
+                    access_token = response_data.get('access_token')
+                    expires_in = response_data.get('expires_in')
+                    refresh_token = response_data.get('refresh_token')
+
+                    if access_token and expires_in:
+                        self.access_token = access_token
+                        self.refresh_token = refresh_token
+                        self.expires_at = time.time() + expires_in
+                        self.save_token_info()
+                        return self.access_token
+                    else:
+                        logging.error("Не удалось получить токен OAuth. Данные ответа неполные.")
+                else:
+                    logging.error(f"Не удалось получить токен OAuth. Код состояния: {response.status_code}")
+                    logging.error(response.text)
+
+class HHDataFetcher:
+    '''
+    Класс HHDataFetcher предназначен для извлечениея данных о вакансиях с сайта hh.ru (HeadHunter).
+    Функциональность:
+    Авторизация и получение доступа к данным.
+    Извлечение данных о вакансиях с использованием API hh.ru. Вы можете указать профессии и регионы для поиска.
+    Параллельная обработка вакансий: многопоточность для обработки нескольких вакансий одновременно.
+    Логирование: Позволяет отслеживать процесс выполнения и обнаруживать возможные ошибки.
+    Переработка токенов: Класс управляет авторизацией, обновлением и получением OAuth-токенов для доступа к данным.
+    Шардирование: запросы, по которым найдено больше вакансий, чем позволяет глубина поиска API,
+    автоматически делятся на окна по дате публикации.
+    '''
+    # Максимальная глубина выдачи поиска API hh.ru (page * per_page)
+    SEARCH_DEPTH_LIMIT = 2000
+    # Максимальный возраст вакансий в выдаче (дней) и минимальная ширина окна шарда (секунд)
+    SHARD_MAX_AGE_DAYS = 30
+    SHARD_MIN_WINDOW = 60
+
+    def __init__(self, client_id=None, client_secret=None, professional_roles=None, regions_list=None, access_token=None,
+                 http_client=None, rate_limiter=None, retry_policy=None, vacancy_index=None, incremental=True,
+                 storage='files', area_tree=None, token_manager=None, metrics=None, api_url='https://api.hh.ru',
+                 history=None, keep_history=False, scheduler=None, request_budget=None):
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.professional_roles = professional_roles
+        self.regions_list = regions_list
+        self.ua = UserAgent()
+        self.access_token = access_token
+        # Адрес API (можно заменить, например, на локальный тестовый сервер)
+        self.api_url = api_url
+        # Менеджер токенов: если задан, токен берется из него, а при ответе 401 запрашивается общее обновление
+        self.token_manager = token_manager
+        self.http_client = http_client or HHHttpClient(metrics=metrics)
+        # Метрики обхода (общие с HTTP-клиентом, см. CrawlMetrics)
+        self.metrics = metrics or getattr(self.http_client, 'metrics', None) or CrawlMetrics()
+        # Общий ограничитель частоты запросов (вместо фиксированных пауз) и политика повторов
+        self.rate_limiter = rate_limiter or AdaptiveRateLimiter(rate=2.5, max_rate=10.0)
+        self.retry_policy = retry_policy or RetryPolicy()
+        # Инкрементальный режим: загружаются только новые вакансии и вакансии, изменившиеся в выдаче
+        self.incremental = incremental
+        # Бюджет запросов (RequestBudget): после его исчерпания синхронные запросы не выполняются
+        self.request_budget = request_budget
+        # Планировщик приоритетного обхода (создается при первом вызове fetch_prioritized)
+        self.scheduler = scheduler
+
+        # Настройка логирования
+        logging.basicConfig(filename='parser_hh.log', level=logging.INFO,
+                            format='%(asctime)s - %(levelname)s - %(message)s')
+
+        # Проверяем, существует ли директория для данных пагинации, и если нет, то создаем её
+        directory = './docs/pagination'
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+        # Проверяем, существует ли директория для данных о вакансиях, и если нет, то создаем её
+        directory = './docs/vacancies'
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+        # Хранение сырых ответов: 'files' - файл на каждую страницу и вакансию (как раньше),
+        # 'segments' - сжатые сегменты RawSegmentStore в папках ./docs/raw/pagination и ./docs/raw/vacancies
+        self.storage = storage
+        self.page_store = None
+        self.vacancy_store = None
+        if storage == 'segments':
+            self.page_store = RawSegmentStore('./docs/raw/pagination')
+            self.vacancy_store = RawSegmentStore('./docs/raw/vacancies')
+        elif storage != 'files':
+            raise ValueError(f"Неизвестный способ хранения {storage}, допустимые значения: files, segments")
+
+        # Индекс загруженных вакансий
+        self.vacancy_index = vacancy_index or VacancyIndex()
+
+        # История ревизий вакансий: ведется, только если передана history или keep_history=True
+        # (иначе изменения определяются только по хешу в индексе, без дополнительной копии каждой версии)
+        self.history = history if history is not None else (VacancyHistory() if keep_history else None)
+
+        # Дерево регионов с локальным кэшем
+        self.area_tree = area_tree or AreaTree(self.http_client, url=f'{self.api_url}/areas')
+
+        # Получение и инициализация регионов
+        self.init_regions()
+
+    def init_regions(self):
+        # Получение регионов и инициализация
+        sub_regions = self.get_region(filter_regions='113', sub_region=False)
+        self.regions_list = [region['id'] for region in sub_regions]
+        self.regions_list.sort()
+
+    def get_region(self, filter_regions='113', sub_region=False):
+        '''
+        Получает список регионов с заданным 'parent_id' и, при необходимости, более вложенных регионов.
+
+        :param filter_regions: Идентификатор родительского региона для фильтрации.
+        :param sub_region: Если True, возвращает более вложенные регионы.
+        :return: Список регионов в виде словарей с ключами 'id', 'parent_id' и 'name'.
+
+        Дерево регионов берется из локального кэша AreaTree, поиск выполняется по индексу parent_id.
+        '''
+        # Список регионов с заданным 'parent_id'
+        regions = self.area_tree.children_of(filter_regions)
+
+        # Получаем более вложенные регионы, если sub_region=True
+        if sub_region:
+            sub_regions = []
+            for reg in regions:
+                sub_regions.extend(self.area_tree.children_of(reg['id']))
+            return sub_regions
+        else:
+            return regions
+
+    def current_token(self):
+        """
+        Возвращает актуальный токен доступа (из менеджера токенов, если он задан).
+        """
+        if self.token_manager is not None:
+            self.access_token = self.token_manager.get_oauth_token() or self.access_token
+        return self.access_token
+
+    def get_headers(self):
+        """
+        Метод формирует заголовки запроса со случайным User-Agent и токеном доступа (если он задан).
+        """
+        headers = {'User-Agent': self.ua.random}
+        token = self.current_token()
+        if token is not None:
+            headers['Authorization'] = f'Bearer {token}'
+        return headers
+
+    def check_response(self, status, headers, text, attempt, label):
+        '''
+        Анализирует неуспешный ответ API и сообщает ограничителю частоты о троттлинге.
+
+        :param label: Описание запроса для логов (например, "вакансия 123").
+        :return: Задержку перед повтором в секундах или None, если повторять запрос не нужно.
+        '''
+        retry_after = self.retry_policy.parse_retry_after(headers)
+        if status == 401 and self.token_manager is not None:
+            # Токен недействителен: запрашиваем одно общее обновление и повторяем запрос с новым токеном
+            logging.warning(f'Ошибка 401 для {label}, обновляем токен')
+            self.access_token = self.token_manager.on_401(self.access_token) or self.access_token
+            retry_after = 0
+        elif status == 429:
+            # Ошибка, связанная с капчей: замедляем все запросы и повторяем позже
+            try:
+                captcha_url = json.loads(text).get('captcha_url')
+            except (ValueError, AttributeError):
+                captcha_url = None
+            self.rate_limiter.on_throttle(retry_after)
+            logging.warning(f'Ошибка 429 (капча) для {label}, попытка {attempt + 1}. URL капчи: {captcha_url}')
+        elif status in self.retry_policy.retry_statuses:
+            logging.warning(f'Ошибка {status} для {label}, попытка {attempt + 1}')
+        else:
+            logging.error(f'Ошибка {status} для {label}: {text}')
+            return None
+
+        if attempt >= self.retry_policy.max_retries:
+            logging.error(f'Попытки для {label} исчерпаны (последний код ответа {status})')
+            return None
+        return self.retry_policy.get_delay(attempt, retry_after)
+
+    def retry_delay_for_error(self, error, attempt, label):
+        """
+        Возвращает задержку перед повтором после сетевой ошибки или None, если попытки исчерпаны.
+        """
+        if attempt >= self.retry_policy.max_retries:
+            logging.error(f'Попытки для {label} исчерпаны: {str(error)}')
+            return None
+        logging.warning(f'Ошибка при запросе для {label}, попытка {attempt + 1}: {str(error)}')
+        return self.retry_policy.get_delay(attempt)
+
+    def request_once(self, url, params=None, headers=None, attempt=0, label='', accept_statuses=()):
+        '''
+        Выполняет одну попытку GET-запроса с учетом ограничителя частоты.
+
+        :param accept_statuses: Коды ответа, кроме 200, при которых ответ возвращается вызывающему
+                                без повторов (например, VacancyIndex.GONE_STATUSES).
+        :return: Кортеж (ответ, задержка). При успехе задержка равна None; при неудаче ответ равен None,
+                 а задержка содержит время до повтора (или None, если повторять не нужно).
+        '''
+        if self.request_budget is not None and not self.request_budget.take():
+            logging.warning(f'Бюджет запросов исчерпан, запрос для {label} не выполнен')
+            self.metrics.inc('requests_over_budget_total')
+            return None, None
+        self.rate_limiter.acquire()
+        if headers is not None and 'Authorization' in headers:
+            # Токен мог обновиться между попытками
+            headers = dict(headers, Authorization=f'Bearer {self.current_token()}')
+        try:
+            response = self.http_client.get(url, params=params, headers=headers)
+        except requests.RequestException as e:
+            return None, self.retry_delay_for_error(e, attempt, label)
+
+        if response.status_code == 200:
+            self.rate_limiter.on_success()
+            return response, None
+        if response.status_code in accept_statuses:
+            return response, None
+        return None, self.check_response(response.status_code, response.headers, response.text, attempt, label)
+
+    def request_with_retry(self, url, params=None, headers=None, label='', accept_statuses=()):
+        '''
+        Выполняет GET-запрос с повторами по политике retry_policy.
+
+        :param accept_statuses: Коды ответа, кроме 200, которые возвращаются без повторов (см. request_once).
+        :return: Успешный ответ (или ответ с кодом из accept_statuses) или None, если запрос не удался.
+        '''
+        attempt = 0
+        while True:
+            response, delay = self.request_once(url, params=params, headers=headers, attempt=attempt, label=label,
+                                                accept_statuses=accept_statuses)
+            if response is not None or delay is None:
+                return response
+            time.sleep(delay)
+            attempt += 1
+
+    def save_page(self, name, text):
+        '''
+        Сохраняет страницу поиска (str или bytes): в файл ./docs/pagination/{name}.json или в хранилище сегментов.
+        '''
+        if self.page_store is not None:
+            self.page_store.append(name, text)
+            return
+        if isinstance(text, bytes):
+            with open(f'./docs/pagination/{name}.json', mode='wb') as f:
+                f.write(text)
+            return
+        with open(f'./docs/pagination/{name}.json', mode='w', encoding='utf8') as f:
+            f.write(text)
+
+    def save_vacancy(self, vacancy_id, text):
+        '''
+        Сохраняет детальные данные вакансии (str или bytes): в файл ./docs/vacancies/{id}.json
+        или в хранилище сегментов.
+        '''
+        if self.vacancy_store is not None:
+            self.vacancy_store.append(vacancy_id, text)
+            return
+        if isinstance(text, bytes):
+            with open('./docs/vacancies/{}.json'.format(vacancy_id), mode='wb') as f:
+                f.write(text)
+            return
+        with open('./docs/vacancies/{}.json'.format(vacancy_id), mode='w', encoding='utf8') as f:
+            f.write(text)
+
+    def load_vacancy(self, vacancy_id):
+        """
+        Возвращает сохраненный JSON детальных данных вакансии (из файла или хранилища сегментов) или None.
+        """
+        if self.vacancy_store is not None:
+            return self.vacancy_store.get(vacancy_id)
+        try:
+            with open('./docs/vacancies/{}.json'.format(vacancy_id), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def has_vacancy(self, vacancy_id):
+        """
+        Проверяет, сохранены ли детальные данные вакансии (в файле или в хранилище сегментов).
+        """
+        if self.vacancy_store is not None:
+            return vacancy_id in self.vacancy_store
+        return os.path.exists('./docs/vacancies/{}.json'.format(vacancy_id))
+
+    def store_vacancy(self, v, content):
+        '''
+        Сохраняет загруженные детальные данные вакансии, если они изменились с прошлой загрузки.
+        Изменение определяется по хешу нормализованных данных (см. VacancyHistory.normalize). Неизменившаяся
+        вакансия не перезаписывается, поэтому инкрементальная выгрузка (IncrementalExporter) её не разбирает;
+        изменившаяся сохраняется и добавляется в историю ревизий.
+
+        :param v: Словарь вакансии из выдачи поиска (полный или результат compact).
+        :param content: Тело ответа (bytes или str).
+        :return: True, если данные вакансии новые или изменились.
+        '''
+        data, content_hash = VacancyHistory.normalize(json_loads(content))
+        entry = self.vacancy_index.entries.get(str(v['id']))
+        if entry is not None and entry[2] == content_hash and self.has_vacancy(v['id']):
+            logging.info(f"Вакансия {v['id']} загружена повторно и не изменилась")
+            self.metrics.inc('vacancies_unchanged_total')
+            self.vacancy_index.mark_fetched(v, content, content_hash=content_hash)
+            return False
+
+        self.save_vacancy(v['id'], content)
+        if self.history is not None:
+            self.history.record(v['id'], data, content_hash=content_hash)
+        self.vacancy_index.mark_fetched(v, content, content_hash=content_hash)
+        self.metrics.inc('vacancies_changed_total')
+        return True
+
+    def mark_vacancy_gone(self, v, status):
+        '''
+        Запоминает в индексе, что вакансия удалена (код ответа из VacancyIndex.GONE_STATUSES), чтобы
+        следующие запуски не запрашивали её снова, пока её данные в выдаче поиска не изменятся.
+        '''
+        logging.warning(f"Вакансия {v['id']} недоступна (код ответа {status})")
+        self.vacancy_index.mark_fetched(v, None, status=status)
+        self.metrics.inc('vacancies_gone_total')
+
+    def flush_storage(self):
+        """
+        Записывает на диск накопленные блоки хранилищ сегментов и историю ревизий.
+        """
+        for store in (self.page_store, self.vacancy_store):
+            if store is not None:
+                store.flush()
+        if self.history is not None:
+            self.history.flush()
+
+    def iter_pagination(self):
+        '''
+        Генератор сохраненных страниц поиска в виде пар (имя, JSON в байтах или строкой) из папки pagination
+        или из хранилища сегментов.
+        '''
+        if self.page_store is not None:
+            yield from self.page_store.iter_records()
+            return
+        for fl in os.listdir('./docs/pagination'):
+            # Открываем файл, читаем его содержимое и автоматически закрываем файл после использования
+            with open('./docs/pagination/{}'.format(fl), 'rb') as f:
+                yield fl, f.read()
+
+    def split_shard(self, shard):
+        '''
+        Делит шард поиска пополам по окну даты публикации.
+        Открытые границы окна (None) остаются открытыми, поэтому объединение шардов покрывает всю выдачу.
+
+        :param shard: Словарь {'date_from': timestamp или None, 'date_to': timestamp или None}.
+        :return: Список из двух шардов или пустой список, если окно уже не шире SHARD_MIN_WINDOW секунд.
+        '''
+        now = time.time()
+        date_from = shard.get('date_from') or now - self.SHARD_MAX_AGE_DAYS * 86400
+        date_to = shard.get('date_to') or now
+        if date_to - date_from <= self.SHARD_MIN_WINDOW:
+            return []
+        middle = int((date_from + date_to) / 2)
+        return [
+            {'date_from': shard.get('date_from'), 'date_to': middle},
+            {'date_from': middle + 1, 'date_to': shard.get('date_to')},
+        ]
+
+    def needs_split(self, jsObj, shard, label):
+        '''
+        Проверяет, превышает ли выдача шарда глубину поиска, и при необходимости делит шард.
+
+        :return: Список новых шардов (пустой, если шард делить не нужно или уже нельзя).
+        '''
+        if jsObj.get('found', 0) <= self.SEARCH_DEPTH_LIMIT:
+            return []
+        shards = self.split_shard(shard)
+        if shards:
+            logging.info(f"Для {label} найдено {jsObj['found']} вакансий, запрос разделен по дате публикации")
+        else:
+            logging.warning(f"Для {label} найдено {jsObj['found']} вакансий, выдача будет неполной")
+        return shards
+
+    def shard_file_prefix(self, professional_role, area, shard=None):
+        """
+        Префикс имени файла страницы для комбинации профессии, региона и шарда.
+        """
+        if not shard:
+            return f'{professional_role}_{area}'
+        return f"{professional_role}_{area}_{shard.get('date_from') or 0}-{shard.get('date_to') or 0}"
+
+    def page_params(self, page=0, professional_role=None, area=None, shard=None, order_by=None):
+        '''
+        Формирует параметры запроса страницы поиска.
+
+        :param shard: Окно даты публикации {'date_from': timestamp, 'date_to': timestamp} или None.
+        :param order_by: Сортировка выдачи (например, 'publication_time') или None (по умолчанию API).
+        '''
+        # Определяем параметры для GET-запроса, такие как номер страницы и количество вакансий на странице.
+        params = {
+            'page': page,  # Номер страницы поиска
+            'per_page': 100,  # Количество вакансий на одной странице
+        }
+
+        # Если задана профессия, добавляем ее в параметры запроса.
+        if professional_role is not None:
+            params['professional_role'] = professional_role
+
+        # Если задан регион, также добавляем его в параметры запроса.
+        if area is not None:
+            params['area'] = area
+
+        # Если задан шард, ограничиваем выдачу окном даты публикации.
+        for key in ('date_from', 'date_to'):
+            if shard and shard.get(key):
+                params[key] = datetime.fromtimestamp(shard[key], timezone.utc).strftime('%Y-%m-%dT%H:%M:%S+0000')
+
+        # Если задана сортировка, передаем ее в запрос.
+        if order_by is not None:
+            params['order_by'] = order_by
+        return params
+
+    def get_page(self, page=0, professional_role=None, area=None, shard=None, raw=False, order_by=None):
+        '''
+        Метод выполняет GET-запрос к API HeadHunter для получения данных о вакансиях.
+
+        :param page: Номер страницы поиска.
+        :param professional_role: Профессиональная роль, по которой осуществляется поиск вакансий.
+        :param area: Регион (географическая область) для поиска вакансий.
+        :param shard: Окно даты публикации (см. split_shard) или None.
+        :param raw: Если True, возвращается тело ответа в байтах без декодирования.
+        :param order_by: Сортировка выдачи (см. page_params).
+
+        :return: Данные о вакансиях в формате текста (или bytes) или None, если страницу получить не удалось.
+        '''
+        try:
+            # Определяем заголовки для HTTP-запроса, включая авторизацию через токен доступа.
+            headers = self.get_headers()
+
+            params = self.page_params(page, professional_role, area, shard, order_by)
+
+            # Выполняем GET-запрос к API HeadHunter с указанными параметрами и заголовками (с повторами).
+            req = self.request_with_retry(f'{self.api_url}/vacancies', params=params, headers=headers,
+                                          label=f'страница {page} ({professional_role}, {area})')
+            if req is None:
+                self.metrics.inc('pages_failed_total')
+                return None
+            self.metrics.inc('pages_fetched_total')
+            if raw:
+                return req.content
+
+            # Получаем текстовое содержимое ответа (соединение возвращается в пул).
+            data = req.content.decode()
+
+            # Возвращаем данные о вакансиях.
+            return data
+        except Exception as e:
+            # Если возникает ошибка, записываем в лог сообщение с описанием исключения.
+            logging.error(f"Ошибка при запросе: {str(e)}")
+            self.metrics.inc('pages_failed_total')
+
+    def process_vacancy(self, v):
+        '''
+        Метод выполняет обработку данных о вакансии и сохраняет их в файл формата JSON.
+
+        :param v: Словарь, представляющий информацию о вакансии.
+
+        Метод проверяет по индексу вакансий, загружалась ли вакансия и изменилась ли она в выдаче поиска.
+        Если вакансия уже загружена и не изменилась, то парсинг пропускается.
+        В противном случае, создается новый заголовок (с случайным User-Agent),
+        и выполняется GET-запрос к URL вакансии для получения данных.
+        Полученные данные записываются в JSON-файл с идентификатором вакансии в названии файла.
+        Метод также записывает информацию о успешной обработке вакансии в лог-файл.
+        В случае возникновения ошибки, метод записывает информацию об ошибке в лог-файл.
+
+        '''
+        try:
+            # Проверяем по индексу, нужно ли загружать вакансию
+            if self.incremental and not self.vacancy_index.needs_fetch(v):
+                logging.info(f"Вакансия {v['id']} уже обработана и не изменилась. Пропуск...")
+                self.metrics.inc('vacancies_skipped_total')
+                return
+
+            self.fetch_vacancy(v)
+        except Exception as e:
+            # Логируем ошибку обработки вакансии
+            logging.error(f"Ошибка при обработке вакансии {v['id']}: {str(e)}")
+
+    def fetch_vacancy(self, v):
+        '''
+        Загружает детальные данные вакансии (с повторами) и сохраняет их без проверки по индексу.
+
+        :param v: Словарь вакансии из выдачи поиска (полный или результат compact).
+        :return: True, если вакансия загружена.
+        '''
+        # Создаем заголовок (headers) с новым случайным User-Agent
+        headers = {'User-Agent': self.ua.random}
+        req = self.request_with_retry(v['url'], headers=headers, label=f'вакансия {v["id"]}',
+                                      accept_statuses=VacancyIndex.GONE_STATUSES)
+        if req is None:
+            self.metrics.inc('vacancies_failed_total')
+            return False
+        if req.status_code != 200:
+            self.mark_vacancy_gone(v, req.status_code)
+            return False
+
+        # Сохраняем ответ запроса как есть в JSON-файл с идентификатором вакансии в названии (или в хранилище),
+        # если данные вакансии изменились
+        self.store_vacancy(v, req.content)
+
+        # Логируем успешную обработку вакансии
+        logging.info(f"Вакансия {v['id']} успешно обработана")
+        self.metrics.inc('vacancies_fetched_total')
+        return True
+
+    def iter_search_pages(self):
+        '''
+        Генератор страниц поиска по всем комбинациям профессий и регионов (см. iter_combo_pages).
+
+        :return: Кортежи (профессия, регион, префикс имени страницы, номер страницы, объект JSON страницы,
+                 тело ответа в байтах).
+        '''
+        for p_r in self.professional_roles:
+            for reg in self.regions_list:
+                yield from self.iter_combo_pages(p_r, reg)
+
+                # Логируем завершение обработки вакансий для данной профессии и региона
+                logging.info(f'Данных для профессии {p_r} и региона {reg} больше нет')
+
+    def iter_combo_pages(self, p_r, reg, order_by=None):
+        '''
+        Генератор страниц поиска одной комбинации профессии и региона.
+        Если выдача комбинации больше глубины поиска API, запрос делится на шарды по дате публикации
+        (см. split_shard); нулевые страницы разделенных шардов не возвращаются. Шарды обходятся
+        от новых публикаций к старым.
+
+        :param order_by: Сортировка выдачи (см. page_params).
+        :return: Кортежи (профессия, регион, префикс имени страницы, номер страницы, объект JSON страницы,
+                 тело ответа в байтах).
+        '''
+        # Стек шардов комбинации: пустой шард означает запрос без ограничения по дате
+        shards = [{}]
+        while shards:
+            shard = shards.pop()
+            prefix = self.shard_file_prefix(p_r, reg, shard)
+            page = 0
+            while True:
+                response = self.get_page(page, p_r, reg, shard, raw=True, order_by=order_by)
+                if response is None:
+                    logging.error(f'Страница {page} для {prefix} не получена')
+                    break
+
+                jsObj = json_loads(response)
+
+                # Если выдача не помещается в глубину поиска, делим шард и обходим части
+                if page == 0:
+                    sub_shards = self.needs_split(jsObj, shard, prefix)
+                    if sub_shards:
+                        shards.extend(sub_shards)
+                        break
+
+                yield p_r, reg, prefix, page, jsObj, response
+
+                # Проверка на последнюю страницу
+                if (jsObj['pages'] - page) <= 1:
+                    break
+                page += 1
+
+    def fetch_data(self):
+        '''
+        Метод для получения данных о вакансиях из различных профессий и регионов.
+
+        Метод начинает процесс сбора данных о вакансиях, перебирая профессии и регионы,
+        заданные в объекте. Для каждой профессиональной роли и региона выполняются запросы
+        к API и обработка данных. Метод обрабатывает страницы с вакансиями, сохраняя их в отдельные файлы,
+        и логирует успешное завершение этапов. Если выдача комбинации больше глубины поиска API,
+        запрос делится на шарды по дате публикации (см. split_shard).
+
+        '''
+        try:
+            for p_r, reg, prefix, page, jsObj, response in self.iter_search_pages():
+                # Сохраняем ответ как есть в папку pagination для каждой комбинации профессии и региона
+                self.save_page(f'{prefix}_{page}', response)
+        except KeyError as e:
+            # Логируем ошибку, если ключ 'items' отсутствует в JSON данных
+            logging.error(f"KeyError: 'items' не найден в данных JSON: {str(e)}")
+        self.flush_storage()
+
+    def fetch_streaming(self, workers=8, queue_size=1000, save_pages=True):
+        '''
+        Потоковый сбор вакансий за один проход: вакансии с каждой полученной страницы поиска сразу передаются
+        потокам загрузки детальных данных через ограниченную очередь, без записи и повторного чтения
+        папки pagination. Загрузка вакансий идет параллельно с обходом страниц; если потоки загрузки
+        не успевают, обход страниц ждет освобождения места в очереди. Вакансия, которая встречается
+        в выдаче нескольких профессий или регионов, загружается один раз.
+
+        :param workers: Количество потоков загрузки детальных данных.
+        :param queue_size: Размер очереди вакансий между обходом страниц и потоками загрузки.
+        :param save_pages: Сохранять ли страницы поиска (в папку pagination или в хранилище сегментов).
+        :return: Количество загруженных вакансий.
+        '''
+        vacancies = Queue(maxsize=queue_size)
+        fetched = []
+
+        def worker():
+            count = 0
+            while True:
+                v = vacancies.get()
+                if v is None:
+                    break
+                try:
+                    count += self.fetch_vacancy(v)
+                except Exception as e:
+                    logging.error(f"Ошибка при обработке вакансии {v['id']}: {str(e)}")
+            fetched.append(count)
+
+        threads = [threading.Thread(target=worker, name=f'vacancy-worker-{i}', daemon=True) for i in range(workers)]
+        for thread in threads:
+            thread.start()
+
+        seen = set()
+        try:
+            for p_r, reg, prefix, page, jsObj, response in self.iter_search_pages():
+                if save_pages:
+                    self.save_page(f'{prefix}_{page}', response)
+                for item in jsObj.get('items', []):
+                    # Пропускаем вакансии, уже встреченные в выдаче других профессий и регионов
+                    if item['id'] in seen:
+                        continue
+                    seen.add(item['id'])
+                    v = self.vacancy_index.compact(item)
+                    if not self.incremental or self.vacancy_index.needs_fetch(v):
+                        # Блокируется, пока в очереди нет места
+                        vacancies.put(v)
+                        self.metrics.set_gauge('queue_depth', vacancies.qsize(), queue='vacancies')
+        finally:
+            for _ in threads:
+                vacancies.put(None)
+            for thread in threads:
+                thread.join()
+            self.flush_storage()
+            self.vacancy_index.flush()
+
+        logging.info(f'Вакансии собраны: в выдаче {len(seen)}, загружено {sum(fetched)}')
+        return sum(fetched)
+
+    def fetch_prioritized(self, budget=None, seconds=None, page_share=0.3, save_pages=True):
+        '''
+        Приоритетный обход в пределах бюджета запросов: комбинации профессий и регионов обходятся в порядке
+        ожидаемого количества новых и изменившихся вакансий (см. CrawlScheduler), выдача запрашивается
+        с сортировкой по дате публикации. В инкрементальном режиме обход уже известной комбинации
+        останавливается на первой странице, где нет новых и изменившихся вакансий (дальше идут более старые
+        публикации). Затем загружаются детальные данные вакансий: сначала новые, затем изменившиеся,
+        от новых публикаций к старым, пока не исчерпан бюджет. Незагруженные вакансии учитываются
+        в приоритете комбинации при следующем запуске.
+
+        :param budget: Максимальное количество запросов за запуск (включая повторы) или None.
+        :param seconds: Максимальное время запуска в секундах или None.
+        :param page_share: Доля бюджета запросов, которую можно потратить на страницы поиска.
+        :param save_pages: Сохранять ли страницы поиска (в папку pagination или в хранилище сегментов).
+        :return: Количество загруженных вакансий.
+        '''
+        if self.scheduler is None:
+            self.scheduler = CrawlScheduler()
+        previous_budget = self.request_budget
+        if budget is not None or seconds is not None:
+            self.request_budget = RequestBudget(budget, seconds)
+        run_budget = self.request_budget
+        candidates = {}
+        fetched = set()
+        # Результаты обхода комбинаций: (профессия, регион, found, изменения, время обхода, id вакансий к загрузке)
+        crawled = []
+        try:
+            combos = [(p_r, reg) for p_r in self.professional_roles for reg in self.regions_list]
+            for priority, p_r, reg in self.scheduler.rank(combos):
+                if run_budget is not None and (run_budget.exhausted or run_budget.share_used(page_share)):
+                    break
+                known = self.scheduler.known(p_r, reg)
+                since = self.scheduler.last_crawled(p_r, reg)
+                crawled_at = time.time()
+                found, changes, ids = None, 0, []
+                for _, _, prefix, page, jsObj, response in self.iter_combo_pages(p_r, reg,
+                                                                                order_by='publication_time'):
+                    if found is None:
+                        found = jsObj.get('found', 0)
+                    if save_pages:
+                        self.save_page(f'{prefix}_{page}', response)
+                    fresh = 0
+                    for item in jsObj.get('items', []):
+                        v = self.vacancy_index.compact(item)
+                        if not self.incremental or self.vacancy_index.needs_fetch(v):
+                            fresh += 1
+                            changes += self.scheduler.is_change(v, self.vacancy_index, since)
+                            candidates.setdefault(v['id'], v)
+                            ids.append(v['id'])
+                    # Выдача отсортирована по дате публикации: дальше только вакансии, которые уже загружены
+                    if self.incremental and known and not fresh:
+                        break
+                    if run_budget is not None and run_budget.share_used(page_share):
+                        break
+                if found is not None:
+                    crawled.append((p_r, reg, found, changes, crawled_at, ids))
+                    logging.info(f'Комбинация {p_r}, {reg} (приоритет {priority:.1f}): найдено {found}, '
+                                 f'к загрузке {len(ids)}, изменений {changes}')
+
+            ranked = self.scheduler.rank_vacancies(candidates.values(), self.vacancy_index)
+            for v in ranked:
+                if run_budget is not None and run_budget.exhausted:
+                    break
+                try:
+                    if self.fetch_vacancy(v):
+                        fetched.add(v['id'])
+                except Exception as e:
+                    logging.error(f"Ошибка при обработке вакансии {v['id']}: {str(e)}")
+        finally:
+            self.request_budget = previous_budget
+            for p_r, reg, found, changes, crawled_at, ids in crawled:
+                backlog = sum(1 for vacancy_id in ids if vacancy_id not in fetched)
+                self.scheduler.record(p_r, reg, found, changes, crawled_at, backlog)
+            self.flush_storage()
+            self.vacancy_index.flush()
+
+        used = '' if run_budget is None else f', запросов {run_budget.used}'
+        logging.info(f'Приоритетный обход: к загрузке {len(candidates)}, загружено {len(fetched)}{used}')
+        return len(fetched)
+
+    def fetch_vacancy_details(self):
+        '''
+        Метод для получения детальной информации о вакансиях.
+
+        Метод проходит по списку файлов со списком вакансий в папке "pagination"
+        и для каждой вакансии в каждом файле выполняет запрос к API для получения
+        детальной информации о вакансии. Полученные данные записываются в отдельные JSON-файлы
+        в папке "vacancies". В инкрементальном режиме запрашиваются только вакансии,
+        которые по индексу еще не загружены или изменились в выдаче поиска.
+
+        '''
+        # Очередь вакансий: неудачные запросы (429, 5xx, сетевые ошибки) возвращаются в неё с задержкой
+        queue = RetryQueue()
+        for fl, jsonText in self.iter_pagination():
+            try:
+                # Преобразуем полученный текст в объект справочника
+                jsonObj = json_loads(jsonText)
+
+                # Получаем непосредственно список вакансий
+                for v in jsonObj['items']:
+                    v = self.vacancy_index.compact(v)
+                    if not self.incremental or self.vacancy_index.needs_fetch(v):
+                        queue.push(v)
+
+            except Exception as e:
+                logging.error(f'Ошибка при обработке файла {fl}: {str(e)}')
+
+        while queue:
+            v, attempt = queue.pop()
+            self.metrics.set_gauge('queue_depth', len(queue), queue='vacancies')
+            # Обращаемся к API и получаем детальную информацию по конкретной вакансии
+            try:
+                req, delay = self.request_once(v['url'], attempt=attempt, label=f'вакансия {v["id"]}',
+                                               accept_statuses=VacancyIndex.GONE_STATUSES)
+                if req is None:
+                    if delay is not None:
+                        # Возвращаем вакансию в очередь для повторной попытки
+                        queue.push(v, attempt + 1, delay)
+                        self.metrics.inc('retries_total', endpoint='/vacancies/{id}')
+                    else:
+                        self.metrics.inc('vacancies_failed_total')
+                    continue
+                if req.status_code != 200:
+                    self.mark_vacancy_gone(v, req.status_code)
+                    continue
+
+                # Сохраняем ответ запроса в JSON-файл с идентификатором вакансии в качестве названия (или в хранилище),
+                # если данные вакансии изменились
+                self.store_vacancy(v, req.content)
+
+                logging.info(f'Вакансия {v["id"]} успешно обработана')
+                self.metrics.inc('vacancies_fetched_total')
+
+            except Exception as e:
+                logging.error(f'Ошибка при запросе к вакансии {v["id"]}: {str(e)}')
+
+        self.flush_storage()
+        self.vacancy_index.flush()
+        logging.info('Вакансии собраны')
+
+    def process_pagination_files(self):
+        '''
+        Метод для обработки файлов с данными пагинации.
+
+        Метод перебирает файлы, содержащие данные пагинации, и обрабатывает вакансии, сохраненные в этих файлах.
+        Для каждого файла выполняется чтение данных, декодирование JSON и последующая обработка вакансий с использованием
+        пула потоков. Метод также логирует возможные ошибки при обработке файлов и завершение процесса.
+
+        '''
+        for fl, jsonText in self.iter_pagination():
+            try:
+                # Преобразуем полученный текст в объект справочника
+                jsonObj = json_loads(jsonText)
+
+                # Создаем пул потоков с ThreadPoolExecutor
+                with ThreadPoolExecutor(max_workers=1) as executor:
+                    for v in jsonObj['items']:
+                        # Добавляем задачи на обработку вакансий в пул потоков
+                        executor.submit(self.process_vacancy, v)
+
+            except json.JSONDecodeError as e:
+                # Логируем ошибку декодирования JSON
+                logging.error(f"JSON ошибка декодирования для файла {fl}: {str(e)}")
+            except KeyError:
+                # Логируем ошибку KeyError, если ключ 'items' отсутствует в JSON данных
+                logging.error(f"KeyError: 'items' не найден в данных JSON для файла {fl}")
+                continue
+
+        # Логируем успешное завершение обработки файлов пагинации
+        self.flush_storage()
+        self.vacancy_index.flush()
+        logging.info('Вакансии собраны')
+
+    def enqueue_crawl(self, job_queue):
+        '''
+        Начинает новый обход в очереди заданий: добавляет задания на нулевые страницы всех комбинаций
+        профессий и регионов. Остальные страницы, части шардов и загрузка вакансий добавляются обработчиками.
+
+        :param job_queue: Очередь заданий CrawlJobQueue.
+        '''
+        job_queue.start_crawl()
+        jobs = []
+        for p_r in self.professional_roles:
+            for reg in self.regions_list:
+                payload = {'professional_role': p_r, 'area': reg, 'page': 0, 'shard': {}}
+                jobs.append(('page', f'page:{self.shard_file_prefix(p_r, reg)}_0', payload))
+        job_queue.put_many(jobs)
+        logging.info(f'В очередь добавлено заданий на обход: {len(jobs)}')
+
+    def process_page_job(self, job_queue, job):
+        '''
+        Выполняет задание на загрузку страницы поиска: сохраняет страницу, добавляет в очередь остальные страницы
+        шарда (или части шарда, если выдача больше глубины поиска) и задания на загрузку новых и изменившихся вакансий.
+
+        :return: Кортеж (результат, задержка): ('done', None), ('retry', задержка) или ('failed', None).
+        '''
+        payload = job['payload']
+        p_r, reg, page, shard = payload['professional_role'], payload['area'], payload['page'], payload['shard']
+        prefix = self.shard_file_prefix(p_r, reg, shard)
+        req, delay = self.request_once(f'{self.api_url}/vacancies', params=self.page_params(page, p_r, reg, shard),
+                                       headers=self.get_headers(), attempt=job['attempts'],
+                                       label=f'страница {page} ({prefix})')
+        if req is None:
+            return ('retry', delay) if delay is not None else ('failed', None)
+
+        jsObj = json_loads(req.content)
+        jobs = []
+        if page == 0:
+            sub_shards = self.needs_split(jsObj, shard, prefix)
+            if sub_shards:
+                for sub_shard in sub_shards:
+                    sub_payload = {'professional_role': p_r, 'area': reg, 'page': 0, 'shard': sub_shard}
+                    jobs.append(('page', f'page:{self.shard_file_prefix(p_r, reg, sub_shard)}_0', sub_payload))
+                job_queue.put_many(jobs)
+                return 'done', None
+            for next_page in range(1, jsObj['pages']):
+                jobs.append(('page', f'page:{prefix}_{next_page}', dict(payload, page=next_page)))
+
+        self.save_page(f'{prefix}_{page}', req.content)
+        for v in jsObj['items']:
+            v = self.vacancy_index.compact(v)
+            if not self.incremental or self.vacancy_index.needs_fetch(v):
+                jobs.append(('vacancy', f'vacancy:{v["id"]}', v))
+        job_queue.put_many(jobs)
+        return 'done', None
+
+    def process_vacancy_job(self, job_queue, job):
+        '''
+        Выполняет задание на загрузку детальных данных вакансии.
+
+        :return: Кортеж (результат, задержка): ('done', None), ('retry', задержка) или ('failed', None).
+        '''
+        v = job['payload']
+        req, delay = self.request_once(v['url'], headers={'User-Agent': self.ua.random}, attempt=job['attempts'],
+                                       label=f'вакансия {v["id"]}', accept_statuses=VacancyIndex.GONE_STATUSES)
+        if req is None:
+            return ('retry', delay) if delay is not None else ('failed', None)
+        if req.status_code != 200:
+            # Удаленная вакансия: задание выполнено, повторять его не нужно
+            self.mark_vacancy_gone(v, req.status_code)
+            return 'done', None
+        self.store_vacancy(v, req.content)
+        return 'done', None
+
+    def run_queue_worker(self, job_queue, worker_id=None, kinds=None, ack_batch=64, max_idle_wait=5.0):
+        '''
+        Обработчик очереди заданий: берет задания в аренду, выполняет их и подтверждает, пока в очереди
+        остаются незавершенные задания. Выполненные задания подтверждаются пачками по ack_batch - только после
+        того, как их данные записаны на диск, поэтому после падения процесса данные не теряются. Пачка
+        подтверждается и раньше, если до истечения аренды самого раннего задания в ней осталось меньше половины
+        срока аренды: иначе (например, при долгих паузах после ответов 429) задание выдали бы повторно.
+
+        :param job_queue: Очередь заданий CrawlJobQueue.
+        :param worker_id: Имя обработчика (по умолчанию - имя машины и PID процесса).
+        :param kinds: Виды обрабатываемых заданий ('page', 'vacancy'); по умолчанию - все.
+        :return: Количество выполненных заданий.
+        '''
+        worker_id = worker_id or f'{socket.gethostname()}:{os.getpid()}'
+        handlers = {'page': self.process_page_job, 'vacancy': self.process_vacancy_job}
+        completed = []
+        processed = 0
+        # Время, после которого пачку выполненных заданий нужно подтвердить, не дожидаясь ack_batch заданий
+        ack_before = float('inf')
+
+        def commit():
+            nonlocal ack_before
+            # Сначала записываем данные на диск, затем подтверждаем задания
+            self.flush_storage()
+            self.vacancy_index.flush()
+            job_queue.ack(worker_id, completed)
+            completed.clear()
+            ack_before = float('inf')
+
+        try:
+            while True:
+                jobs = job_queue.lease(worker_id, kinds=kinds)
+                if not jobs:
+                    commit()
+                    wait = job_queue.next_available_in()
+                    if wait is None:
+                        break
+                    time.sleep(min(max(wait, 0.1), max_idle_wait))
+                    continue
+
+                job = jobs[0]
+                try:
+                    result, delay = handlers[job['kind']](job_queue, job)
+                except Exception as e:
+                    logging.error(f"Ошибка при выполнении задания {job['key']}: {str(e)}")
+                    job_queue.nack(worker_id, job['id'], self.retry_policy.get_delay(job['attempts']), str(e))
+                    continue
+
+                if result == 'done':
+                    completed.append(job['id'])
+                    processed += 1
+                    ack_before = min(ack_before, job['lease_until'] - job_queue.lease_seconds / 2)
+                    if len(completed) >= ack_batch or time.time() >= ack_before:
+                        commit()
+                elif result == 'retry':
+                    job_queue.nack(worker_id, job['id'], delay)
+                else:
+                    job_queue.fail(worker_id, job['id'])
+        finally:
+            commit()
+
+        logging.info(f'Обработчик {worker_id} завершил работу, выполнено заданий: {processed}')
+        return processed
+
+class AsyncHHDataFetcher(HHDataFetcher):
+    '''
+    Асинхронный вариант HHDataFetcher.
+    Страницы поиска и детальные данные вакансий запрашиваются конкурентно (не более concurrency запросов
+    одновременно), а общая частота запросов ограничивается одним RateLimiter вместо фиксированных пауз time.sleep.
+    Неудачные запросы (429, 5xx, сетевые ошибки) возвращаются в очередь с задержкой по политике RetryPolicy.
+    Блокирующие операции (получение и обновление токена, запись страниц и вакансий, индекс в SQLite)
+    выполняются в потоках через asyncio.to_thread, чтобы не останавливать остальные запросы.
+    Требует установленного пакета aiohttp.
     '''
-    def __init__(self, client_id, client_secret, access_token):
-        self.client_id = client_id
-        self.client_secret = client_secret
-        self.access_token = access_token
-        self.expires_at = 0
-        self.refresh_token = None
+    def __init__(self, client_id=None, client_secret=None, professional_roles=None, regions_list=None,
+                 access_token=None, requests_per_second=5.0, concurrency=10, rate_limiter=None, http_client=None,
+                 retry_policy=None, vacancy_index=None, incremental=True, storage='files', area_tree=None,
+                 token_manager=None, metrics=None, api_url='https://api.hh.ru', history=None, keep_history=False,
+                 request_budget=None):
+        if aiohttp is None:
+            raise ImportError("Для AsyncHHDataFetcher необходим пакет aiohttp (pip install aiohttp)")
+        super().__init__(client_id=client_id, client_secret=client_secret, professional_roles=professional_roles,
+                         regions_list=regions_list, access_token=access_token, http_client=http_client,
+                         rate_limiter=rate_limiter or AdaptiveRateLimiter(rate=requests_per_second,
+                                                                          max_rate=requests_per_second * 2),
+                         retry_policy=retry_policy, vacancy_index=vacancy_index, incremental=incremental,
+                         storage=storage, area_tree=area_tree, token_manager=token_manager, metrics=metrics,
+                         api_url=api_url, history=history, keep_history=keep_history, request_budget=request_budget)
+        self.concurrency = concurrency
+        self.pending_retries = 0
 
-    def read_token_info(self):
+    def create_session(self):
         """
-        Метод для чтения информации о токенах из файла 'token_info.txt'.
-        При наличии файла с данными токенов, он считывает их и сохраняет в атрибуты объекта.
+        Создает aiohttp-сессию с пулом keep-alive соединений размером concurrency и сжатием ответов.
         """
+        connector = aiohttp.TCPConnector(limit=self.concurrency, keepalive_timeout=60)
+        return aiohttp.ClientSession(connector=connector, headers={'Accept-Encoding': 'gzip, deflate'})
+
+    async def request(self, session, url, params=None):
+        '''
+        Выполняет GET-запрос с учетом глобального ограничителя частоты и бюджета запросов.
+
+        :return: Кортеж (код состояния, тело ответа в виде текста, заголовки ответа);
+                 (None, None, None), если бюджет запросов исчерпан.
+        '''
+        if self.request_budget is not None and not self.request_budget.take():
+            logging.warning(f'Бюджет запросов исчерпан, запрос {url} не выполнен')
+            self.metrics.inc('requests_over_budget_total')
+            return None, None, None
+        await self.rate_limiter.acquire_async()
+        # Менеджер токенов может обновлять токен по сети: заголовки формируются вне цикла событий
+        if self.token_manager is not None:
+            headers = await asyncio.to_thread(self.get_headers)
+        else:
+            headers = self.get_headers()
+        endpoint = self.metrics.endpoint(url)
+        started = time.perf_counter()
         try:
-            with open('token_info.txt', 'r') as file:
-                lines = file.readlines()
-                if len(lines) >= 3:
-                    self.access_token = lines[0].strip()
-                    self.expires_at = float(lines[1].strip())
-                    self.refresh_token = lines[2].strip()
-        except FileNotFoundError:
-            pass
+            async with session.get(url, params=params, headers=headers) as response:
+                body = await response.read()
+        except aiohttp.ClientError as e:
+            self.metrics.inc('http_errors_total', endpoint=endpoint, error=type(e).__name__)
+            raise
+        self.metrics.observe('http_request_seconds', time.perf_counter() - started, endpoint=endpoint)
+        self.metrics.inc('http_requests_total', endpoint=endpoint, status=response.status)
+        self.metrics.inc('http_response_bytes_total', len(body), endpoint=endpoint)
+        if response.status == 200:
+            self.rate_limiter.on_success()
+        return response.status, body.decode('utf-8'), response.headers
 
-    def save_token_info(self):
+    def schedule_retry(self, queue, item, attempt, delay):
         """
-        Метод для сохранения информации о токенах в файл 'token_info.txt'.
-        Записывает текущие токены и срок их действия в указанный файл.
+        Возвращает задание в очередь через delay секунд, не блокируя обработчики.
         """
-        with open('token_info.txt', 'w') as file:
-            file.write(self.access_token + '\n')
-            file.write(str(self.expires_at) + '\n')
-            file.write(self.refresh_token + '\n')
+        def requeue():
+            queue.put_nowait((item, attempt))
+            self.pending_retries -= 1
 
-    def is_token_valid(self):
+        self.pending_retries += 1
+        asyncio.get_running_loop().call_later(delay, requeue)
+
+    async def run_workers(self, queue, worker):
         """
-        Метод для проверки действительности токена
+        Запускает concurrency обработчиков очереди и дожидается обработки всех заданий, включая отложенные повторы.
         """
-        if self.access_token:
-            if time.time() < self.expires_at:
-                # Выполните тестовый запрос к API, например, к /me или /user
-                test_url = 'https://api.hh.ru/me'
-                headers = {
-                    'Authorization': f'Bearer {self.access_token}',
-                }
+        tasks = [asyncio.create_task(self.queue_worker(queue, worker)) for _ in range(self.concurrency)]
+        while True:
+            await queue.join()
+            if not self.pending_retries:
+                break
+            await asyncio.sleep(0.1)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
 
-                response = requests.get(test_url, headers=headers)
-                if response.status_code == 200:
-                    # Токен действителен, возвращаем True
-                    return True
-            test_url = 'https://api.hh.ru/me'
-            headers = {
-                'Authorization': f'Bearer {self.access_token}',
-            }
-
-            response = requests.get(test_url, headers=headers)
-            if response.status_code == 200:
-                # Токен действителен, возвращаем True
-                return True
-
-            # Токен недействителен или его нет, возвращаем False
-            return False
+    async def queue_worker(self, queue, worker):
+        '''
+        Обработчик очереди: берет задания в виде (задание, номер попытки) и передает их в worker.
+        Если worker вернул задержку или произошла сетевая ошибка, задание повторяется позже;
+        остальные ошибки логируются и не останавливают обход.
+        '''
+        while True:
+            item, attempt = await queue.get()
+            try:
+                delay = await worker(queue, item, attempt)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                delay = self.retry_delay_for_error(e, attempt, str(item))
+            except Exception as e:
+                logging.error(f"Ошибка при обработке задания {item}: {str(e)}")
+                delay = None
+            try:
+                if delay is not None:
+                    self.schedule_retry(queue, item, attempt + 1, delay)
+            finally:
+                queue.task_done()
 
-    def get_oauth_token(self):
+    async def fetch_page_async(self, session, queue, job, attempt=0):
+        '''
+        Загружает одну страницу поиска и сохраняет её в папку pagination.
+        После загрузки нулевой страницы в очередь добавляются все остальные страницы шарда, а если выдача
+        больше глубины поиска API - нулевые страницы его частей (каждая часть обходится как отдельное задание).
+
+        :param job: Кортеж (профессия, регион, номер страницы, шард).
+        :return: Задержку перед повтором или None.
+        '''
+        p_r, reg, page, shard = job
+        prefix = self.shard_file_prefix(p_r, reg, shard)
+        params = self.page_params(page, p_r, reg, shard)
+        status, text, headers = await self.request(session, f'{self.api_url}/vacancies', params=params)
+        if status is None:
+            return None
+        if status != 200:
+            # При ответе 401 менеджер токенов обновляет токен по сети
+            return await asyncio.to_thread(self.check_response, status, headers, text, attempt,
+                                           f'страница {page} ({prefix})')
+
+        jsObj = json_loads(text)
+
+        if page == 0:
+            sub_shards = self.needs_split(jsObj, shard, prefix)
+            if sub_shards:
+                for sub_shard in sub_shards:
+                    queue.put_nowait(((p_r, reg, 0, sub_shard), 0))
+                return
+
+        # Сохраняем ответ как есть в папку pagination для каждой комбинации профессии и региона
+        await asyncio.to_thread(self.save_page, f'{prefix}_{page}', text)
+
+        if page == 0:
+            for next_page in range(1, jsObj['pages']):
+                queue.put_nowait(((p_r, reg, next_page, shard), 0))
+            logging.info(f"Для {prefix} найдено страниц: {jsObj['pages']}")
+
+    async def fetch_data_async(self):
         """
-        Метод для получения OAuth-токена.
-        Если у текущего токена еще не истек срок действия, он возвращается.
-        В противном случае, если у нас есть refresh_token, происходит попытка обновления токена.
-        Если нет refresh_token, выполняется запрос для получения новой пары токенов.
+        Асинхронный обход всех комбинаций профессий и регионов.
         """
-        self.read_token_info()
-
-        if self.is_token_valid():
-            # Токен действителен, возвращаем его
-            return self.access_token
-
-        if self.refresh_token:
-            refresh_token_url = 'https://hh.ru/oauth/token'
-            data = {
-                'grant_type': 'refresh_token',
-                'refresh_token': self.refresh_token,
-                'client_id': self.client_id,
-                'client_secret': self.client_secret,
-            }
-            # Запрос на обновление токена
-            headers = {
-                'Content-Type': 'application/x-www-form-urlencoded'
-            }
-
-            response = requests.post(refresh_token_url, data=data, headers=headers)
-
-            if response.status_code == 200:
-                # Обработка успешного ответа и сохранение нового токена
-                response_data = response.json()
-                self.access_token = response_data.get('access_token')
-                expires_in = response_data.get('expires_in')
-
-                if self.access_token and expires_in:
-                    self.expires_at = time.time() + expires_in
-                    self.save_token_info()
-                    return self.access_token
-                else:
-                    logging.error("Не удалось получить токен OAuth. Данные ответа неполные.")
-            else:
-                logging.error(f"Не удалось получить токен OAuth. Код состояния: {response.status_code}")
-                logging.error(response.text)
+        queue = asyncio.Queue()
+        for p_r in self.professional_roles:
+            for reg in self.regions_list:
+                queue.put_nowait(((p_r, reg, 0, {}), 0))
+
+        async with self.create_session() as session:
+            async def worker(q, job, attempt):
+                return await self.fetch_page_async(session, q, job, attempt)
+            await self.run_workers(queue, worker)
+
+        await asyncio.to_thread(self.flush_storage)
+        logging.info('Страницы поиска собраны')
+
+    def fetch_data(self):
+        '''
+        Метод для получения данных о вакансиях из различных профессий и регионов.
+        Страницы всех комбинаций профессий и регионов загружаются конкурентно.
+        '''
+        asyncio.run(self.fetch_data_async())
+
+    async def fetch_vacancy_async(self, session, v, attempt=0):
+        '''
+        Загружает детальную информацию о вакансии и сохраняет её в папку vacancies (или в хранилище сегментов).
+
+        :param v: Словарь вакансии из выдачи поиска (нужны ключи 'id' и 'url').
+        :return: Задержку перед повтором или None.
+        '''
+        status, text, headers = await self.request(session, v['url'])
+        if status is None:
+            return None
+        if status in VacancyIndex.GONE_STATUSES:
+            await asyncio.to_thread(self.mark_vacancy_gone, v, status)
+            return None
+        if status != 200:
+            return await asyncio.to_thread(self.check_response, status, headers, text, attempt,
+                                           f'вакансия {v["id"]}')
+
+        # Запись файла или сегмента, индекс и история вакансий - блокирующие операции
+        await asyncio.to_thread(self.store_vacancy, v, text)
+        logging.info(f'Вакансия {v["id"]} успешно обработана')
+        self.metrics.inc('vacancies_fetched_total')
+
+    async def fetch_vacancy_details_async(self):
+        """
+        Асинхронная загрузка детальной информации по всем вакансиям из папки pagination.
+        """
+        queue = asyncio.Queue()
+        for fl, jsonText in self.iter_pagination():
+            try:
+                jsonObj = json_loads(jsonText)
+                for v in jsonObj['items']:
+                    v = self.vacancy_index.compact(v)
+                    if not self.incremental or self.vacancy_index.needs_fetch(v):
+                        queue.put_nowait((v, 0))
+            except Exception as e:
+                logging.error(f'Ошибка при обработке файла {fl}: {str(e)}')
+
+        async with self.create_session() as session:
+            async def worker(q, v, attempt):
+                return await self.fetch_vacancy_async(session, v, attempt)
+            await self.run_workers(queue, worker)
+
+        await asyncio.to_thread(self.flush_storage)
+        await asyncio.to_thread(self.vacancy_index.flush)
+        logging.info('Вакансии собраны')
+
+    def fetch_vacancy_details(self):
+        '''
+        Метод для получения детальной информации о вакансиях.
+        Запросы по вакансиям из папки "pagination" выполняются конкурентно.
+        '''
+        asyncio.run(self.fetch_vacancy_details_async())
+
+def clean_texts_chunk(texts):
+    """
+    Очищает часть столбца текстов в процессе пула (см. HHDataParser.clean_texts).
+    """
+    return HHDataParser.clean_column(texts)
+
+def worker_log_file():
+    """
+    Путь к файлу лога текущего процесса (первый FileHandler корневого логгера) или None.
+    """
+    for handler in logging.getLogger().handlers:
+        if isinstance(handler, logging.FileHandler):
+            return handler.baseFilename
+    return None
+
+def init_worker_logging(log_file):
+    '''
+    Инициализатор процессов пула: направляет лог процесса в файл лога основного процесса.
+    Процессы, запущенные через spawn или forkserver, не наследуют настройки logging, и без этого
+    HHDataParser и HHDataFetcher создавали бы parser_hh.log в текущей папке.
+    '''
+    if log_file:
+        logging.basicConfig(filename=log_file, level=logging.INFO,
+                            format='%(asctime)s - %(levelname)s - %(message)s')
+
+def queue_worker_main(queue_path, fetcher_kwargs, kinds=None, rate=None, max_rate=None):
+    '''
+    Точка входа процесса-обработчика очереди заданий (см. run_queue_workers).
+    Каждый процесс создает собственные HHDataFetcher, ограничитель частоты (rate и max_rate запросов в секунду
+    на процесс) и соединение с очередью.
+    '''
+    if rate is not None:
+        fetcher_kwargs = dict(fetcher_kwargs, rate_limiter=AdaptiveRateLimiter(rate=rate, max_rate=max_rate))
+    fetcher = HHDataFetcher(**fetcher_kwargs)
+    job_queue = CrawlJobQueue(queue_path)
+    try:
+        return fetcher.run_queue_worker(job_queue, kinds=kinds)
+    finally:
+        job_queue.close()
+
+def run_queue_workers(queue_path='./docs/crawl_queue.sqlite', processes=4, kinds=None, requests_per_second=2.5,
+                      max_requests_per_second=10.0, **fetcher_kwargs):
+    '''
+    Запускает processes процессов-обработчиков очереди заданий и дожидается завершения обхода.
+    Обход должен быть начат заранее (HHDataFetcher.enqueue_crawl); прерванный обход продолжается
+    повторным вызовом этой функции. Для работы на нескольких машинах функцию запускают на каждой из них
+    с общим путем к очереди.
+
+    Частота запросов делится между процессами: каждый процесс создает собственный AdaptiveRateLimiter
+    с частотой requests_per_second / processes (не выше max_requests_per_second / processes), поэтому
+    суммарная частота запросов всех процессов не превышает requests_per_second (max_requests_per_second
+    после адаптивного ускорения) - как у одного HHDataFetcher. При запуске на нескольких машинах частоты
+    машин складываются, и requests_per_second на каждой машине нужно уменьшить соответственно.
+
+    :param requests_per_second: Суммарная начальная частота запросов всех процессов.
+    :param max_requests_per_second: Суммарная максимальная частота запросов всех процессов.
+    :param fetcher_kwargs: Параметры конструктора HHDataFetcher для каждого процесса (например, access_token);
+                           передаются в процессы через pickle, поэтому индекс создается в каждом процессе.
+                           Ограничитель частоты (rate_limiter) передать нельзя: он создается в процессах.
+    :return: Общее количество выполненных заданий.
+    '''
+    if fetcher_kwargs.get('storage') == 'segments' and fcntl is None and processes > 1:
+        raise ValueError("Хранилище сегментов из нескольких процессов требует блокировок fcntl (только Unix), "
+                         "используйте storage='files' или processes=1")
+    if 'rate_limiter' in fetcher_kwargs:
+        raise ValueError("Ограничитель частоты создается в каждом процессе, задайте requests_per_second "
+                         "и max_requests_per_second вместо rate_limiter")
+    rate, max_rate = requests_per_second / processes, max_requests_per_second / processes
+    with ProcessPoolExecutor(max_workers=processes, initializer=init_worker_logging,
+                             initargs=(worker_log_file(),)) as executor:
+        futures = [executor.submit(queue_worker_main, queue_path, fetcher_kwargs, kinds, rate, max_rate)
+                   for _ in range(processes)]
+        return sum(future.result() for future in futures)
+
+#Описание столбца таблицы вакансий для компилируемого извлечения полей
+class FieldSpec:
+    '''
+    Описание столбца таблицы вакансий: откуда и как извлекается значение из JSON вакансии
+    (см. HHDataParser.FIELD_SPEC и HHDataParser.compile_extractor).
+
+    :param column: Название столбца (идентификатор Python).
+    :param path: Путь к значению через точку, например 'employer.logo_urls.original'.
+    :param each: Ключ элементов списка: столбец получает список значений item[each] (например, названия навыков).
+    :param type: Функция приведения типа (например, str или int) для значений, отличных от None.
+    :param transform: Функция преобразования значений, отличных от None, или имя метода HHDataParser
+                      (например, 'clean_text'). Для разбора в пуле процессов функция должна быть определена
+                      на уровне модуля.
+    :param default: Значение столбца, если в данных вакансии нет ключа из пути.
+    :param required: Если True, отсутствие ключа - ошибка разбора всей записи (как для id).
+    '''
+    __slots__ = ('column', 'path', 'each', 'type', 'transform', 'default', 'required')
+
+    def __init__(self, column, path=None, each=None, type=None, transform=None, default=None, required=False):
+        if not column.isidentifier():
+            raise ValueError(f'Название столбца {column!r} должно быть идентификатором Python')
+        self.column = column
+        self.path = path or column
+        self.each = each
+        self.type = type
+        self.transform = transform
+        self.default = default
+        self.required = required
+
+    def __repr__(self):
+        return f'FieldSpec({self.column!r}, {self.path!r})'
+
+#Компактное представление вакансии для обработки в памяти
+class VacancyRecord:
+    '''
+    Запись вакансии с фиксированным набором полей (столбцы HHDataParser.extract_record) на основе __slots__:
+    у объекта нет собственного словаря, поэтому запись занимает в несколько раз меньше памяти, чем dict
+    с 60 ключами. Повторяющиеся строковые значения (регион, работодатель, график, URL логотипов и т.д.)
+    интернируются: все записи с одинаковым значением ссылаются на одну строку.
+    Запись поддерживает чтение и изменение полей как атрибутов и как ключей (record['name']), перебор
+    названий полей, keys/items/get и to_dict, поэтому может использоваться вместо словаря.
+    Для построения таблицы без промежуточных словарей используется columns.
+    '''
+    FIELDS = (
+        'id', 'is_premium', 'billing_type_id', 'billing_type_name', 'relations', 'name', 'insider_interview',
+        'is_response_letter_required', 'area_id', 'area_name', 'area_url', 'salary', 'type_id', 'type_name',
+        'address', 'allow_messages', 'experience_id', 'experience_name', 'schedule_id', 'schedule_name',
+        'employment_id', 'employment_name', 'department', 'contacts', 'description', 'key_skills',
+        'is_accept_handicapped', 'is_accept_kids', 'is_archived', 'response_url', 'specializations',
+        'professional_roles', 'code', 'is_hidden', 'is_quick_responses_allowed', 'driver_license_types',
+        'is_accept_incomplete_resumes', 'employer_id', 'employer_name', 'employer_url', 'employer_alternate_url',
+        'employer_logo_original', 'employer_logo_240', 'employer_logo_90', 'vacancies_url',
+        'is_accredited_it_employer', 'is_trusted_employer', 'published_at', 'created_at', 'initial_created_at',
+        'negotiations_url', 'suitable_resumes_url', 'apply_alternate_url', 'has_test', 'test', 'alternate_url',
+        'working_days', 'working_time_intervals', 'working_time_modes', 'is_accept_temporary', 'languages',
+    )
+    __slots__ = FIELDS
+    # Строковые поля, которые интернируются: поля с небольшим числом различных значений
+    # и даты (дата создания обычно совпадает с датой публикации)
+    INTERNED_FIELDS = (
+        'billing_type_id', 'billing_type_name', 'area_id', 'area_name', 'area_url', 'type_id', 'type_name',
+        'experience_id', 'experience_name', 'schedule_id', 'schedule_name', 'employment_id', 'employment_name',
+        'employer_id', 'employer_name', 'employer_url', 'employer_alternate_url', 'employer_logo_original',
+        'employer_logo_240', 'employer_logo_90', 'vacancies_url', 'name', 'published_at', 'created_at',
+        'initial_created_at',
+    )
+    # Поля-списки строк, элементы которых интернируются
+    INTERNED_LIST_FIELDS = ('key_skills', 'specializations', 'professional_roles')
+
+    def __init__(self, **fields):
+        for field in self.FIELDS:
+            setattr(self, field, fields.get(field))
+
+    @classmethod
+    def from_dict(cls, data):
+        '''
+        Создает запись из словаря полей (например, результата extract_record в старом формате),
+        интернируя повторяющиеся строки. Отсутствующие поля равны None, лишние ключи игнорируются.
+        '''
+        record = cls.__new__(cls)
+        for field in cls.FIELDS:
+            setattr(record, field, data.get(field))
+        for field in cls.INTERNED_FIELDS:
+            value = getattr(record, field)
+            if type(value) is str:
+                setattr(record, field, sys.intern(value))
+        for field in cls.INTERNED_LIST_FIELDS:
+            values = getattr(record, field)
+            if values:
+                setattr(record, field, [sys.intern(value) if type(value) is str else value for value in values])
+        return record
+
+    @classmethod
+    def columns(cls, records, fields=None):
+        '''
+        Преобразует список записей в столбцы {поле: список значений} для pandas.DataFrame или VacancyTableWriter.
+
+        :param fields: Список полей (по умолчанию - все поля FIELDS).
+        '''
+        return {field: list(map(operator.attrgetter(field), records)) for field in (fields or cls.FIELDS)}
+
+    def to_dict(self):
+        """
+        Словарь {поле: значение}.
+        """
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    def keys(self):
+        return self.FIELDS
+
+    def items(self):
+        return ((field, getattr(self, field)) for field in self.FIELDS)
+
+    def get(self, field, default=None):
+        return getattr(self, field, default) if field in self.FIELDS else default
+
+    def __getitem__(self, field):
+        try:
+            return getattr(self, field)
+        except (AttributeError, TypeError):
+            raise KeyError(field)
+
+    def __setitem__(self, field, value):
+        try:
+            setattr(self, field, value)
+        except (AttributeError, TypeError):
+            raise KeyError(field)
+
+    def __iter__(self):
+        return iter(self.FIELDS)
+
+    def __contains__(self, field):
+        return field in self.FIELDS
+
+    def __len__(self):
+        return len(self.FIELDS)
+
+    def __eq__(self, other):
+        if isinstance(other, VacancyRecord):
+            other = other.to_dict()
+        return self.to_dict() == other
+
+    def __repr__(self):
+        return f'VacancyRecord(id={self.id!r}, name={self.name!r})'
+
+    def __getstate__(self):
+        # Записи передаются между процессами пула, у объектов без __dict__ состояние задается явно
+        return tuple(getattr(self, field) for field in self.FIELDS)
+
+    def __setstate__(self, state):
+        for field, value in zip(self.FIELDS, state):
+            setattr(self, field, value)
+
+#Запись таблицы вакансий в CSV, Parquet или Arrow IPC
+class VacancyTableWriter:
+    '''
+    Записывает таблицу вакансий пачками в одном из форматов:
+    'csv' - текстовый файл с разделителем '|' (вложенные поля записываются строковым представлением),
+    'parquet' и 'arrow' (Arrow IPC) - бинарные столбцовые форматы с явной схемой: навыки и зарплата хранятся
+    как списки и структуры, поля с небольшим числом значений - в словарной (категориальной) кодировке,
+    даты публикации и создания - как временные метки. Для бинарных форматов нужен пакет pyarrow.
+
+    :param output_path: Путь к выходному файлу.
+    :param format: 'csv', 'parquet' или 'arrow'.
+    :param field_spec: Дополнительное описание столбцов (см. HHDataParser): для столбцов с type=str, int, float
+                       или bool тип Arrow берется из описания.
+    '''
+    FORMATS = ('csv', 'parquet', 'arrow')
+
+    def __init__(self, output_path, format='csv', field_spec=None):
+        if format not in self.FORMATS:
+            raise ValueError(f"Неизвестный формат {format}, допустимые значения: {', '.join(self.FORMATS)}")
+        if format != 'csv' and pa is None:
+            raise ImportError(f"Для формата {format} необходим пакет pyarrow (pip install pyarrow)")
+        self.output_path = output_path
+        self.format = format
+        self.field_spec = field_spec
+        self.writer = None
+        self.schema = None
+        self.rows = 0
+
+    @staticmethod
+    def arrow_schema():
+        """
+        Схема Arrow для столбцов, возвращаемых HHDataParser.extract_record.
+        """
+        category = pa.dictionary(pa.int32(), pa.string())
+        timestamp = pa.timestamp('s', tz='UTC')
+        id_name = pa.struct([('id', pa.string()), ('name', pa.string())])
+        metro = pa.struct([('station_id', pa.string()), ('station_name', pa.string()), ('line_id', pa.string()),
+                           ('line_name', pa.string()), ('lat', pa.float64()), ('lng', pa.float64())])
+        phone = pa.struct([('country', pa.string()), ('city', pa.string()), ('number', pa.string()),
+                           ('comment', pa.string())])
+        return pa.schema([
+            ('id', pa.string()),
+            ('is_premium', pa.bool_()),
+            ('billing_type_id', category),
+            ('billing_type_name', category),
+            ('relations', pa.list_(pa.string())),
+            ('name', pa.string()),
+            ('insider_interview', pa.struct([('id', pa.string()), ('url', pa.string())])),
+            ('is_response_letter_required', pa.bool_()),
+            ('area_id', category),
+            ('area_name', category),
+            ('area_url', category),
+            ('salary', pa.struct([('from', pa.int64()), ('to', pa.int64()), ('currency', pa.string()),
+                                  ('gross', pa.bool_())])),
+            ('type_id', category),
+            ('type_name', category),
+            ('address', pa.struct([('id', pa.string()), ('city', pa.string()), ('street', pa.string()),
+                                   ('building', pa.string()), ('description', pa.string()), ('lat', pa.float64()),
+                                   ('lng', pa.float64()), ('raw', pa.string()), ('metro', metro),
+                                   ('metro_stations', pa.list_(metro))])),
+            ('allow_messages', pa.bool_()),
+            ('experience_id', category),
+            ('experience_name', category),
+            ('schedule_id', category),
+            ('schedule_name', category),
+            ('employment_id', category),
+            ('employment_name', category),
+            ('department', id_name),
+            ('contacts', pa.struct([('name', pa.string()), ('email', pa.string()),
+                                    ('phones', pa.list_(phone))])),
+            ('description', pa.string()),
+            ('key_skills', pa.list_(pa.string())),
+            ('is_accept_handicapped', pa.bool_()),
+            ('is_accept_kids', pa.bool_()),
+            ('is_archived', pa.bool_()),
+            ('response_url', pa.string()),
+            ('specializations', pa.list_(pa.string())),
+            ('professional_roles', pa.list_(pa.string())),
+            ('code', pa.string()),
+            ('is_hidden', pa.bool_()),
+            ('is_quick_responses_allowed', pa.bool_()),
+            ('driver_license_types', pa.list_(pa.struct([('id', pa.string())]))),
+            ('is_accept_incomplete_resumes', pa.bool_()),
+            ('employer_id', pa.string()),
+            ('employer_name', pa.string()),
+            ('employer_url', pa.string()),
+            ('employer_alternate_url', pa.string()),
+            ('employer_logo_original', pa.string()),
+            ('employer_logo_240', pa.string()),
+            ('employer_logo_90', pa.string()),
+            ('vacancies_url', pa.string()),
+            ('is_accredited_it_employer', pa.bool_()),
+            ('is_trusted_employer', pa.bool_()),
+            ('published_at', timestamp),
+            ('created_at', timestamp),
+            ('initial_created_at', timestamp),
+            ('negotiations_url', pa.string()),
+            ('suitable_resumes_url', pa.string()),
+            ('apply_alternate_url', pa.string()),
+            ('has_test', pa.bool_()),
+            ('test', pa.struct([('required', pa.bool_())])),
+            ('alternate_url', pa.string()),
+            ('working_days', pa.list_(id_name)),
+            ('working_time_intervals', pa.list_(id_name)),
+            ('working_time_modes', pa.list_(id_name)),
+            ('is_accept_temporary', pa.bool_()),
+            ('languages', pa.list_(pa.struct([('id', pa.string()), ('name', pa.string()), ('level', id_name)]))),
+        ])
+
+    def parse_timestamp(self, value):
+        """
+        Преобразует дату в формате API hh.ru ('2024-01-31T10:00:00+0300') в datetime.
+        """
+        if not value:
+            return None
+        return datetime.strptime(value, '%Y-%m-%dT%H:%M:%S%z')
+
+    def column_type(self, name, values, known):
+        '''
+        Тип Arrow столбца: из FieldSpec с type=str, int, float или bool, затем из схемы arrow_schema,
+        иначе определенный pyarrow по первой пачке. Если в первой пачке у столбца только None, тип null
+        не подойдет для следующих пачек, поэтому такой столбец записывается строками.
+        '''
+        types = {str: pa.string(), int: pa.int64(), float: pa.float64(), bool: pa.bool_()}
+        for spec in self.field_spec or ():
+            if spec.column == name and spec.type in types:
+                return types[spec.type]
+        if name in known.names:
+            return known.field(name).type
+        inferred = pa.array(values).type
+        return pa.string() if pa.types.is_null(inferred) else inferred
+
+    def to_arrow(self, columns):
+        '''
+        Преобразует пачку в столбцовом виде в таблицу Arrow по схеме arrow_schema (см. column_type).
+        '''
+        if self.schema is None:
+            known = self.arrow_schema()
+            self.schema = pa.schema([(name, self.column_type(name, columns[name], known)) for name in columns])
+        arrays = []
+        for field in self.schema:
+            values = columns[field.name]
+            if pa.types.is_timestamp(field.type):
+                values = [self.parse_timestamp(value) for value in values]
+            arrays.append(pa.array(values, type=field.type))
+        return pa.Table.from_arrays(arrays, schema=self.schema)
+
+    def write(self, columns):
+        '''
+        Дописывает пачку записей в выходной файл.
+
+        :param columns: Словарь {столбец: список значений}.
+        :return: Количество записанных строк.
+        '''
+        if not columns:
+            return 0
+        if self.format == 'csv':
+            df = pd.DataFrame(columns)
+            first = self.rows == 0
+            df.to_csv(self.output_path, index=False, encoding='utf-8', sep='|', mode='w' if first else 'a',
+                      header=first)
+            count = len(df)
         else:
-            # Если у нас нет refresh_token, то делаем запрос для получения новой пары токенов
-            initial_token_url = 'https://hh.ru/oauth/token'
-            data = {
-                'grant_type': 'client_credentials',
-                'client_id': self.client_id,
-                'client_secret': self.client_secret,
-            }
-            # Запрос на получение новой пары токенов
-            response = requests.post(initial_token_url, data=data)
-
-            if response.status_code == 200:
-                # Обработка успешного ответа и сохранение новой пары токенов
-                response_data = response.json()
-                self.access_token = response_data.get('access_token')
-                expires_in = response_data.get('expires_in')
-                self.refresh_token = response_data.get('refresh_token')
-
-                if self.access_token and expires_in and self.refresh_token:
-                    self.expires_at = time.time() + expires_in
-                    self.save_token_info()
-                    return self.access_token
+            table = self.to_arrow(columns)
+            if self.writer is None:
+                if self.format == 'parquet':
+                    self.writer = pq.ParquetWriter(self.output_path, self.schema, compression='zstd')
                 else:
-                    logging.error("Не удалось получить токен OAuth. Данные ответа неполные.")
-            else:
-                logging.error(f"Не удалось получить токен OAuth. Код состояния: {response.status_code}")
-                logging.error(response.text)
+                    self.writer = pa.ipc.new_file(self.output_path, self.schema)
+            self.writer.write_table(table)
+            count = table.num_rows
+        self.rows += count
+        return count
 
-class HHDataFetcher:
+    def close(self):
+        """
+        Завершает запись (для Parquet и Arrow записывает метаданные файла).
+        """
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+def normalize_salary(salary, rates, income_tax=0.13):
     '''
-    Класс HHDataFetcher предназначен для извлечениея данных о вакансиях с сайта hh.ru (HeadHunter).
-    Функциональность:
-    Авторизация и получение доступа к данным.
-    Извлечение данных о вакансиях с использованием API hh.ru. Вы можете указать профессии и регионы для поиска.
-    Параллельная обработка вакансий: многопоточность для обработки нескольких вакансий одновременно.
-    Логирование: Позволяет отслеживать процесс выполнения и обнаруживать возможные ошибки.
-    Переработка токенов: Класс управляет авторизацией, обновлением и получением OAuth-токенов для доступа к данным.
+    Приводит зарплату вакансии к рублям на руки: середина вилки или её известная граница
+    (используется в VacancyAggregates и VacancySearchIndex).
+
+    :param salary: Словарь salary из данных вакансии (from, to, currency, gross) или None.
+    :param rates: Курсы валют: сколько единиц валюты стоит 1 рубль (см. VacancyAggregates.CURRENCY_RATES).
+    :param income_tax: Ставка НДФЛ для зарплат, указанных до вычета налогов.
+    :return: Зарплата в рублях или None, если зарплата не указана или валюта неизвестна.
     '''
-    def __init__(self, client_id=None, client_secret=None, professional_roles=None, regions_list=None, access_token=None):
-        self.client_id = client_id
-        self.client_secret = client_secret
-        self.professional_roles = professional_roles
-        self.regions_list = regions_list
-        self.ua = UserAgent()
-        self.access_token = access_token
+    if not isinstance(salary, dict):
+        return None
+    bounds = [value for value in (salary.get('from'), salary.get('to')) if value]
+    rate = rates.get(salary.get('currency') or 'RUR')
+    if not bounds or not rate:
+        return None
+    value = sum(bounds) / len(bounds) / rate
+    if salary.get('gross'):
+        value *= 1 - income_tax
+    return value
 
-        # Настройка логирования
-        logging.basicConfig(filename='parser_hh.log', level=logging.INFO,
-                            format='%(asctime)s - %(levelname)s - %(message)s')
+#Агрегаты для аналитики, обновляемые при разборе вакансий
+class VacancyAggregates:
+    '''
+    Инкрементальные агрегаты по разобранным вакансиям в SQLite, чтобы аналитика не перечитывала всю таблицу
+    вакансий: частота навыков и их совместная встречаемость, количество вакансий и гистограммы зарплат
+    по профессии, региону и дате публикации, количество вакансий работодателей.
+    Зарплаты приводятся к рублям "на руки" в месяц (курсы CURRENCY_RATES, налог INCOME_TAX для зарплат до вычета
+    налогов) и раскладываются по корзинам шириной SALARY_BUCKET рублей.
+    Для каждой вакансии хранится её вклад в агрегаты, поэтому повторный разбор той же вакансии ничего не меняет,
+    а разбор изменившейся заменяет её прежний вклад новым.
+    '''
+    # Курсы валют по умолчанию: сколько единиц валюты стоит 1 рубль (как поле rate справочника /dictionaries)
+    CURRENCY_RATES = {'RUR': 1.0, 'USD': 0.011, 'EUR': 0.0102, 'KZT': 5.6, 'BYR': 0.035, 'UAH': 0.45,
+                      'UZS': 140.0, 'AZN': 0.019, 'GEL': 0.03, 'KGS': 0.96}
+    # Ставка НДФЛ для пересчета зарплаты до вычета налогов в зарплату на руки
+    INCOME_TAX = 0.13
+    # Ширина корзины гистограммы зарплат (руб.); зарплаты от SALARY_MAX попадают в последнюю корзину
+    SALARY_BUCKET = 10000
+    SALARY_MAX = 1000000
+    GROUP_COLUMNS = ('role', 'area', 'date')
+    # Столбцы разобранной вакансии, из которых строятся агрегаты
+    RECORD_FIELDS = ('id', 'key_skills', 'professional_roles', 'area_name', 'published_at', 'employer_id',
+                     'employer_name', 'salary')
 
-        # Проверяем, существует ли директория для данных пагинации, и если нет, то создаем её
-        directory = './docs/pagination'
-        if not os.path.exists(directory):
-            os.makedirs(directory)
+    def __init__(self, db_path='./docs/aggregates.sqlite', rates=None, batch_size=5000):
+        self.db_path = db_path
+        self.rates = dict(self.CURRENCY_RATES, **(rates or {}))
+        self.batch_size = batch_size
+        self.pending = {}
+        self.connection = sqlite3.connect(db_path, timeout=60)
+        self.connection.executescript('''
+            CREATE TABLE IF NOT EXISTS contributions (id TEXT PRIMARY KEY, data TEXT);
+            CREATE TABLE IF NOT EXISTS skills (skill TEXT PRIMARY KEY, count INTEGER);
+            CREATE TABLE IF NOT EXISTS skill_pairs (
+                skill_a TEXT, skill_b TEXT, count INTEGER, PRIMARY KEY (skill_a, skill_b)) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS vacancy_counts (
+                role TEXT, area TEXT, date TEXT, count INTEGER, PRIMARY KEY (role, area, date)) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS salaries (
+                role TEXT, area TEXT, date TEXT, bucket INTEGER, count INTEGER, total REAL,
+                PRIMARY KEY (role, area, date, bucket)) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS salaries_area ON salaries (area, date);
+            CREATE TABLE IF NOT EXISTS employers (employer_id TEXT PRIMARY KEY, employer_name TEXT, count INTEGER);
+            ''')
+        self.connection.commit()
 
-        # Проверяем, существует ли директория для данных о вакансиях, и если нет, то создаем её
-        directory = './docs/vacancies'
-        if not os.path.exists(directory):
-            os.makedirs(directory)
+    def normalize_salary(self, salary):
+        """
+        Зарплата вакансии в рублях на руки по курсам self.rates (см. normalize_salary).
+        """
+        return normalize_salary(salary, self.rates, self.INCOME_TAX)
+
+    def contribution(self, record):
+        '''
+        Вклад вакансии в агрегаты: навыки, профессии, регион, дата публикации, работодатель и зарплата.
+        '''
+        skills = sorted({skill.strip() for skill in record.get('key_skills') or [] if skill and skill.strip()})
+        return {
+            'skills': skills,
+            'roles': sorted(set(record.get('professional_roles') or [])) or [''],
+            'area': record.get('area_name') or '',
+            'date': (record.get('published_at') or '')[:10],
+            'employer': [record.get('employer_id'), record.get('employer_name')],
+            'salary': self.normalize_salary(record.get('salary')),
+        }
+
+    def add(self, record):
+        '''
+        Учитывает разобранную вакансию (VacancyRecord или словарь с полями extract_record).
+        Изменения записываются в базу пачками по batch_size вакансий и при вызове flush.
+        '''
+        self.pending[str(record['id'])] = self.contribution(record)
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def add_many(self, records):
+        for record in records:
+            self.add(record)
+
+    def add_columns(self, columns):
+        """
+        Учитывает пачку вакансий в виде столбцов (словарь {столбец: список значений}, см. parse_json_batch).
+        """
+        if not columns:
+            return
+        for values in zip(*(columns[field] for field in self.RECORD_FIELDS)):
+            self.add(dict(zip(self.RECORD_FIELDS, values)))
+
+    def apply(self, deltas, data, sign):
+        """
+        Добавляет вклад вакансии data в накопленные изменения агрегатов с множителем sign (1 или -1).
+        """
+        skills, pairs, counts, salaries, employers = deltas
+        for i, skill in enumerate(data['skills']):
+            skills[skill] = skills.get(skill, 0) + sign
+            for other in data['skills'][i + 1:]:
+                pairs[(skill, other)] = pairs.get((skill, other), 0) + sign
+        employer_id, employer_name = data['employer']
+        if employer_id:
+            count, _ = employers.get(employer_id, (0, None))
+            employers[employer_id] = (count + sign, employer_name)
+        bucket = None
+        if data['salary'] is not None:
+            bucket = int(min(data['salary'], self.SALARY_MAX) // self.SALARY_BUCKET * self.SALARY_BUCKET)
+        for role in data['roles']:
+            key = (role, data['area'], data['date'])
+            counts[key] = counts.get(key, 0) + sign
+            if bucket is not None:
+                count, total = salaries.get(key + (bucket,), (0, 0.0))
+                salaries[key + (bucket,)] = (count + sign, total + sign * data['salary'])
+
+    def flush(self):
+        '''
+        Записывает накопленные вакансии в базу одной транзакцией: прежний вклад изменившихся вакансий
+        вычитается из агрегатов, новый - добавляется.
+        '''
+        if not self.pending:
+            return
+        pending, self.pending = self.pending, {}
+        ids = list(pending)
+        previous = {}
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            previous.update(self.connection.execute(
+                f'SELECT id, data FROM contributions WHERE id IN ({", ".join("?" * len(chunk))})', chunk))
+
+        deltas = ({}, {}, {}, {}, {})
+        rows = []
+        for record_id, data in pending.items():
+            text = json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+            if previous.get(record_id) == text:
+                continue
+            if record_id in previous:
+                self.apply(deltas, json.loads(previous[record_id]), -1)
+            self.apply(deltas, data, 1)
+            rows.append((record_id, text))
+        if not rows:
+            return
+
+        skills, pairs, counts, salaries, employers = deltas
+        execute = self.connection.executemany
+        execute('INSERT OR REPLACE INTO contributions VALUES (?, ?)', rows)
+        execute('''INSERT INTO skills VALUES (?, ?)
+                   ON CONFLICT(skill) DO UPDATE SET count = count + excluded.count''',
+                [item for item in skills.items() if item[1]])
+        execute('''INSERT INTO skill_pairs VALUES (?, ?, ?)
+                   ON CONFLICT(skill_a, skill_b) DO UPDATE SET count = count + excluded.count''',
+                [(a, b, count) for (a, b), count in pairs.items() if count])
+        execute('''INSERT INTO vacancy_counts VALUES (?, ?, ?, ?)
+                   ON CONFLICT(role, area, date) DO UPDATE SET count = count + excluded.count''',
+                [key + (count,) for key, count in counts.items() if count])
+        execute('''INSERT INTO salaries VALUES (?, ?, ?, ?, ?, ?)
+                   ON CONFLICT(role, area, date, bucket) DO UPDATE SET
+                       count = count + excluded.count, total = total + excluded.total''',
+                [key + value for key, value in salaries.items() if value[0]])
+        execute('''INSERT INTO employers VALUES (?, ?, ?)
+                   ON CONFLICT(employer_id) DO UPDATE SET
+                       count = count + excluded.count, employer_name = excluded.employer_name''',
+                [(employer_id, name, count) for employer_id, (count, name) in employers.items()])
+        # Удаляем строки, вклад в которые полностью вычтен
+        for table in ('skills', 'skill_pairs', 'vacancy_counts', 'salaries', 'employers'):
+            self.connection.execute(f'DELETE FROM {table} WHERE count <= 0')
+        self.connection.commit()
+
+    def close(self):
+        """
+        Записывает накопленные вакансии и закрывает базу.
+        """
+        self.flush()
+        self.connection.close()
+
+    def where(self, role=None, area=None, date_from=None, date_to=None):
+        """
+        Условие WHERE и его параметры для фильтров по профессии, региону и диапазону дат публикации.
+        """
+        conditions, params = [], []
+        for condition, value in (('role = ?', role), ('area = ?', area), ('date >= ?', date_from),
+                                 ('date <= ?', date_to)):
+            if value is not None:
+                conditions.append(condition)
+                params.append(value)
+        return (' WHERE ' + ' AND '.join(conditions)) if conditions else '', params
+
+    def top_skills(self, limit=20):
+        """
+        Самые частые навыки: список пар (навык, количество вакансий).
+        """
+        self.flush()
+        return self.connection.execute('SELECT skill, count FROM skills ORDER BY count DESC, skill LIMIT ?',
+                                       (limit,)).fetchall()
+
+    def related_skills(self, skill, limit=20):
+        """
+        Навыки, чаще всего встречающиеся вместе с skill: список пар (навык, количество вакансий).
+        """
+        self.flush()
+        return self.connection.execute('''
+            SELECT skill_b, count FROM skill_pairs WHERE skill_a = ?
+            UNION ALL
+            SELECT skill_a, count FROM skill_pairs WHERE skill_b = ?
+            ORDER BY count DESC, 1 LIMIT ?''', (skill, skill, limit)).fetchall()
+
+    def top_employers(self, limit=20):
+        """
+        Работодатели с наибольшим числом вакансий: список кортежей (id, название, количество вакансий).
+        """
+        self.flush()
+        return self.connection.execute(
+            'SELECT employer_id, employer_name, count FROM employers ORDER BY count DESC, employer_id LIMIT ?',
+            (limit,)).fetchall()
+
+    def check_group_by(self, group_by):
+        group_by = tuple(group_by or ())
+        unknown = [column for column in group_by if column not in self.GROUP_COLUMNS]
+        if unknown:
+            raise ValueError(f"Неизвестные столбцы группировки {unknown}, допустимые значения: "
+                             f"{', '.join(self.GROUP_COLUMNS)}")
+        return group_by
+
+    def vacancy_counts(self, group_by=('role',), role=None, area=None, date_from=None, date_to=None):
+        '''
+        Количество вакансий с группировкой по group_by (столбцы 'role', 'area', 'date').
+        Вакансия с несколькими профессиями учитывается в каждой из них.
+
+        :return: Список кортежей (значения столбцов группировки..., количество вакансий).
+        '''
+        self.flush()
+        group_by = self.check_group_by(group_by)
+        where, params = self.where(role, area, date_from, date_to)
+        columns = ', '.join(group_by + ('SUM(count)',))
+        group = f" GROUP BY {', '.join(group_by)}" if group_by else ''
+        return self.connection.execute(
+            f'SELECT {columns} FROM vacancy_counts{where}{group} ORDER BY SUM(count) DESC', params).fetchall()
+
+    def salary_histogram(self, role=None, area=None, date_from=None, date_to=None):
+        '''
+        Гистограмма зарплат (руб. на руки) с фильтрами по профессии, региону и датам публикации.
+
+        :return: Список кортежей (нижняя граница корзины, верхняя граница или None для последней, количество).
+        '''
+        self.flush()
+        where, params = self.where(role, area, date_from, date_to)
+        rows = self.connection.execute(
+            f'SELECT bucket, SUM(count) FROM salaries{where} GROUP BY bucket ORDER BY bucket', params).fetchall()
+        return [(bucket, None if bucket >= self.SALARY_MAX else bucket + self.SALARY_BUCKET, count)
+                for bucket, count in rows]
+
+    def salary_stats(self, group_by=(), role=None, area=None, date_from=None, date_to=None,
+                     quantiles=(0.25, 0.5, 0.75)):
+        '''
+        Статистика зарплат (руб. на руки) с группировкой по group_by ('role', 'area', 'date'):
+        количество вакансий с зарплатой, средняя зарплата и квантили, оцененные по гистограмме
+        (линейная интерполяция внутри корзины).
+
+        :return: Список словарей со столбцами группировки и ключами count, mean и q<процент> (например, q50).
+        '''
+        self.flush()
+        group_by = self.check_group_by(group_by)
+        where, params = self.where(role, area, date_from, date_to)
+        columns = ', '.join(group_by + ('bucket', 'SUM(count)', 'SUM(total)'))
+        rows = self.connection.execute(
+            f"SELECT {columns} FROM salaries{where} GROUP BY {', '.join(group_by + ('bucket',))} "
+            f"ORDER BY {', '.join(group_by + ('bucket',))}", params).fetchall()
+
+        groups = {}
+        for row in rows:
+            groups.setdefault(row[:len(group_by)], []).append(row[len(group_by):])
+        result = []
+        for key, buckets in groups.items():
+            count = sum(bucket_count for _, bucket_count, _ in buckets)
+            stats = dict(zip(group_by, key))
+            stats['count'] = count
+            stats['mean'] = sum(total for _, _, total in buckets) / count
+            for q in quantiles:
+                rank = q * count
+                seen = 0
+                for bucket, bucket_count, total in buckets:
+                    if seen + bucket_count >= rank:
+                        if bucket >= self.SALARY_MAX:
+                            value = total / bucket_count
+                        else:
+                            value = bucket + self.SALARY_BUCKET * (rank - seen) / bucket_count
+                        break
+                    seen += bucket_count
+                stats[f'q{round(q * 100)}'] = value
+            result.append(stats)
+        return result
+
+#Инвертированный индекс для поиска вакансий по тексту и навыкам
+class VacancySearchIndex:
+    '''
+    Локальный инвертированный индекс по разобранным вакансиям в SQLite: поиск по словам и фразам в полях
+    name, description, key_skills и employer_name с булевыми операторами и фильтрами по региону, опыту и зарплате.
+
+    Синтаксис запроса: слова через пробел (неявное AND), AND, OR, NOT, скобки, фразы в кавычках ("data science")
+    и поле перед словом или фразой (name:аналитик, skill:"machine learning", description:, employer:).
+    Слово без поля ищется во всех полях.
+
+    Вакансиям присваиваются внутренние номера по порядку добавления. Списки вхождений хранятся по сегментам
+    (один сегмент на пачку из batch_size вакансий): номера вакансий - разностями в кодировке varint,
+    позиции слов для фразового поиска - отдельным блоком в той же кодировке. При изменении вакансии она
+    получает новый номер, а старый помечается удаленным; optimize объединяет сегменты и убирает удаленные номера
+    (выполняется автоматически, когда сегментов становится больше max_segments).
+    '''
+    FIELDS = {'name': 'n', 'description': 'd', 'key_skills': 's', 'employer_name': 'e'}
+    # Столбцы разобранной вакансии, из которых строится индекс
+    RECORD_FIELDS = ('id', 'area_id', 'experience_id', 'salary') + tuple(FIELDS)
+    # Синонимы полей в запросе
+    FIELD_ALIASES = {'name': 'name', 'description': 'description', 'skill': 'key_skills', 'skills': 'key_skills',
+                     'key_skills': 'key_skills', 'employer': 'employer_name', 'employer_name': 'employer_name'}
+    # Промежуток позиций между навыками, чтобы фраза не совпадала на стыке двух навыков
+    SKILL_GAP = 100
+    TOKEN_RE = re.compile(r'\w+')
+    QUERY_RE = re.compile(r'\s*(?:(\()|(\))|(?:(\w+):)?"([^"]*)"|(?:(\w+):)?([^\s()"]+))')
+    INCOME_TAX = VacancyAggregates.INCOME_TAX
+
+    def __init__(self, db_path='./docs/search_index.sqlite', batch_size=5000, max_segments=64, rates=None):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.max_segments = max_segments
+        self.rates = dict(VacancyAggregates.CURRENCY_RATES, **(rates or {}))
+        self.connection = sqlite3.connect(db_path, timeout=60)
+        self.connection.executescript('''
+            CREATE TABLE IF NOT EXISTS docs (
+                docno INTEGER PRIMARY KEY,
+                id TEXT,
+                content_hash TEXT,
+                live INTEGER,
+                area_id TEXT,
+                experience_id TEXT,
+                salary REAL
+            );
+            CREATE TABLE IF NOT EXISTS postings (
+                term TEXT,
+                segment INTEGER,
+                docs BLOB,
+                positions BLOB,
+                PRIMARY KEY (term, segment)
+            ) WITHOUT ROWID;
+            ''')
+        self.connection.commit()
+
+        # Документы загружаются в память: id -> (номер, хеш) для живых документов и атрибуты для фильтров
+        self.ids = {}
+        self.attributes = {}
+        self.next_docno = 1
+        for docno, vacancy_id, content_hash, live, area_id, experience_id, salary in self.connection.execute(
+                'SELECT * FROM docs'):
+            self.next_docno = max(self.next_docno, docno + 1)
+            if live:
+                self.ids[vacancy_id] = (docno, content_hash)
+                self.attributes[docno] = (vacancy_id, area_id, experience_id, salary)
+        self.segment = (self.connection.execute('SELECT MAX(segment) FROM postings').fetchone()[0] or 0) + 1
+        self.pending_postings = {}
+        self.pending_docs = []
+        self.pending_dead = []
+
+    def normalize_salary(self, salary):
+        """
+        Зарплата вакансии в рублях на руки - как в агрегатах (см. normalize_salary).
+        """
+        return normalize_salary(salary, self.rates, self.INCOME_TAX)
+
+    @staticmethod
+    def encode(values):
+        """
+        Кодирует неубывающую последовательность целых чисел разностями в varint.
+        """
+        data = bytearray()
+        previous = 0
+        for value in values:
+            delta = value - previous
+            previous = value
+            while delta >= 128:
+                data.append(delta & 127 | 128)
+                delta >>= 7
+            data.append(delta)
+        return bytes(data)
 
-        # Получение и инициализация регионов
-        self.init_regions()
+    @staticmethod
+    def decode(data):
+        """
+        Декодирует последовательность varint (без восстановления разностей).
+        """
+        values = []
+        value = shift = 0
+        for byte in data:
+            if byte < 128:
+                values.append(value | byte << shift)
+                value = shift = 0
+            else:
+                value |= (byte & 127) << shift
+                shift += 7
+        return values
 
-    def init_regions(self):
-        # Получение регионов и инициализация
-        sub_regions = self.get_region(filter_regions='113', sub_region=False)
-        self.regions_list = [region['id'] for region in sub_regions]
-        self.regions_list.sort()
+    def tokenize(self, text):
+        """
+        Разбивает текст на слова в нижнем регистре (ё приравнивается к е).
+        """
+        if not text:
+            return []
+        return self.TOKEN_RE.findall(text.lower().replace('ё', 'е'))
 
-    def get_region(self, filter_regions='113', sub_region=False):
+    def field_tokens(self, record):
         '''
-        Получает список регионов с заданным 'parent_id' и, при необходимости, более вложенных регионов.
+        Слова полей вакансии с позициями: словарь {код поля: [(слово, позиция), ...]}.
+        '''
+        result = {}
+        for field, code in self.FIELDS.items():
+            value = record.get(field)
+            if field == 'key_skills':
+                tokens = []
+                for i, skill in enumerate(value or []):
+                    tokens.extend((token, i * self.SKILL_GAP + j) for j, token in enumerate(self.tokenize(skill)))
+            else:
+                tokens = [(token, j) for j, token in enumerate(self.tokenize(value))]
+            result[code] = tokens
+        return result
 
-        :param filter_regions: Идентификатор родительского региона для фильтрации.
-        :param sub_region: Если True, возвращает более вложенные регионы.
-        :return: Список регионов в виде словарей.
+    def add(self, record):
+        '''
+        Добавляет или обновляет вакансию (VacancyRecord или словарь с полями extract_record; описание должно быть
+        очищено clean_text). Неизменившаяся вакансия пропускается. Изменения записываются в базу пачками
+        по batch_size вакансий и при вызове flush.
         '''
+        vacancy_id = str(record['id'])
+        indexed = [record.get(field) for field in self.FIELDS]
+        attributes = (record.get('area_id'), record.get('experience_id'), self.normalize_salary(record.get('salary')))
+        content_hash = hashlib.sha1(json.dumps([indexed, attributes], ensure_ascii=False).encode('utf8')).hexdigest()
+        current = self.ids.get(vacancy_id)
+        if current is not None:
+            if current[1] == content_hash:
+                return
+            self.pending_dead.append(current[0])
+            del self.attributes[current[0]]
 
-        # URL для получения дерева всех регионов API hh.ru
-        url = 'https://api.hh.ru/areas'
+        docno = self.next_docno
+        self.next_docno += 1
+        self.ids[vacancy_id] = (docno, content_hash)
+        self.attributes[docno] = (vacancy_id,) + attributes
+        self.pending_docs.append((docno, vacancy_id, content_hash, 1) + attributes)
+        for code, tokens in self.field_tokens(record).items():
+            for token, position in tokens:
+                self.pending_postings.setdefault(f'{code}:{token}', {}).setdefault(docno, []).append(position)
 
-        # Выполняем GET-запрос
-        response = requests.get(url)
+        if len(self.pending_docs) >= self.batch_size:
+            self.flush()
 
-        # Проверяем успешность запроса
-        if response.status_code == 200:
-            # Декодируем JSON-ответ
-            regions_data = response.json()
-
-            # Возвращаем список регионов с заданным 'parent_id'
-            regions = [reg for reg in regions_data[0]['areas'] if reg['parent_id'] == filter_regions]
-
-            # Получаем более вложенные регионы, если sub_region=True
-            if sub_region:
-                sub_regions = []
-                for reg in regions:
-                    sub_regions.extend(reg.get('areas', []))
-                return sub_regions
-            else:
-                return regions
-        else:
-            logging.error(f"Ошибка при запросе: {response.status_code}")
-            return []
+    def add_many(self, records):
+        for record in records:
+            self.add(record)
 
-    def get_page(self, page=0, professional_role=None, area=None):
+    def add_columns(self, columns):
+        """
+        Добавляет пачку вакансий в виде столбцов (словарь {столбец: список значений}, см. parse_json_batch).
+        """
+        if not columns:
+            return
+        for values in zip(*(columns[field] for field in self.RECORD_FIELDS)):
+            self.add(dict(zip(self.RECORD_FIELDS, values)))
+
+    def flush(self):
         '''
-        Метод выполняет GET-запрос к API HeadHunter для получения данных о вакансиях.
+        Записывает накопленные вакансии новым сегментом списков вхождений
+        и объединяет сегменты, если их стало больше max_segments.
+        '''
+        if not (self.pending_docs or self.pending_dead):
+            return
+        self.write_segment()
+        segments = self.connection.execute('SELECT COUNT(DISTINCT segment) FROM postings').fetchone()[0]
+        if segments > self.max_segments:
+            self.optimize()
 
-        :param page: Номер страницы поиска.
-        :param professional_role: Профессиональная роль, по которой осуществляется поиск вакансий.
-        :param area: Регион (географическая область) для поиска вакансий.
+    def write_segment(self):
+        """
+        Записывает накопленные вакансии новым сегментом.
+        """
+        rows = []
+        for term, docs in self.pending_postings.items():
+            docnos = sorted(docs)
+            positions = bytearray()
+            for docno in docnos:
+                doc_positions = docs[docno]
+                positions += self.encode([len(doc_positions)])
+                positions += self.encode(doc_positions)
+            rows.append((term, self.segment, self.encode(docnos), bytes(positions)))
+        self.connection.executemany('INSERT INTO postings VALUES (?, ?, ?, ?)', rows)
+        self.connection.executemany('INSERT INTO docs VALUES (?, ?, ?, ?, ?, ?, ?)', self.pending_docs)
+        self.connection.executemany('UPDATE docs SET live = 0 WHERE docno = ?', [(d,) for d in self.pending_dead])
+        self.connection.commit()
+        if rows:
+            self.segment += 1
+        self.pending_postings = {}
+        self.pending_docs = []
+        self.pending_dead = []
 
-        :return: Данные о вакансиях в формате текста.
+    def optimize(self):
         '''
-        try:
-            # Определяем заголовки для HTTP-запроса, включая авторизацию через токен доступа.
-            headers = {'User-Agent': self.ua.random}
-            if self.access_token is not None:
-                headers = {
-                    'Authorization': f'Bearer {self.access_token}', 'User-Agent': self.ua.random,
-                }
+        Объединяет все сегменты в один и удаляет из списков вхождений удаленные (измененные) вакансии.
+        '''
+        self.write_segment()
+        live = self.attributes
+        merged = []
+        current_term, docs = None, []
 
-            # Определяем параметры для GET-запроса, такие как номер страницы и количество вакансий на странице.
-            params = {
-                'page': page,  # Номер страницы поиска
-                'per_page': 100,  # Количество вакансий на одной странице
-            }
+        def merge():
+            docnos = [docno for docno, _ in docs if docno in live]
+            if docnos:
+                positions = bytearray()
+                for docno, doc_positions in docs:
+                    if docno in live:
+                        positions += self.encode([len(doc_positions)])
+                        positions += self.encode(doc_positions)
+                merged.append((current_term, 1, self.encode(docnos), bytes(positions)))
 
-            # Если задана профессия, добавляем ее в параметры запроса.
-            if professional_role is not None:
-                params['professional_role'] = professional_role
+        for term, docs_blob, positions_blob in self.connection.execute(
+                'SELECT term, docs, positions FROM postings ORDER BY term, segment'):
+            if term != current_term:
+                if current_term is not None:
+                    merge()
+                current_term, docs = term, []
+            docs.extend(zip(self.decode_docs(docs_blob), self.decode_positions(positions_blob)))
+        if current_term is not None:
+            merge()
 
-            # Если задан регион, также добавляем его в параметры запроса.
-            if area is not None:
-                params['area'] = area
+        self.connection.execute('DELETE FROM postings')
+        self.connection.executemany('INSERT INTO postings VALUES (?, ?, ?, ?)', merged)
+        self.connection.execute('DELETE FROM docs WHERE live = 0')
+        self.connection.commit()
+        self.connection.execute('VACUUM')
+        self.segment = 2
+        logging.info(f'Поисковый индекс {self.db_path} оптимизирован: {len(merged)} слов, {len(live)} вакансий')
 
-            # Выполняем GET-запрос к API HeadHunter с указанными параметрами и заголовками.
-            req = requests.get('https://api.hh.ru/vacancies', params=params, headers=headers)
+    def close(self):
+        """
+        Записывает накопленные вакансии и закрывает базу.
+        """
+        self.flush()
+        self.connection.close()
 
-            # Получаем текстовое содержимое ответа.
-            data = req.content.decode()
+    def decode_docs(self, blob):
+        return list(itertools.accumulate(self.decode(blob)))
 
-            # Закрываем соединение с сервером.
-            req.close()
+    def decode_positions(self, blob):
+        """
+        Декодирует блок позиций: список списков позиций по документам сегмента.
+        """
+        values = self.decode(blob)
+        result = []
+        i = 0
+        while i < len(values):
+            count = values[i]
+            result.append(list(itertools.accumulate(values[i + 1:i + 1 + count])))
+            i += 1 + count
+        return result
 
-            # Возвращаем данные о вакансиях.
-            return data
-        except Exception as e:
-            # Если возникает ошибка, выводим сообщение об ошибке с описанием исключения.
-            logging.error(f"Ошибка при запросе: {str(e)}")
-            print(f"Ошибка: {str(e)}")
+    def postings(self, term, with_positions=False):
+        '''
+        Список вхождений слова term (с кодом поля, например 'n:python') по всем сегментам.
 
-    def process_vacancy(self, v):
+        :return: Множество номеров живых вакансий или, если with_positions=True, словарь {номер: позиции}.
         '''
-        Метод выполняет обработку данных о вакансии и сохраняет их в файл формата JSON.
+        rows = self.connection.execute(
+            f"SELECT docs{', positions' if with_positions else ''} FROM postings WHERE term = ? ORDER BY segment",
+            (term,)).fetchall()
+        live = self.attributes
+        if not with_positions:
+            return {docno for row in rows for docno in self.decode_docs(row[0]) if docno in live}
+        result = {}
+        for docs_blob, positions_blob in rows:
+            for docno, positions in zip(self.decode_docs(docs_blob), self.decode_positions(positions_blob)):
+                if docno in live:
+                    result[docno] = positions
+        return result
 
-        :param v: Словарь, представляющий информацию о вакансии.
+    def match_phrase(self, code, tokens):
+        """
+        Номера вакансий, в поле code которых слова tokens идут подряд.
+        """
+        if len(tokens) == 1:
+            return self.postings(f'{code}:{tokens[0]}')
+        lists = [self.postings(f'{code}:{token}', with_positions=True) for token in tokens]
+        candidates = set(lists[0]).intersection(*lists[1:])
+        result = set()
+        for docno in candidates:
+            following = [set(positions[docno]) for positions in lists[1:]]
+            if any(all(start + i + 1 in positions for i, positions in enumerate(following))
+                   for start in lists[0][docno]):
+                result.add(docno)
+        return result
 
-        Метод проверяет, существует ли файл с идентификатором вакансии.
-        Если файл уже существует, то вакансия считается обработанной и парсинг пропускается.
-        В противном случае, создается новый заголовок (с случайным User-Agent),
-        и выполняется GET-запрос к URL вакансии для получения данных.
-        Полученные данные записываются в JSON-файл с идентификатором вакансии в названии файла.
-        Метод также записывает информацию о успешной обработке вакансии в лог-файл.
-        В случае возникновения ошибки, метод записывает информацию об ошибке в лог-файл.
+    def match(self, field, text):
+        """
+        Номера вакансий, содержащих слово или фразу text в поле field (None - в любом поле).
+        """
+        tokens = self.tokenize(text)
+        if not tokens:
+            return set()
+        if field is None:
+            return set().union(*(self.match_phrase(code, tokens) for code in self.FIELDS.values()))
+        if field not in self.FIELD_ALIASES:
+            raise ValueError(f"Неизвестное поле {field}, допустимые значения: {', '.join(self.FIELD_ALIASES)}")
+        return self.match_phrase(self.FIELDS[self.FIELD_ALIASES[field]], tokens)
 
+    def parse_query(self, query):
         '''
-        try:
-            # Проверяем, существует ли файл с ID вакансии
-            fileName = './docs/vacancies/{}.json'.format(v['id'])
-            if os.path.exists(fileName):
-                # Проверяем размер файла
-                file_size = os.path.getsize(fileName)  # Размер файла в байтах
-                if file_size > 1060:  # 1 килобайт = 1024 байта
-                    logging.info(f"Вакансия {v['id']} уже обработана и размер файла больше 1 кБ. Пропуск...")
-                    return  # Пропускаем парсинг вакансии, если файл уже существует и размер больше 1 кБ
-
-            # Создаем заголовок (headers) с новым случайным User-Agent
-            headers = {'User-Agent': self.ua.random}
-            req = requests.get(v['url'], headers=headers)
-            data = req.content.decode()
-            req.close()
+        Разбирает запрос в список лексем: ('(',), (')',), ('op', 'AND'|'OR'|'NOT') и ('term', поле, текст).
+        '''
+        tokens = []
+        position = 0
+        query = query.strip()
+        while position < len(query):
+            found = self.QUERY_RE.match(query, position)
+            if found is None or found.end() == position:
+                raise ValueError(f'Ошибка в запросе в позиции {position}: {query}')
+            position = found.end()
+            opening, closing, phrase_field, phrase, word_field, word = found.groups()
+            if opening:
+                tokens.append(('(',))
+            elif closing:
+                tokens.append((')',))
+            elif phrase is not None:
+                tokens.append(('term', phrase_field and phrase_field.lower(), phrase))
+            elif word in ('AND', 'OR', 'NOT') and word_field is None:
+                tokens.append(('op', word))
+            else:
+                tokens.append(('term', word_field and word_field.lower(), word))
+        return tokens
 
-            # Создаем файл в формате JSON с идентификатором вакансии в названии
-            # Записываем в него ответ запроса и закрываем файл
-            fileName = './docs/vacancies/{}.json'.format(v['id'])
-            with open(fileName, mode='w', encoding='utf8') as f:
-                f.write(data)
+    def evaluate(self, tokens):
+        """
+        Вычисляет разобранный запрос (OR < AND < NOT, скобки) и возвращает множество номеров вакансий.
+        """
+        position = 0
 
-            # Небольшая задержка перед следующей операцией
-            time.sleep(0.4)
+        def peek():
+            return tokens[position] if position < len(tokens) else None
 
-            # Логируем успешную обработку вакансии
-            logging.info(f"Вакансия {v['id']} успешно обработана")
-        except Exception as e:
-            # Логируем ошибку обработки вакансии
-            logging.error(f"Ошибка при обработке вакансии {v['id']}: {str(e)}")
+        def parse_or():
+            nonlocal position
+            result = parse_and()
+            while peek() == ('op', 'OR'):
+                position += 1
+                result = result | parse_and()
+            return result
 
-    def fetch_data(self):
-        '''
-        Метод для получения данных о вакансиях из различных профессий и регионов.
+        def parse_and():
+            nonlocal position
+            result = parse_not()
+            while peek() is not None and peek() != ('op', 'OR') and peek() != (')',):
+                if peek() == ('op', 'AND'):
+                    position += 1
+                result = result & parse_not()
+            return result
 
-        Метод начинает процесс сбора данных о вакансиях, перебирая профессии и регионы,
-        заданные в объекте. Для каждой профессиональной роли и региона выполняются запросы
-        к API и обработка данных. Метод обрабатывает страницы с вакансиями, сохраняя их в отдельные файлы,
-        и логирует успешное завершение этапов.
+        def parse_not():
+            nonlocal position
+            if peek() == ('op', 'NOT'):
+                position += 1
+                return set(self.attributes) - parse_not()
+            return parse_atom()
 
-        '''
-        try:
-            # Создаем пул потоков с ThreadPoolExecutor
-            with ThreadPoolExecutor(max_workers=1) as executor:
-                for p_r in self.professional_roles:
-                    for reg in self.regions_list:
-                        page = 0
-                        while True:
-                            response = self.get_page(page, p_r, reg)
-                            #print(response)
+        def parse_atom():
+            nonlocal position
+            token = peek()
+            if token is None:
+                raise ValueError('Неожиданный конец запроса')
+            position += 1
+            if token == ('(',):
+                result = parse_or()
+                if peek() != (')',):
+                    raise ValueError('Не закрыта скобка в запросе')
+                position += 1
+                return result
+            if token[0] != 'term':
+                raise ValueError(f'Неожиданная лексема в запросе: {token[-1]}')
+            return self.match(token[1], token[2])
 
-                            jsObj = json.loads(response)
+        result = parse_or()
+        if position != len(tokens):
+            raise ValueError(f'Лишняя лексема в запросе: {tokens[position][-1]}')
+        return result
 
-                            # Сохраняем файлы в папку pagination для каждой комбинации профессии и региона
-                            nextFileName = f'./docs/pagination/{p_r}_{reg}_{page}.json'
-                            with open(nextFileName, mode='w', encoding='utf8') as f:
-                                f.write(json.dumps(jsObj, ensure_ascii=False))
+    def search(self, query=None, area_id=None, experience_id=None, salary_from=None, salary_to=None, limit=None):
+        '''
+        Поиск вакансий по запросу и фильтрам.
 
-                            # Проверка на последнюю страницу, если вакансий меньше 5000
-                            if (jsObj['pages'] - page) <= 1:
-                                break
+        :param query: Строка запроса (см. описание класса) или None - все вакансии.
+        :param area_id: Id региона или список id.
+        :param experience_id: Id опыта работы (например, 'between1And3') или список id.
+        :param salary_from: Минимальная зарплата (руб. на руки, см. normalize_salary).
+        :param salary_to: Максимальная зарплата (руб. на руки).
+        :param limit: Максимальное количество результатов.
+        :return: Список id вакансий, упорядоченный по id по убыванию (новые вакансии hh.ru - первыми);
+                 порядок не зависит от порядка добавления вакансий и от optimize.
+        '''
+        self.flush()
+        docnos = set(self.attributes) if query is None else self.evaluate(self.parse_query(query))
+        areas = {area_id} if isinstance(area_id, str) else set(area_id) if area_id else None
+        experiences = {experience_id} if isinstance(experience_id, str) else \
+            set(experience_id) if experience_id else None
 
-                            # Обработка данных с текущей страницы
-                            #for v in jsObj['items']:
-                            #    executor.submit(self.process_vacancy, v)
+        result = []
+        for docno in docnos:
+            vacancy_id, area, experience, salary = self.attributes[docno]
+            if areas is not None and area not in areas:
+                continue
+            if experiences is not None and experience not in experiences:
+                continue
+            if salary_from is not None and (salary is None or salary < salary_from):
+                continue
+            if salary_to is not None and (salary is None or salary > salary_to):
+                continue
+            result.append(vacancy_id)
+        # Числовые id сравниваются как числа: сначала по длине, затем посимвольно
+        result.sort(key=lambda vacancy_id: (len(vacancy_id), vacancy_id), reverse=True)
+        return result if limit is None else result[:limit]
 
-                            page += 1
+    def __contains__(self, vacancy_id):
+        return str(vacancy_id) in self.ids
 
-                            time.sleep(0.3)
+    def __len__(self):
+        return len(self.ids)
 
-                        # Логируем завершение обработки вакансий для данной профессии и региона
-                        logging.info(f'Данных для профессии {p_r} и региона {reg} больше нет')
-                        print(f'Данных для профессии {p_r} и региона {reg} больше нет')
-        except KeyError as e:
-            # Логируем ошибку, если ключ 'items' отсутствует в JSON данных
-            logging.error(f"KeyError: 'items' не найден в данных JSON: {str(e)}")
+#Инкрементальная выгрузка таблицы вакансий с разбиением по дате публикации
+class IncrementalExporter:
+    '''
+    Инкрементальная выгрузка вакансий с семантикой upsert. Таблица разбита на части по дате публикации:
+    {output_folder}/published_date=YYYY-MM-DD/vacancies.csv (или .parquet). Состояние выгрузки хранится в SQLite
+    (export_state.sqlite в папке выгрузки): для каждой вакансии - признак версии исходной записи (mtime и размер
+    файла или положение записи в хранилище сегментов), хеш содержимого, часть таблицы и признак архивности.
+    При очередной выгрузке разбираются только изменившиеся записи, а перезаписываются только части таблицы,
+    в которых есть изменения. Вакансии, ставшие архивными или удаленные из исходных данных, не перезаписываются,
+    а помечаются в таблице (is_archived = True).
+    '''
+    FORMATS = ('csv', 'parquet')
 
-    def fetch_vacancy_details(self):
-        '''
-        Метод для получения детальной информации о вакансиях.
+    def __init__(self, output_folder, format='csv', state_path=None):
+        if format not in self.FORMATS:
+            raise ValueError(f"Неизвестный формат {format}, допустимые значения: {', '.join(self.FORMATS)}")
+        if format != 'csv' and pa is None:
+            raise ImportError(f"Для формата {format} необходим пакет pyarrow (pip install pyarrow)")
+        self.output_folder = output_folder
+        self.format = format
+        os.makedirs(output_folder, exist_ok=True)
+        self.connection = sqlite3.connect(state_path or os.path.join(output_folder, 'export_state.sqlite'))
+        self.connection.execute('''
+            CREATE TABLE IF NOT EXISTS exported (
+                id TEXT PRIMARY KEY,
+                source TEXT,
+                content_hash TEXT,
+                partition TEXT,
+                archived INTEGER
+            )''')
+        self.connection.commit()
+        # Состояние загружается в память одним запросом: id -> [source, content_hash, partition, archived]
+        self.state = {row[0]: list(row[1:]) for row in self.connection.execute('SELECT * FROM exported')}
 
-        Метод проходит по списку файлов со списком вакансий в папке "pagination"
-        и для каждой вакансии в каждом файле выполняет запрос к API для получения
-        детальной информации о вакансии. Полученные данные записываются в отдельные JSON-файлы
-        в папке "vacancies".
+    def partition_path(self, partition):
+        """
+        Путь к файлу части таблицы для даты публикации partition.
+        """
+        return os.path.join(self.output_folder, f'published_date={partition}', f'vacancies.{self.format}')
 
+    def scan(self, input_folder):
         '''
-        for fl in os.listdir('./docs/pagination'):
+        Генератор исходных записей, изменившихся с прошлой выгрузки: (id, признак версии, функция чтения JSON).
+        Для папки с файлами признак версии - время изменения и размер файла, для хранилища сегментов -
+        положение записи (при перезаписи вакансии оно меняется). Все найденные id добавляются в self.seen.
+        '''
+        self.seen = set()
+        if RawSegmentStore.is_store(input_folder):
+            store = RawSegmentStore(input_folder)
             try:
-                # Открываем файл, читаем его содержимое и автоматически закрываем файл после использования
-                with open('./docs/pagination/{}'.format(fl), encoding='utf8') as f:
-                    jsonText = f.read()
+                # Читаем изменившиеся записи по порядку расположения, распаковывая каждый блок один раз
+                cache = {}
+                changed = []
+                for record_id, (segment, offset, length, line) in store.locations.items():
+                    self.seen.add(record_id)
+                    source = f'{segment}:{offset}:{line}'
+                    entry = self.state.get(record_id)
+                    if entry is None or entry[0] != source:
+                        changed.append((segment, offset, length, line, record_id, source))
+                for segment, offset, length, line, record_id, source in sorted(changed):
+                    if (segment, offset) not in cache:
+                        cache.clear()
+                        cache[(segment, offset)] = store.read_block(segment, offset, length)
+                    lines = cache[(segment, offset)]
+                    yield record_id, source, lambda lines=lines, line=line: lines[line]
+            finally:
+                store.close()
+            return
 
-                # Преобразуем полученный текст в объект справочника
-                jsonObj = json.loads(jsonText)
+        with os.scandir(input_folder) as entries:
+            for entry in entries:
+                if not entry.name.endswith('.json'):
+                    continue
+                record_id = entry.name[:-5]
+                self.seen.add(record_id)
+                stat = entry.stat()
+                source = f'{stat.st_mtime_ns}:{stat.st_size}'
+                state = self.state.get(record_id)
+                if state is None or state[0] != source:
+                    yield record_id, source, lambda path=entry.path: self.read_file(path)
 
-                # Получаем и проходимся по непосредственно списку вакансий
-                for v in jsonObj['items']:
-                    # Обращаемся к API и получаем детальную информацию по конкретной вакансии
-                    try:
-                        req = requests.get(v['url'])
+    @staticmethod
+    def read_file(path):
+        with open(path, 'rb') as f:
+            return f.read()
 
-                        # Проверяем статус код ответа
-                        if req.status_code == 200:
-                            # Обработка успешного ответа
-                            data = req.content.decode()
+    def export(self, input_folder, parser=None, workers=None):
+        '''
+        Выгружает изменения папки (или хранилища сегментов) input_folder с прошлой выгрузки.
 
-                            # Создаем файл в формате JSON с идентификатором вакансии в качестве названия
-                            # Записываем в него ответ запроса и закрываем файл
-                            fileName = './docs/vacancies/{}.json'.format(v['id'])
-                            with open(fileName, mode='w', encoding='utf8') as f:
-                                f.write(data)
+        :param parser: HHDataParser для разбора записей (по умолчанию создается новый).
+        :param workers: Количество процессов для очистки описаний (см. HHDataParser.clean_texts).
+        :return: Словарь со статистикой: изменившиеся записи, добавленные/обновленные строки,
+                 помеченные архивными и перезаписанные части таблицы.
+        '''
+        parser = parser or HHDataParser()
+        upserts = {}
+        deletes = {}
+        archive_marks = {}
+        updates = []
+        stats = {'changed': 0, 'unchanged': 0, 'upserted': 0, 'archived': 0, 'partitions': 0}
 
-                            # Необязательная задержка, чтобы не нагружать сервисы HH, оставим 1 секунду
-                            time.sleep(0.4)
+        for record_id, source, read in self.scan(input_folder):
+            content = read()
+            content_hash = hashlib.sha1(content).hexdigest()
+            state = self.state.get(record_id)
+            if state is not None and state[1] == content_hash:
+                # Файл перезаписан без изменений: запоминаем новую версию без разбора
+                updates.append((record_id, source, content_hash, state[2], state[3]))
+                stats['unchanged'] += 1
+                continue
 
-                            logging.info(f'Вакансия {v["id"]} успешно обработана')
+            record = parser.parse_raw(content.decode('utf-8-sig'), record_id, clean=False)
+            if record is None:
+                continue
+            stats['changed'] += 1
+            partition = (record['published_at'] or '')[:10] or 'unknown'
+            archived = bool(record['is_archived'])
 
-                        else:
-                            # Обработка других статус кодов, например, 404, 401, и т.д.
-                            if req.status_code == 429:
-                                # Ошибка, связанная с капчей
-                                captcha_url = req.json().get('captcha_url')
-                                logging.warning(
-                                    f'Ошибка 429 (капча) при обработке вакансии {v["id"]}. URL капчи: {captcha_url}')
-                                # Далее можно перейти на страницу с капчей и решить её вручную
-                            else:
-                                # Другие обработки ошибок
-                                logging.error(f'Ошибка {req.status_code} при обработке вакансии {v["id"]}: {req.text}')
-
-                    except Exception as e:
-                        logging.error(f'Ошибка при запросе к вакансии {v["id"]}: {str(e)}')
+            if archived and state is not None and state[2] == partition:
+                # Вакансия ушла в архив: только помечаем уже выгруженную строку
+                if not state[3]:
+                    archive_marks.setdefault(partition, set()).add(record_id)
+                updates.append((record_id, source, content_hash, partition, 1))
+                continue
 
-            except Exception as e:
-                logging.error(f'Ошибка при обработке файла {fl}: {str(e)}')
+            if state is not None and state[2] != partition:
+                # Дата публикации изменилась: строка переносится в другую часть таблицы
+                deletes.setdefault(state[2], set()).add(record_id)
+            upserts.setdefault(partition, []).append(record)
+            updates.append((record_id, source, content_hash, partition, int(archived)))
 
-        logging.info('Вакансии собраны')
+        # Вакансии, которых больше нет в исходных данных, помечаются архивными
+        # (хеш сбрасывается, чтобы вернувшаяся запись была разобрана заново)
+        for record_id, state in self.state.items():
+            if record_id not in self.seen and not state[3]:
+                archive_marks.setdefault(state[2], set()).add(record_id)
+                updates.append((record_id, state[0], None, state[2], 1))
 
-    def process_pagination_files(self):
-        '''
-        Метод для обработки файлов с данными пагинации.
+        records = [record for partition_records in upserts.values() for record in partition_records]
+        if parser.aggregates is not None:
+            # Агрегаты обновляются только по изменившимся вакансиям
+            parser.aggregates.add_many(records)
+            parser.aggregates.flush()
+        descriptions = parser.clean_texts([record['description'] for record in records], workers=workers)
+        for record, description in zip(records, descriptions):
+            record['description'] = description
+        if parser.search_index is not None:
+            parser.search_index.add_many(records)
+            parser.search_index.flush()
 
-        Метод перебирает файлы, содержащие данные пагинации, и обрабатывает вакансии, сохраненные в этих файлах.
-        Для каждого файла выполняется чтение данных, декодирование JSON и последующая обработка вакансий с использованием
-        пула потоков. Метод также логирует возможные ошибки при обработке файлов и завершение процесса.
+        for partition in set(upserts) | set(deletes) | set(archive_marks):
+            self.write_partition(partition, upserts.get(partition, []), deletes.get(partition, set()),
+                                 archive_marks.get(partition, set()))
+            stats['partitions'] += 1
+        stats['upserted'] = len(records)
+        stats['archived'] = sum(len(ids) for ids in archive_marks.values())
 
-        '''
-        for fl in os.listdir('./docs/pagination'):
-            try:
-                # Открываем файл, читаем его содержимое и автоматически закрываем файл после использования
-                with open(f'./docs/pagination/{fl}', encoding='utf8') as f:
-                    jsonText = f.read()
+        # Состояние сохраняется после записи частей таблицы: при сбое изменения будут выгружены повторно
+        self.connection.executemany('INSERT OR REPLACE INTO exported VALUES (?, ?, ?, ?, ?)', updates)
+        self.connection.commit()
+        for record_id, *state in updates:
+            self.state[record_id] = state
 
-                # Преобразуем полученный текст в объект справочника
-                jsonObj = json.loads(jsonText)
+        logging.info(f'Инкрементальная выгрузка в {self.output_folder}: {stats}')
+        return stats
 
-                # Создаем пул потоков с ThreadPoolExecutor
-                with ThreadPoolExecutor(max_workers=1) as executor:
-                    for v in jsonObj['items']:
-                        # Добавляем задачи на обработку вакансий в пул потоков
-                        executor.submit(self.process_vacancy, v)
+    def write_partition(self, partition, records, deletes=(), archive_marks=()):
+        '''
+        Обновляет одну часть таблицы: удаляет строки deletes, заменяет или добавляет строки records
+        (по id) и помечает строки archive_marks архивными. Файл части заменяется атомарно.
+        '''
+        path = self.partition_path(partition)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        drop = set(deletes) | {str(record['id']) for record in records}
 
-            except json.JSONDecodeError as e:
-                # Логируем ошибку декодирования JSON
-                logging.error(f"JSON ошибка декодирования для файла {fl}: {str(e)}")
-            except KeyError:
-                # Логируем ошибку KeyError, если ключ 'items' отсутствует в JSON данных
-                logging.error(f"KeyError: 'items' не найден в данных JSON для файла {fl}")
-                continue
+        if self.format == 'csv':
+            frames = []
+            if os.path.exists(path):
+                existing = pd.read_csv(path, sep='|', dtype=str, keep_default_na=False)
+                frames.append(existing[~existing['id'].isin(drop)])
+            if records:
+                # Новые строки проходят через то же текстовое представление, что и уже записанные
+                buffer = io.StringIO()
+                pd.DataFrame(VacancyRecord.columns(records)).to_csv(buffer, index=False, sep='|')
+                buffer.seek(0)
+                frames.append(pd.read_csv(buffer, sep='|', dtype=str, keep_default_na=False))
+            df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+            if archive_marks and len(df):
+                df.loc[df['id'].isin([str(record_id) for record_id in archive_marks]), 'is_archived'] = 'True'
+            df.to_csv(tmp_path, index=False, encoding='utf-8', sep='|')
+        else:
+            tables = []
+            if records:
+                writer = VacancyTableWriter(tmp_path, 'parquet')
+                tables.append(writer.to_arrow(VacancyRecord.columns(records)))
+            if os.path.exists(path):
+                existing = pq.read_table(path)
+                keep = pc.invert(pc.is_in(existing['id'], value_set=pa.array(sorted(drop), pa.string())))
+                existing = existing.filter(keep)
+                # После чтения из Parquet у списков и временных меток другие имена и единицы: приводим к схеме записи
+                tables.insert(0, existing.cast(tables[0].schema) if tables else existing)
+            if not tables:
+                return
+            table = pa.concat_tables(tables)
+            if archive_marks:
+                marked = pc.is_in(table['id'], value_set=pa.array([str(i) for i in archive_marks], pa.string()))
+                column = table.schema.get_field_index('is_archived')
+                table = table.set_column(column, 'is_archived', pc.if_else(marked, True, table['is_archived']))
+            pq.write_table(table, tmp_path, compression='zstd')
+        os.replace(tmp_path, path)
 
-        # Логируем успешное завершение обработки файлов пагинации
-        logging.info('Вакансии собраны')
+    def close(self):
+        """
+        Закрывает базу состояния выгрузки.
+        """
+        self.connection.close()
 
 class HHDataParser:
     '''
-    Преобразование данных, полученных с сайта hh.ru в более удобный формат (CSV)
+    Преобразование данных, полученных с сайта hh.ru в более удобный формат (CSV, Parquet или Arrow IPC)
     '''
-    def __init__(self):
+    def __init__(self, metrics=None, aggregates=None, search_index=None, field_spec=None):
         # Настройки логирования
         logging.basicConfig(filename='parser_hh.log', level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+        # Метрики разбора: время разбора записи и количество записей (см. CrawlMetrics)
+        self.metrics = metrics or CrawlMetrics()
+        # Агрегаты для аналитики, обновляемые при разборе (см. VacancyAggregates); None - не вести
+        self.aggregates = aggregates
+        # Поисковый индекс, обновляемый при разборе (см. VacancySearchIndex); None - не вести
+        self.search_index = search_index
+
+        # Описание столбцов: FIELD_SPEC, в котором столбцы из field_spec заменены или добавлены в конец
+        self.field_spec = field_spec
+        self.specs = {spec.column: spec for spec in self.FIELD_SPEC}
+        self.specs.update((spec.column, spec) for spec in field_spec or ())
+        extra = tuple(column for column in self.specs if column not in VacancyRecord.FIELDS)
+        # Для дополнительных столбцов создается подкласс VacancyRecord с дополнительными слотами
+        self.record_class = VacancyRecord if not extra else type(
+            'VacancyRecord', (VacancyRecord,), {'__slots__': extra, 'FIELDS': VacancyRecord.FIELDS + extra})
+        # Описание столбцов режима "только выдача": столбцы таблицы и столбцы элемента выдачи (LISTING_SPEC)
+        self.listing_specs = dict(self.specs)
+        self.listing_specs.update((spec.column, spec) for spec in self.LISTING_SPEC)
+        extra = tuple(column for column in self.listing_specs if column not in self.record_class.FIELDS)
+        self.listing_record_class = self.record_class if not extra else type(
+            'VacancyRecord', (self.record_class,), {'__slots__': extra, 'FIELDS': self.record_class.FIELDS + extra})
+        # Скомпилированные функции извлечения: (столбцы, очистка описания) -> функция
+        self.extractors = {}
+
+    # Столбцы таблицы вакансий и пути к их значениям в JSON вакансии (/vacancies/{id});
+    # при отсутствии ключа столбец получает значение по умолчанию, и только без id запись не разбирается
+    FIELD_SPEC = (
+        FieldSpec('id', required=True),
+        FieldSpec('is_premium', 'premium'),
+        FieldSpec('billing_type_id', 'billing_type.id'),
+        FieldSpec('billing_type_name', 'billing_type.name'),
+        FieldSpec('relations'),
+        FieldSpec('name'),
+        FieldSpec('insider_interview'),
+        FieldSpec('is_response_letter_required', 'response_letter_required'),
+        FieldSpec('area_id', 'area.id'),
+        FieldSpec('area_name', 'area.name'),
+        FieldSpec('area_url', 'area.url'),
+        FieldSpec('salary'),
+        FieldSpec('type_id', 'type.id'),
+        FieldSpec('type_name', 'type.name'),
+        FieldSpec('address'),
+        FieldSpec('allow_messages'),
+        FieldSpec('experience_id', 'experience.id'),
+        FieldSpec('experience_name', 'experience.name'),
+        FieldSpec('schedule_id', 'schedule.id'),
+        FieldSpec('schedule_name', 'schedule.name'),
+        FieldSpec('employment_id', 'employment.id'),
+        FieldSpec('employment_name', 'employment.name'),
+        FieldSpec('department'),
+        FieldSpec('contacts'),
+        FieldSpec('description', transform='clean_text'),
+        FieldSpec('key_skills', each='name'),
+        FieldSpec('is_accept_handicapped', 'accept_handicapped'),
+        FieldSpec('is_accept_kids', 'accept_kids'),
+        FieldSpec('is_archived', 'archived'),
+        FieldSpec('response_url'),
+        FieldSpec('specializations', each='name'),
+        FieldSpec('professional_roles', each='name'),
+        FieldSpec('code'),
+        FieldSpec('is_hidden', 'hidden'),
+        FieldSpec('is_quick_responses_allowed', 'quick_responses_allowed'),
+        FieldSpec('driver_license_types'),
+        FieldSpec('is_accept_incomplete_resumes', 'accept_incomplete_resumes'),
+        FieldSpec('employer_id', 'employer.id'),
+        FieldSpec('employer_name', 'employer.name'),
+        FieldSpec('employer_url', 'employer.url'),
+        FieldSpec('employer_alternate_url', 'employer.alternate_url'),
+        FieldSpec('employer_logo_original', 'employer.logo_urls.original'),
+        FieldSpec('employer_logo_240', 'employer.logo_urls.240'),
+        FieldSpec('employer_logo_90', 'employer.logo_urls.90'),
+        FieldSpec('vacancies_url', 'employer.vacancies_url'),
+        FieldSpec('is_accredited_it_employer', 'employer.accredited_it_employer'),
+        FieldSpec('is_trusted_employer', 'employer.trusted'),
+        FieldSpec('published_at'),
+        FieldSpec('created_at'),
+        FieldSpec('initial_created_at'),
+        FieldSpec('negotiations_url'),
+        FieldSpec('suitable_resumes_url'),
+        FieldSpec('apply_alternate_url'),
+        FieldSpec('has_test'),
+        FieldSpec('test'),
+        FieldSpec('alternate_url'),
+        FieldSpec('working_days'),
+        FieldSpec('working_time_intervals'),
+        FieldSpec('working_time_modes'),
+        FieldSpec('is_accept_temporary', 'accept_temporary'),
+        FieldSpec('languages'),
+    )
+
+    # Столбцы режима "только выдача", которые заполняются из страниц поиска без загрузки вакансий
+    LISTING_FIELDS = (
+        'id', 'is_premium', 'name', 'area_id', 'area_name', 'salary', 'type_id', 'type_name', 'address',
+        'experience_id', 'experience_name', 'schedule_id', 'schedule_name', 'employment_id', 'employment_name',
+        'is_archived', 'professional_roles', 'employer_id', 'employer_name', 'is_accredited_it_employer',
+        'is_trusted_employer', 'published_at', 'created_at', 'alternate_url', 'snippet_requirement',
+        'snippet_responsibility',
+    )
+    # Столбцы элемента выдачи поиска, которых нет в данных вакансии (/vacancies/{id})
+    LISTING_SPEC = (
+        FieldSpec('snippet_requirement', 'snippet.requirement'),
+        FieldSpec('snippet_responsibility', 'snippet.responsibility'),
+    )
+    # Столбцы, которых нет в выдаче поиска: для них нужны детальные данные вакансии
+    DETAIL_FIELDS = ('description', 'key_skills')
+
+    # Шаблоны очистки текста: HTML-теги и все символы, кроме букв, цифр, пробелов и запятых
+    HTML_TAG_RE = re.compile('<.*?>')
+    NON_TEXT_RE = re.compile(r'[^\w\s,^a-zA-Zа-яА-Я]')
+    # Минимальный размер столбца для очистки в пуле процессов: на меньших столбцах запуск пула
+    # и передача текстов между процессами дороже самой очистки
+    MIN_POOL_TEXTS = 20000
 
     def clean_text(self, text):
         '''
         Метод принимает текст и удаляет из него нежелательные символы, оставляя только буквы, цифры, пробелы и
          запятые. Он используется для очистки текста, полученного из JSON-файлов.
+         HTML-сущности (например, &quot;) декодируются до удаления символов.
         '''
         # Удалить все символы, кроме букв, цифр, пробелов и запятых
-        clean_text = re.sub('<.*?>', '', text)
-        clean_text = re.sub(r'[^\w\s,^a-zA-Zа-яА-Я]', ' ', clean_text)
+        clean_text = self.HTML_TAG_RE.sub('', text)
+        if '&' in clean_text:
+            clean_text = html.unescape(clean_text)
+        clean_text = self.NON_TEXT_RE.sub(' ', clean_text)
         return clean_text
 
+    def clean_texts(self, texts, workers=None, chunk_size=2000):
+        '''
+        Очистка столбца текстов (например, всех описаний вакансий пачки) тем же способом, что и clean_text.
+        Значения None остаются None. В одном процессе скорость та же, что у очистки по одному тексту
+        (плюс декодирование HTML-сущностей): склейка столбца в одну строку не быстрее, потому что
+        основное время занимает замена символов шаблоном NON_TEXT_RE.
+        Если задан workers и в столбце не меньше MIN_POOL_TEXTS текстов, столбец делится на части
+        по chunk_size текстов, которые очищаются в пуле из workers процессов.
+        '''
+        if workers and workers > 1 and len(texts) >= max(self.MIN_POOL_TEXTS, 2 * chunk_size):
+            chunks = [texts[i:i + chunk_size] for i in range(0, len(texts), chunk_size)]
+            # В пул передается функция модуля: экземпляр парсера (метрики с threading.Lock) не сериализуется pickle
+            with ProcessPoolExecutor(max_workers=workers, initializer=init_worker_logging,
+                                     initargs=(worker_log_file(),)) as executor:
+                return [text for chunk in executor.map(clean_texts_chunk, chunks) for text in chunk]
+
+        return self.clean_column(texts)
+
+    @classmethod
+    def clean_column(cls, texts):
+        '''
+        Очищает список текстов в текущем процессе так же, как clean_text. Не использует состояние экземпляра,
+        поэтому вызывается и в процессах пула (см. clean_texts_chunk).
+        '''
+        tag_sub, non_text_sub, unescape = cls.HTML_TAG_RE.sub, cls.NON_TEXT_RE.sub, html.unescape
+        cleaned = []
+        for text in texts:
+            if text is not None:
+                text = tag_sub('', text)
+                if '&' in text:
+                    text = unescape(text)
+                text = non_text_sub(' ', text)
+            cleaned.append(text)
+        return cleaned
+
     def extract_nested_value(self, data, keys):
         '''
         Метод принимает словарь data и список keys, который представляет путь к значению во вложенных словарях.
@@ -489,106 +4994,504 @@ class HHDataParser:
         except (KeyError, TypeError):
             return None
 
-    def parse_json_files(self, input_folder, output_csv):
+    @property
+    def columns(self):
+        """
+        Все столбцы таблицы вакансий в порядке вывода.
+        """
+        return self.record_class.FIELDS
+
+    def compile_extractor(self, fields=None, clean=True, listing=False):
         '''
-        Метод выполняет парсинг JSON-файлов, находящихся в указанной папке input_folder. Он извлекает и фильтрует
-        данные из JSON-файлов, а затем сохраняет их в CSV-файл с именем output_csv. Если нет данных для записи,
-        он записывает предупреждение в лог.
+        Компилирует описание столбцов (FIELD_SPEC) в функцию извлечения data -> запись VacancyRecord.
+        Для каждого выбранного столбца генерируется прямое обращение по пути без промежуточного словаря;
+        отсутствие ключа обрабатывается отдельно для каждого столбца: столбец получает значение по умолчанию,
+        а в метрике parse_missing_fields_total{field} учитывается пропуск. Невыбранные столбцы равны None.
+        Функции кэшируются, поэтому компиляция выполняется один раз для набора столбцов.
+
+        :param fields: Список столбцов (по умолчанию - все).
+        :param clean: Если False, преобразование clean_text (очистка описания) не применяется.
+        :param listing: Если True, функция извлекает запись из элемента выдачи поиска: доступны также
+                        столбцы LISTING_SPEC, а по умолчанию извлекаются столбцы LISTING_FIELDS.
+        '''
+        key = (tuple(fields) if fields else None, clean, listing)
+        extractor = self.extractors.get(key)
+        if extractor is not None:
+            return extractor
+
+        specs = self.listing_specs if listing else self.specs
+        record_class = self.listing_record_class if listing else self.record_class
+        selected = list(fields or (self.LISTING_FIELDS if listing else self.columns))
+        unknown = [column for column in selected if column not in specs]
+        if unknown:
+            raise ValueError(f"Неизвестные столбцы {unknown}, допустимые значения: {', '.join(specs)}")
+
+        metrics = self.metrics
+        namespace = {
+            'Record': record_class, 'new': record_class.__new__, 'intern': sys.intern,
+            'LOOKUP_ERRORS': (KeyError, TypeError, IndexError),
+            'missing': lambda column: metrics.inc('parse_missing_fields_total', field=column),
+        }
+        lines = ['def extract(data):', '    record = new(Record)']
+        for i, column in enumerate(selected):
+            spec = specs[column]
+            access = 'data' + ''.join(f'[{key!r}]' for key in spec.path.split('.'))
+            lines += ['    try:', f'        value = {access}']
+            if spec.each is not None:
+                lines.append(f'        value = [item[{spec.each!r}] for item in value]')
+            lines.append('    except LOOKUP_ERRORS:')
+            if spec.required:
+                lines.append('        raise')
+            else:
+                namespace[f'default_{i}'] = spec.default
+                lines += [f'        value = default_{i}', f'        missing({column!r})']
+
+            converters = []
+            if spec.type is not None:
+                namespace[f'type_{i}'] = spec.type
+                converters.append(f'value = type_{i}(value)')
+            transform = spec.transform
+            if isinstance(transform, str):
+                transform = None if transform == 'clean_text' and not clean else getattr(self, transform)
+            if transform is not None:
+                namespace[f'transform_{i}'] = transform
+                converters.append(f'value = transform_{i}(value)')
+            if column in VacancyRecord.INTERNED_FIELDS:
+                converters.append('if value.__class__ is str: value = intern(value)')
+            elif column in VacancyRecord.INTERNED_LIST_FIELDS:
+                converters.append('value = [intern(item) if item.__class__ is str else item for item in value]')
+            if converters:
+                lines.append('    if value is not None:')
+                lines += [f'        {line}' for line in converters]
+            lines.append(f'    record.{column} = value')
+        lines += [f'    record.{column} = None' for column in record_class.FIELDS if column not in selected]
+        lines.append('    return record')
+
+        exec(compile('\n'.join(lines), f'<extractor {len(selected)} fields>', 'exec'), namespace)
+        extractor = self.extractors[key] = namespace['extract']
+        return extractor
+
+    def extract_record(self, data, clean=True, fields=None):
+        '''
+        Метод извлекает и фильтрует нужные поля из JSON-данных одной вакансии по описанию столбцов FIELD_SPEC.
+        Возвращает запись VacancyRecord с данными вакансии (поля соответствуют столбцам выходного файла;
+        запись поддерживает доступ по ключу, как словарь, а to_dict возвращает обычный словарь).
+        Если clean=False, описание возвращается без очистки (для последующей пакетной очистки clean_texts).
+
+        :param fields: Список извлекаемых столбцов (по умолчанию - все); остальные столбцы записи равны None.
+        '''
+        return self.compile_extractor(fields, clean)(data)
+
+    def output_fields(self, fields=None):
+        '''
+        Столбцы, которые нужно извлечь для вывода столбцов fields: fields и столбцы, нужные агрегатам
+        и поисковому индексу (если они ведутся). None - все столбцы.
+        '''
+        if not fields:
+            return None
+        fields = list(fields)
+        for index in (self.aggregates, self.search_index):
+            if index is not None:
+                fields += [field for field in index.RECORD_FIELDS if field not in fields]
+        return fields
+
+    def parse_file(self, file_path, clean=True, fields=None):
+        '''
+        Метод читает JSON-файл вакансии и возвращает словарь с отфильтрованными данными
+        или None, если файл пуст или не удалось его разобрать (ошибка записывается в лог).
+        '''
+        # Считываем файл в байтах: json_loads разбирает UTF-8 (в том числе с BOM) без промежуточной строки
+        try:
+            with open(file_path, 'rb') as file:
+                text = file.read()
+        except Exception as e:
+            logging.error(f"Ошибка при парсинге и записи данных из файла {os.path.basename(file_path)}: {str(e)}")
+            return None
+        return self.parse_raw(text, os.path.basename(file_path), clean=clean, fields=fields)
+
+    def parse_raw(self, text, name='', clean=True, fields=None):
+        '''
+        Метод разбирает сырой JSON вакансии (например, запись хранилища сегментов) и возвращает словарь
+        с отфильтрованными данными или None, если данные пусты или их не удалось разобрать.
+
+        :param name: Имя файла или id записи для сообщений в логе.
+        :param fields: Список извлекаемых столбцов (см. extract_record).
+        '''
+        started = time.perf_counter()
+        try:
+            data = json_loads(text)
+            # Проверяем, что данные не пусты
+            if data:
+                record = self.extract_record(data, clean=clean, fields=fields)
+                self.metrics.observe('parse_record_seconds', time.perf_counter() - started,
+                                     buckets=CrawlMetrics.PARSE_BUCKETS)
+                self.metrics.inc('parsed_records_total')
+                return record
+        except Exception as e:
+            logging.error(f"Ошибка при парсинге и записи данных из файла {name}: {str(e)}")
+            self.metrics.inc('parse_errors_total')
+        return None
+
+    def iter_records(self, input_folder, clean=True, fields=None, select=None):
+        '''
+        Генератор разобранных записей из папки с JSON-файлами или из хранилища сегментов (RawSegmentStore).
+
+        :param fields: Список извлекаемых столбцов (см. extract_record).
+        :param select: Фильтры выборки RawCorpusReader.select (например, {'employer_id': '1455'}):
+                       читаются и разбираются только выбранные вакансии.
         '''
-        # Создаем список для хранения словарей данных
-        data_list = []
+        if select is not None:
+            with RawCorpusReader(input_folder) as reader:
+                for record_id, text in reader.iter_raw(**select):
+                    record = self.parse_raw(text, record_id, clean=clean, fields=fields)
+                    if record is not None:
+                        yield record
+            return
+
+        if RawSegmentStore.is_store(input_folder):
+            store = RawSegmentStore(input_folder)
+            try:
+                for record_id, text in store.iter_records():
+                    record = self.parse_raw(text, record_id, clean=clean, fields=fields)
+                    if record is not None:
+                        yield record
+            finally:
+                store.close()
+            return
 
         # Проходимся по всем файлам JSON в указанной папке
         for filename in os.listdir(input_folder):
             if filename.endswith('.json'):
-                file_path = os.path.join(input_folder, filename)
+                record = self.parse_file(os.path.join(input_folder, filename), clean=clean, fields=fields)
+                if record is not None:
+                    yield record
 
-                # Открываем файл и считываем его содержимое с использованием кодировки 'utf-8-sig'
-                try:
-                    with open(file_path, 'r', encoding='utf-8-sig') as file:
-                        data = json.load(file)
-                        # Проверяем, что данные не пусты
-                        if data:
-                            # Фильтруем и выбираем нужные поля
-                            filtered_data = {
-                                'id': data['id'],
-                                'is_premium': data['premium'],
-                                'billing_type_id': self.extract_nested_value(data, ['billing_type', 'id']),
-                                'billing_type_name': self.extract_nested_value(data, ['billing_type', 'name']),
-                                'relations': data['relations'],
-                                'name': data['name'],
-                                'insider_interview': data['insider_interview'],
-                                'is_response_letter_required': data['response_letter_required'],
-                                'area_id': self.extract_nested_value(data, ['area', 'id']),
-                                'area_name': self.extract_nested_value(data, ['area', 'name']),
-                                'area_url': self.extract_nested_value(data, ['area', 'url']),
-                                'salary': data['salary'],
-                                'type_id': data['type']['id'],
-                                'type_name': data['type']['name'],
-                                'address': data['address'],
-                                'allow_messages': data['allow_messages'],
-                                'experience_id': self.extract_nested_value(data, ['experience', 'id']),
-                                'experience_name': self.extract_nested_value(data, ['experience', 'name']),
-                                'schedule_id': self.extract_nested_value(data, ['schedule', 'id']),
-                                'schedule_name': self.extract_nested_value(data, ['schedule', 'name']),
-                                'employment_id': self.extract_nested_value(data, ['employment', 'id']),
-                                'employment_name': self.extract_nested_value(data, ['employment', 'name']),
-                                'department': data['department'],
-                                'contacts': data['contacts'],
-                                'description': self.clean_text(data['description']),
-                                'key_skills': [skill['name'] for skill in data['key_skills']],
-                                'is_accept_handicapped': data['accept_handicapped'],
-                                'is_accept_kids': data['accept_kids'],
-                                'is_archived': data['archived'],
-                                'response_url': data['response_url'],
-                                'specializations': [spec['name'] for spec in data['specializations']],
-                                'professional_roles': [role['name'] for role in data['professional_roles']],
-                                'code': data['code'],
-                                'is_hidden': data['hidden'],
-                                'is_quick_responses_allowed': data['quick_responses_allowed'],
-                                'driver_license_types': data['driver_license_types'],
-                                'is_accept_incomplete_resumes': data['accept_incomplete_resumes'],
-                                'employer_id': data['employer']['id'],
-                                'employer_name': data['employer']['name'],
-                                'employer_url': data['employer']['url'],
-                                'employer_alternate_url': data['employer']['alternate_url'],
-                                'employer_logo_original': data['employer']['logo_urls']['original'],
-                                'employer_logo_240': data['employer']['logo_urls']['240'],
-                                'employer_logo_90': data['employer']['logo_urls']['90'],
-                                'vacancies_url': data['employer']['vacancies_url'],
-                                'is_accredited_it_employer': data['employer']['accredited_it_employer'],
-                                'is_trusted_employer': data['employer']['trusted'],
-                                'published_at': data['published_at'],
-                                'created_at': data['created_at'],
-                                'initial_created_at': data['initial_created_at'],
-                                'negotiations_url': data['negotiations_url'],
-                                'suitable_resumes_url': data['suitable_resumes_url'],
-                                'apply_alternate_url': data['apply_alternate_url'],
-                                'has_test': data['has_test'],
-                                'test': data['test'],
-                                'alternate_url': data['alternate_url'],
-                                'working_days': data['working_days'],
-                                'working_time_intervals': data['working_time_intervals'],
-                                'working_time_modes': data['working_time_modes'],
-                                'is_accept_temporary': data['accept_temporary'],
-                                'languages': data['languages']
-                            }
-                            data_list.append(filtered_data)
+    def parse_json_files(self, input_folder, output_csv, streaming=False, workers=None, batch_size=5000,
+                         format='csv', fields=None, select=None):
+        '''
+        Метод выполняет парсинг JSON-файлов, находящихся в указанной папке input_folder. Он извлекает и фильтрует
+        данные из JSON-файлов, а затем сохраняет их в CSV-файл с именем output_csv. Если нет данных для записи,
+        он записывает предупреждение в лог. Вместо папки с файлами можно указать папку хранилища сегментов
+        (RawSegmentStore) - тогда записи читаются последовательно из сжатых сегментов.
 
-                except Exception as e:
-                    logging.error(f"Ошибка при парсинге и записи данных из файла {filename}: {str(e)}")
+        :param streaming: Если True, файлы разбираются пулом процессов пачками по batch_size файлов,
+                          и каждая пачка сразу дописывается в выходной файл (см. parse_json_files_streaming).
+        :param workers: Количество процессов для разбора файлов в потоковом режиме (по умолчанию - количество ядер)
+                        и для очистки описаний в обычном режиме (по умолчанию - без пула процессов).
+        :param batch_size: Количество файлов в одной пачке потокового режима.
+        :param format: Формат выходного файла: 'csv', 'parquet' или 'arrow' (см. VacancyTableWriter).
+        :param fields: Список выводимых столбцов (по умолчанию - все): извлекаются только они
+                       и столбцы, нужные агрегатам и поисковому индексу.
+        :param select: Фильтры выборки вакансий по индексу метаданных (см. RawCorpusReader.select),
+                       например {'employer_id': '1455', 'date_from': '2024-01-01'}; по умолчанию - все вакансии.
+        '''
+        if streaming:
+            return self.parse_json_files_streaming(input_folder, output_csv, workers=workers, batch_size=batch_size,
+                                                   format=format, fields=fields, select=select)
+
+        # Создаем список словарей данных по всем файлам JSON в указанной папке
+        extract_fields = self.output_fields(fields)
+        data_list = list(self.iter_records(input_folder, clean=False, fields=extract_fields, select=select))
+        if self.aggregates is not None:
+            self.aggregates.add_many(data_list)
+            self.aggregates.flush()
 
-        # Проверяем, что есть данные для записи в CSV
+        # Очищаем описания всех вакансий одним пакетом на всех ядрах
+        if extract_fields is None or 'description' in extract_fields:
+            descriptions = self.clean_texts([record['description'] for record in data_list], workers=workers)
+            for record, description in zip(data_list, descriptions):
+                record['description'] = description
+        if self.search_index is not None:
+            self.search_index.add_many(data_list)
+            self.search_index.flush()
+
+        # Проверяем, что есть данные для записи
         if data_list:
-            # Создаем DataFrame из списка словарей
-            df = pd.DataFrame(data_list)
+            if format == 'csv':
+                # Создаем DataFrame из столбцов записей (без промежуточных словарей)
+                df = pd.DataFrame(self.record_class.columns(data_list, fields))
 
-            # Сохраняем данные в CSV файл
-            df.to_csv(output_csv, index=False, encoding='utf-8', sep='|')
+                # Сохраняем данные в CSV файл
+                df.to_csv(output_csv, index=False, encoding='utf-8', sep='|')
+            else:
+                with VacancyTableWriter(output_csv, format, self.field_spec) as writer:
+                    writer.write(self.record_class.columns(data_list, fields))
             logging.info(f"Данные успешно записаны в {output_csv}")
         else:
             logging.warning("Нет данных для записи в CSV")
 
+    def export_incremental(self, input_folder, output_folder, format='csv', workers=None):
+        '''
+        Инкрементальная выгрузка: в таблицу, разбитую по дате публикации, записываются только вакансии,
+        изменившиеся с прошлой выгрузки в ту же папку output_folder (см. IncrementalExporter).
+
+        :return: Словарь со статистикой выгрузки.
+        '''
+        exporter = IncrementalExporter(output_folder, format=format)
+        try:
+            return exporter.export(input_folder, parser=self, workers=workers)
+        finally:
+            exporter.close()
+
+    def iter_batches(self, input_folder, batch_size, select=None):
+        '''
+        Генератор пачек по batch_size элементов: путей к JSON-файлам папки input_folder
+        или, если папка является хранилищем сегментов, сырых JSON-записей из него.
+
+        :param select: Фильтры выборки вакансий (см. RawCorpusReader.select) или None (все вакансии).
+        '''
+        if select is not None:
+            with RawCorpusReader(input_folder) as reader:
+                if reader.store is None:
+                    records = (reader.path(record_id) for record_id in reader.select(**select))
+                else:
+                    records = (text for _, text in reader.iter_raw(**select))
+                while True:
+                    batch = list(itertools.islice(records, batch_size))
+                    if not batch:
+                        break
+                    yield batch
+            return
+
+        if RawSegmentStore.is_store(input_folder):
+            store = RawSegmentStore(input_folder)
+            try:
+                records = (text for _, text in store.iter_records())
+                while True:
+                    batch = list(itertools.islice(records, batch_size))
+                    if not batch:
+                        break
+                    yield batch
+            finally:
+                store.close()
+            return
+
+        batch = []
+        with os.scandir(input_folder) as entries:
+            for entry in entries:
+                if entry.name.endswith('.json'):
+                    batch.append(entry.path)
+                    if len(batch) >= batch_size:
+                        yield batch
+                        batch = []
+        if batch:
+            yield batch
+
+    def parse_json_files_streaming(self, input_folder, output_csv, workers=None, batch_size=5000, format='csv',
+                                   fields=None, select=None):
+        '''
+        Потоковый параллельный парсинг JSON-файлов.
+        Файлы распределяются пачками по пулу процессов; каждый процесс собирает записи пачки сразу в столбцы
+        (словарь списков), а основной процесс дописывает готовые пачки в выходной файл по мере поступления.
+        В обработке одновременно находится не больше 2 * workers пачек, поэтому пиковое потребление памяти
+        ограничено размером пачки, а не всего набора данных.
+        '''
+        workers = workers or os.cpu_count() or 1
+        batches = self.iter_batches(input_folder, batch_size, select)
+        raw = RawSegmentStore.is_store(input_folder)
+        extract_fields = self.output_fields(fields)
+        written = 0
+
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker_logging,
+                                 initargs=(worker_log_file(),)) as executor, \
+                VacancyTableWriter(output_csv, format, self.field_spec) as writer:
+            # Окно задач в обработке: новая пачка отправляется в пул только после записи самой старой
+            pending = deque()
+            for batch in itertools.islice(batches, workers * 2):
+                pending.append(executor.submit(parse_json_batch, batch, raw, extract_fields, self.field_spec))
+
+            while pending:
+                columns, snapshot = pending.popleft().result()
+                # Метрики разбора из дочернего процесса
+                self.metrics.merge(snapshot)
+                if self.aggregates is not None:
+                    self.aggregates.add_columns(columns)
+                if self.search_index is not None:
+                    self.search_index.add_columns(columns)
+                next_batch = next(batches, None)
+                if next_batch is not None:
+                    pending.append(executor.submit(parse_json_batch, next_batch, raw, extract_fields,
+                                                   self.field_spec))
+
+                if fields and columns:
+                    columns = {field: columns[field] for field in fields}
+                written += writer.write(columns)
+
+        for index in (self.aggregates, self.search_index):
+            if index is not None:
+                index.flush()
+        if written:
+            logging.info(f"Данные успешно записаны в {output_csv} ({written} записей)")
+        else:
+            logging.warning("Нет данных для записи в CSV")
+        return written
+
+    def extract_listing_record(self, item, fields=None):
+        '''
+        Метод извлекает поля вакансии из элемента выдачи поиска (страницы pagination) функцией compile_extractor
+        по тем же описаниям столбцов, что и extract_record, и столбцам LISTING_SPEC (фрагменты требований
+        и обязанностей). Поля, которых нет в выдаче поиска (описание, навыки и т.д.), равны None.
+
+        :param fields: Список извлекаемых столбцов (по умолчанию LISTING_FIELDS).
+        '''
+        return self.compile_extractor(fields, listing=True)(item)
+
+    def iter_listing_items(self, input_folder):
+        '''
+        Генератор элементов выдачи поиска из папки страниц pagination или из хранилища сегментов.
+        Вакансия, которая встречается на страницах нескольких профессий или регионов, возвращается один раз.
+        '''
+        if RawSegmentStore.is_store(input_folder):
+            store = RawSegmentStore(input_folder)
+            pages = store.iter_records()
+        else:
+            store = None
+            pages = ((filename, os.path.join(input_folder, filename))
+                     for filename in os.listdir(input_folder) if filename.endswith('.json'))
+
+        seen = set()
+        try:
+            for name, page in pages:
+                try:
+                    if store is None:
+                        with open(page, 'rb') as f:
+                            page = f.read()
+                    items = json_loads(page)['items']
+                except Exception as e:
+                    logging.error(f"Ошибка при чтении страницы {name}: {str(e)}")
+                    continue
+                for item in items:
+                    if item['id'] not in seen:
+                        seen.add(item['id'])
+                        yield item
+        finally:
+            if store is not None:
+                store.close()
+
+    def parse_listing_files(self, input_folder, output_path, fields=None, needs_details=None, fetcher=None,
+                            vacancies_folder='./docs/vacancies', batch_size=5000, format='csv'):
+        '''
+        Режим "только выдача": строит таблицу вакансий по сохраненным страницам поиска, без отдельного
+        запроса на каждую вакансию. Поля, которых нет в выдаче поиска (DETAIL_FIELDS: описание и навыки),
+        берутся из детальных данных вакансии только для записей, которым они нужны: сначала из уже
+        сохраненных данных, а если их нет или вакансия изменилась в выдаче - загружаются через fetcher.
+
+        :param input_folder: Папка страниц pagination или хранилище сегментов страниц.
+        :param output_path: Имя выходного файла.
+        :param fields: Список столбцов (по умолчанию LISTING_FIELDS). Столбцы из DETAIL_FIELDS
+                       включают загрузку детальных данных.
+        :param needs_details: Функция record -> bool, отбирающая записи, для которых нужны детальные поля
+                              (по умолчанию - все записи). Для остальных записей детальные поля равны None.
+        :param fetcher: HHDataFetcher для загрузки недостающих вакансий и чтения сохраненных
+                        (если не задан, детальные данные читаются из vacancies_folder без запросов к API).
+        :param format: Формат выходного файла: 'csv', 'parquet' или 'arrow' (см. VacancyTableWriter).
+        :return: Количество записанных строк.
+        '''
+        fields = list(fields or self.LISTING_FIELDS)
+        detail_fields = [field for field in fields if field in self.DETAIL_FIELDS]
+        # Запись содержит все столбцы LISTING_FIELDS, чтобы needs_details мог отбирать записи по любому из них
+        extract = self.compile_extractor(list(self.LISTING_FIELDS) + [
+            field for field in fields if field not in self.LISTING_FIELDS and field not in self.DETAIL_FIELDS
+        ], listing=True)
+        vacancies = None
+        if detail_fields and fetcher is None:
+            vacancies = RawSegmentStore(vacancies_folder) if RawSegmentStore.is_store(vacancies_folder) \
+                else vacancies_folder
+        written = detail_requests = 0
+
+        with VacancyTableWriter(output_path, format, self.field_spec) as writer:
+            columns = {field: [] for field in fields}
+            for item in self.iter_listing_items(input_folder):
+                record = extract(item)
+                if detail_fields and (needs_details is None or needs_details(record)):
+                    details, fetched = self.load_details(item, vacancies, fetcher)
+                    detail_requests += fetched
+                    if details is not None:
+                        for field in detail_fields:
+                            record[field] = details[field]
+                for field in fields:
+                    columns[field].append(record[field])
+
+                if len(columns[fields[0]]) >= batch_size:
+                    written += writer.write(columns)
+                    columns = {field: [] for field in fields}
+            if columns[fields[0]]:
+                written += writer.write(columns)
+
+        if isinstance(vacancies, RawSegmentStore):
+            vacancies.close()
+        if fetcher is not None:
+            fetcher.flush_storage()
+            fetcher.vacancy_index.flush()
+
+        if written:
+            logging.info(f"Данные успешно записаны в {output_path} ({written} записей, "
+                         f"загружено вакансий: {detail_requests})")
+        else:
+            logging.warning("Нет данных для записи")
+        return written
+
+    def load_details(self, item, vacancies=None, fetcher=None):
+        '''
+        Возвращает детальные поля вакансии (описание и навыки) для режима "только выдача".
+
+        :param item: Элемент выдачи поиска.
+        :param vacancies: Папка с JSON-файлами вакансий или RawSegmentStore (если fetcher не задан).
+        :param fetcher: HHDataFetcher: вакансия загружается, если ее нет в индексе или она изменилась в выдаче.
+        :return: Кортеж (словарь детальных полей или None, 1 если вакансия загружалась из API, иначе 0).
+        '''
+        fetched = 0
+        if fetcher is not None:
+            v = fetcher.vacancy_index.compact(item)
+            text = None
+            if not fetcher.vacancy_index.needs_fetch(v):
+                text = fetcher.load_vacancy(v['id'])
+            if text is None:
+                fetched = 1
+                if fetcher.fetch_vacancy(v):
+                    text = fetcher.load_vacancy(v['id'])
+        elif isinstance(vacancies, RawSegmentStore):
+            text = vacancies.get(item['id'])
+        else:
+            try:
+                with open(os.path.join(vacancies, f"{item['id']}.json"), 'rb') as f:
+                    text = f.read()
+            except OSError:
+                text = None
+        if not text:
+            return None, fetched
+
+        record = self.parse_raw(text, item['id'])
+        if record is None:
+            return None, fetched
+        return {field: record[field] for field in self.DETAIL_FIELDS}, fetched
+
+def parse_json_batch(items, raw=False, fields=None, field_spec=None):
+    '''
+    Разбирает пачку JSON-файлов вакансий в дочернем процессе пула.
+
+    :param items: Список путей к JSON-файлам или, если raw=True, список сырых JSON-записей.
+    :param fields: Список извлекаемых столбцов (по умолчанию - все).
+    :param field_spec: Дополнительное описание столбцов (см. HHDataParser).
+    :return: Кортеж (словарь {столбец: список значений} с данными всех успешно разобранных файлов,
+             снимок метрик разбора пачки для CrawlMetrics.merge).
+    '''
+    parser = HHDataParser(field_spec=field_spec)
+    records = []
+    for item in items:
+        if raw:
+            record = parser.parse_raw(item, clean=False, fields=fields)
+        else:
+            record = parser.parse_file(item, clean=False, fields=fields)
+        if record is not None:
+            records.append(record)
+    columns = parser.record_class.columns(records, fields) if records else {}
+
+    # Очищаем описания всей пачки одним вызовом
+    if 'description' in columns:
+        columns['description'] = parser.clean_texts(columns['description'])
+    return columns, parser.metrics.snapshot()
+
 # Инициализация и запуск получения данных
 if __name__ == "__main__":
 
@@ -606,19 +5509,27 @@ if __name__ == "__main__":
     client_secret = 'V6OKEDJEIQL9IKEA1D8FTD30G8I3QF7DR411H3A5ST6G0T2UQ4T3NSXXXXXXXXXX'
     access_token = 'APPLRDFPI8C61C9066NQ9QNJA12GIGG9RV2DI8784AOILMQUAI84NPXXXXXXXXXX'
 
+    # Общий HTTP-клиент с пулом соединений для всех запросов к hh.ru
+    http_client = HHHttpClient(pool_size=10)
+
+    # Сводка о ходе обхода раз в минуту и файл метрик Prometheus
+    http_client.metrics.start_reporter(interval=60, textfile='./docs/metrics.prom')
+
     # Создание OAuthTokenManager
-    token_manager = OAuthTokenManager(client_id, client_secret, access_token)
+    token_manager = OAuthTokenManager(client_id, client_secret, access_token, http_client=http_client)
     access_token = token_manager.get_oauth_token()
 
     # Загрузка данных
     data_fetcher = HHDataFetcher(client_id=client_id, client_secret=client_secret, professional_roles=professional_roles,
-                                 regions_list=None, access_token=access_token)
+                                 regions_list=None, access_token=access_token, http_client=http_client,
+                                 token_manager=token_manager)
    # data_fetcher.process_pagination_files()
    # data_fetcher.fetch_data()
     data_fetcher.fetch_vacancy_details()
 
-    # Парсинг данных из Json в csv
-    data_parser = HHDataParser()
+    # Парсинг данных из Json в csv с обновлением агрегатов для аналитики (./docs/aggregates.sqlite)
+    # и поискового индекса (./docs/search_index.sqlite)
+    data_parser = HHDataParser(aggregates=VacancyAggregates(), search_index=VacancySearchIndex())
     input_folder = 'D:/Pyton/pythonProject/pythonProject2/docs/vacancies/'  # Укажите путь к вашей папке с файлами JSON
     output_csv = 'vacancies_hh.csv'  # Укажите имя выходного CSV файла
     data_parser.parse_json_files(input_folder, output_csv)
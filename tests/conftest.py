@@ -0,0 +1,51 @@
+import logging
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'benchmarks'))
+
+import pytest
+
+from parser_hh_token import HHDataFetcher, RateLimiter
+from mock_hh_api import MockHHApi
+
+# Лог парсера - во временную папку: HHDataParser и HHDataFetcher не создают parser_hh.log в рабочей папке
+logging.basicConfig(filename=os.path.join(tempfile.gettempdir(), 'parser_hh_tests.log'), level=logging.INFO,
+                    format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    '''
+    Временная рабочая папка: классы по умолчанию пишут в ./docs, поэтому тесты выполняются в ней.
+    '''
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'docs').mkdir()
+    return tmp_path
+
+
+@pytest.fixture
+def mock_fetcher(workdir):
+    '''
+    Фабрика mock_fetcher(found, regions, **kwargs) -> (api, fetcher): запускает тестовый сервер MockHHApi
+    и создает для него загрузчик с профессиональной ролью '96' и RateLimiter(rate=1000).
+    Параметры server (error_rate, gone и т.д.) передаются серверу, api_class - класс сервера, fetcher_class -
+    класс загрузчика, остальные параметры - загрузчику. С api=... создается еще один загрузчик для того же сервера.
+    Серверы останавливаются после теста.
+    '''
+    servers = []
+
+    def make(found=None, regions=None, api=None, api_class=MockHHApi, server=None, fetcher_class=HHDataFetcher,
+             **kwargs):
+        if api is None:
+            api = api_class(found=found, regions=regions, **(server or {})).start()
+            servers.append(api)
+        kwargs.setdefault('rate_limiter', RateLimiter(rate=1000))
+        fetcher = fetcher_class(professional_roles=['96'], access_token='token', api_url=api.url, **kwargs)
+        return api, fetcher
+
+    yield make
+    for api in servers:
+        api.stop()
@@ -0,0 +1,46 @@
+import pytest
+
+from parser_hh_token import VacancyAggregates
+
+
+def vacancy(vacancy_id, skills, salary=None, roles=('Аналитик',), area='Москва', date='2024-01-10',
+            employer=('1', 'Сбер')):
+    return {'id': vacancy_id, 'key_skills': list(skills), 'professional_roles': list(roles), 'area_name': area,
+            'published_at': f'{date}T10:00:00+0300', 'employer_id': employer[0], 'employer_name': employer[1],
+            'salary': salary}
+
+
+@pytest.fixture
+def aggregates(tmp_path):
+    aggregates = VacancyAggregates(str(tmp_path / 'aggregates.sqlite'))
+    aggregates.add_many([
+        vacancy('1', ['SQL', 'Python'], {'from': 100000, 'to': 140000, 'currency': 'RUR'}),
+        vacancy('2', ['SQL', 'Excel'], {'from': 80000, 'currency': 'RUR', 'gross': True}, area='Казань'),
+        vacancy('3', ['Python', 'SQL', 'Docker'], {'to': 2000, 'currency': 'USD'}, roles=['Разработчик'],
+                employer=('2', 'Яндекс')),
+    ])
+    yield aggregates
+    aggregates.close()
+
+
+def test_skills_and_employers(aggregates):
+    assert aggregates.top_skills(2) == [('SQL', 3), ('Python', 2)]
+    assert aggregates.related_skills('Python') == [('SQL', 2), ('Docker', 1)]
+    assert aggregates.top_employers() == [('1', 'Сбер', 2), ('2', 'Яндекс', 1)]
+
+
+def test_counts_and_salaries(aggregates):
+    assert aggregates.vacancy_counts() == [('Аналитик', 2), ('Разработчик', 1)]
+    assert sorted(aggregates.vacancy_counts(group_by=('area',), role='Аналитик')) == [('Казань', 1), ('Москва', 1)]
+    stats = aggregates.salary_stats(role='Аналитик')
+    assert stats[0]['count'] == 2
+    assert stats[0]['mean'] == pytest.approx((120000 + 80000 * 0.87) / 2)
+    with pytest.raises(ValueError):
+        aggregates.vacancy_counts(group_by=('employer',))
+
+
+def test_reparsed_vacancy_replaces_its_contribution(aggregates):
+    aggregates.add(vacancy('1', ['SQL', 'Python'], {'from': 100000, 'to': 140000, 'currency': 'RUR'}))
+    aggregates.add(vacancy('2', ['Excel'], area='Казань'))
+    assert aggregates.top_skills() == [('Python', 2), ('SQL', 2), ('Docker', 1), ('Excel', 1)]
+    assert aggregates.salary_stats(role='Аналитик')[0]['count'] == 1
@@ -0,0 +1,43 @@
+import threading
+
+import pytest
+
+from parser_hh_token import AsyncHHDataFetcher, RequestBudget, aiohttp
+
+pytestmark = pytest.mark.skipif(aiohttp is None, reason='нужен пакет aiohttp')
+
+
+def make_fetcher(mock_fetcher, **kwargs):
+    return mock_fetcher(found=120, regions=2, fetcher_class=AsyncHHDataFetcher, concurrency=4, **kwargs)
+
+
+def test_fetches_pages_and_vacancies(workdir, mock_fetcher):
+    api, fetcher = make_fetcher(mock_fetcher)
+    fetcher.fetch_data()
+    fetcher.fetch_vacancy_details()
+    assert api.counts['/vacancies'] == 4
+    assert api.counts['/vacancies/{id}'] == 240
+    assert len(list((workdir / 'docs' / 'vacancies').glob('*.json'))) == 240
+
+
+def test_blocking_storage_runs_outside_event_loop(mock_fetcher):
+    api, fetcher = make_fetcher(mock_fetcher)
+    fetcher.fetch_data()
+    loop_thread = threading.get_ident()
+    threads = set()
+    store_vacancy = fetcher.store_vacancy
+
+    def recording_store(v, content):
+        threads.add(threading.get_ident())
+        return store_vacancy(v, content)
+
+    fetcher.store_vacancy = recording_store
+    fetcher.fetch_vacancy_details()
+    assert threads and loop_thread not in threads
+
+
+def test_request_budget_limits_requests(mock_fetcher):
+    api, fetcher = make_fetcher(mock_fetcher, request_budget=RequestBudget(limit=3))
+    fetcher.fetch_data()
+    assert api.counts.get('/vacancies', 0) == 3
+    assert fetcher.metrics.counter_total('requests_over_budget_total') >= 1
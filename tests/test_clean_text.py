@@ -0,0 +1,45 @@
+import pickle
+import random
+
+from parser_hh_token import HHDataParser, clean_texts_chunk
+from corpus import synthetic_description
+
+
+def test_clean_text_decodes_entities_and_strips_tags():
+    parser = HHDataParser()
+    cleaned = parser.clean_text('<p><strong>Python</strong>, SQL &mdash; от 3 лет</p>')
+    assert '<' not in cleaned and 'mdash' not in cleaned
+    assert cleaned.split() == ['Python,', 'SQL', 'от', '3', 'лет']
+
+
+def test_clean_texts_keeps_none():
+    parser = HHDataParser()
+    assert parser.clean_texts(['<b>a</b>', None, '']) == ['a', None, '']
+
+
+def test_clean_texts_matches_clean_text():
+    parser = HHDataParser()
+    rng = random.Random(1)
+    texts = [synthetic_description(rng) for _ in range(200)] + [None]
+    assert parser.clean_texts(texts) == [None if text is None else parser.clean_text(text) for text in texts]
+
+
+def test_clean_texts_with_worker_processes():
+    # Регрессия: пул процессов получал связанный метод парсера, а метрики парсера (threading.Lock) не сериализуются
+    parser = HHDataParser()
+    # Пул используется только для больших столбцов
+    parser.MIN_POOL_TEXTS = 0
+    rng = random.Random(2)
+    texts = [synthetic_description(rng) for _ in range(50)]
+    assert parser.clean_texts(texts, workers=2, chunk_size=10) == parser.clean_texts(texts)
+
+
+def test_chunk_function_is_picklable():
+    assert pickle.loads(pickle.dumps(clean_texts_chunk)) is clean_texts_chunk
+
+
+
+def test_clean_texts_skips_pool_for_small_columns(monkeypatch):
+    parser = HHDataParser()
+    monkeypatch.setattr('parser_hh_token.ProcessPoolExecutor', None)
+    assert parser.clean_texts(['<b>a</b>'] * 10, workers=4, chunk_size=2) == ['a'] * 10
@@ -0,0 +1,72 @@
+import json
+import os
+
+import parser_hh_token
+from parser_hh_token import RawCorpusReader
+from corpus import synthetic_vacancy, write_corpus
+
+
+def test_index_is_kept_outside_the_data_folder(tmp_path):
+    folder = tmp_path / 'vacancies'
+    write_corpus(str(folder), 20)
+    with RawCorpusReader(str(folder)) as reader:
+        assert len(reader) == 20
+        assert reader.index_path == str(tmp_path / 'vacancies_corpus_index.sqlite')
+    assert sorted(os.listdir(folder)) == sorted(f'{90000000 + i}.json' for i in range(20))
+
+    index_path = tmp_path / 'index' / 'corpus.sqlite'
+    index_path.parent.mkdir()
+    with RawCorpusReader(str(folder), index_path=str(index_path)) as reader:
+        assert len(reader) == 20
+    assert index_path.exists()
+
+
+def test_select_reads_only_matching_records(tmp_path):
+    folder = tmp_path / 'vacancies'
+    write_corpus(str(folder), 50)
+    with RawCorpusReader(str(folder)) as reader:
+        employer_id = reader.get('90000007')['employer']['id']
+        selected = dict(reader.iter_records(employer_id=employer_id))
+    assert '90000007' in selected
+    assert all(data['employer']['id'] == employer_id for data in selected.values())
+
+
+def test_folder_is_rescanned_only_when_it_changes(tmp_path, monkeypatch):
+    folder = tmp_path / 'vacancies'
+    write_corpus(str(folder), 10)
+    RawCorpusReader(str(folder)).close()
+
+    scans = []
+    scandir = os.scandir
+    monkeypatch.setattr(parser_hh_token.os, 'scandir', lambda path: scans.append(path) or scandir(path))
+    with RawCorpusReader(str(folder)) as reader:
+        assert len(reader) == 10
+    assert scans == []
+
+    # Новая вакансия меняет время изменения папки
+    with open(folder / '1.json', 'w', encoding='utf8') as f:
+        json.dump(synthetic_vacancy(1), f, ensure_ascii=False)
+    os.utime(folder, ns=(os.stat(folder).st_atime_ns, os.stat(folder).st_mtime_ns + 10 ** 9))
+    with RawCorpusReader(str(folder)) as reader:
+        assert len(reader) == 11 and reader.get('1')['id'] == '1'
+    assert len(scans) == 1
+
+
+def test_rewritten_file_is_read_in_full(tmp_path):
+    folder = tmp_path / 'vacancies'
+    write_corpus(str(folder), 3)
+    with RawCorpusReader(str(folder)) as reader:
+        vacancy = synthetic_vacancy(90000001)
+        vacancy['name'] = 'Очень длинное название вакансии ' * 10
+        with open(folder / '90000001.json', 'w', encoding='utf8') as f:
+            json.dump(vacancy, f, ensure_ascii=False)
+        assert reader.get('90000001')['name'] == vacancy['name']
+
+
+def test_segment_store(tmp_path):
+    folder = tmp_path / 'segments'
+    write_corpus(str(folder), 30, storage='segments')
+    with RawCorpusReader(str(folder)) as reader:
+        assert len(reader) == 30
+        assert reader.get('90000011')['id'] == '90000011'
+    assert not (folder / RawCorpusReader.INDEX_FILE).exists()
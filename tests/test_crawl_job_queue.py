@@ -0,0 +1,153 @@
+import time
+
+import pytest
+
+from parser_hh_token import CrawlJobQueue, RateLimiter, run_queue_workers
+from mock_hh_api import MockHHApi
+
+
+def make_queue(tmp_path, **kwargs):
+    return CrawlJobQueue(str(tmp_path / 'queue.sqlite'), **kwargs)
+
+
+def test_lease_ack_and_deduplication(tmp_path):
+    queue = make_queue(tmp_path)
+    queue.start_crawl()
+    queue.put_many([('page', 'page:1', {'page': 1}), ('page', 'page:2', {'page': 2})])
+    queue.put('page', 'page:1', {'page': 1})
+    jobs = queue.lease('worker-a', limit=10)
+    assert [job['key'] for job in jobs] == ['page:1', 'page:2']
+    assert jobs[0]['payload'] == {'page': 1}
+    # Выданные в аренду задания другим обработчикам недоступны
+    assert queue.lease('worker-b', limit=10) == []
+    queue.ack('worker-a', [job['id'] for job in jobs])
+    assert queue.next_available_in() is None
+    # Выполненное в текущем обходе задание повторно не добавляется
+    queue.put('page', 'page:1', {'page': 1})
+    assert queue.lease('worker-a') == []
+    queue.close()
+
+
+def test_expired_lease_is_reissued(tmp_path):
+    queue = make_queue(tmp_path, lease_seconds=0.05)
+    queue.put('vacancy', 'vacancy:1', {'id': '1'})
+    first = queue.lease('worker-a')
+    time.sleep(0.1)
+    second = queue.lease('worker-b')
+    assert [job['id'] for job in second] == [job['id'] for job in first]
+    # Истекшая аренда считается неудачной попыткой
+    assert second[0]['attempts'] == 1
+    queue.close()
+
+
+def test_job_that_keeps_losing_its_lease_fails(tmp_path):
+    # Задание, которое каждый раз роняет обработчик, не выдается бесконечно
+    queue = make_queue(tmp_path, lease_seconds=0.01, max_attempts=3)
+    queue.put('vacancy', 'vacancy:1', {'id': '1'})
+    leases = 0
+    while queue.lease(f'worker-{leases}'):
+        leases += 1
+        time.sleep(0.02)
+    assert leases == 3
+    assert queue.stats() == {('vacancy', 'failed'): 1}
+    queue.close()
+
+
+def test_stale_worker_cannot_change_reissued_job(tmp_path):
+    queue = make_queue(tmp_path, lease_seconds=0.05)
+    queue.put('vacancy', 'vacancy:1', {'id': '1'})
+    job = queue.lease('worker-a')[0]
+    time.sleep(0.1)
+    assert queue.lease('worker-b')[0]['id'] == job['id']
+    # Обработчик с истекшей арендой не может изменить задание, выданное другому обработчику
+    queue.nack('worker-a', job['id'])
+    queue.fail('worker-a', job['id'])
+    queue.ack('worker-a', [job['id']])
+    assert queue.stats() == {('vacancy', 'leased'): 1}
+    queue.ack('worker-b', [job['id']])
+    # Запоздавший nack не возвращает выполненное задание в очередь
+    queue.nack('worker-a', job['id'])
+    assert queue.stats() == {('vacancy', 'done'): 1}
+    queue.close()
+
+
+def test_nack_delays_and_fails_after_max_attempts(tmp_path):
+    queue = make_queue(tmp_path, max_attempts=2)
+    queue.put('vacancy', 'vacancy:1', {'id': '1'})
+    job = queue.lease('worker-a')[0]
+    queue.nack('worker-a', job['id'], delay=0.2)
+    assert queue.lease('worker-a') == []
+    assert 0 < queue.next_available_in() <= 0.2
+
+    time.sleep(0.2)
+    job = queue.lease('worker-a')[0]
+    assert job['attempts'] == 1
+    queue.nack('worker-a', job['id'], delay=0)
+    assert queue.stats() == {('vacancy', 'failed'): 1}
+    queue.close()
+
+
+def test_new_crawl_requeues_done_jobs(tmp_path):
+    queue = make_queue(tmp_path)
+    queue.start_crawl()
+    queue.put('page', 'page:1', {'page': 1})
+    queue.ack('worker-a', [job['id'] for job in queue.lease('worker-a')])
+    time.sleep(0.01)
+    queue.start_crawl()
+    queue.put('page', 'page:1', {'page': 1})
+    assert [job['key'] for job in queue.lease('worker-a')] == ['page:1']
+    queue.close()
+
+
+def test_kinds_filter(tmp_path):
+    queue = make_queue(tmp_path)
+    queue.put_many([('page', 'page:1', {}), ('vacancy', 'vacancy:1', {})])
+    assert [job['kind'] for job in queue.lease('worker-a', limit=5, kinds=['vacancy'])] == ['vacancy']
+    queue.close()
+
+
+def test_worker_acks_before_leases_expire(workdir, mock_fetcher):
+    api, fetcher = mock_fetcher(found=6, regions=1)
+    queue = make_queue(workdir, lease_seconds=1.0)
+    fetcher.enqueue_crawl(queue)
+    process_vacancy_job = fetcher.process_vacancy_job
+
+    def slow_vacancy_job(job_queue, job):
+        # Долгая пауза (как после ответов 429): пачка из ack_batch заданий не набирается за время аренды
+        time.sleep(0.3)
+        return process_vacancy_job(job_queue, job)
+
+    fetcher.process_vacancy_job = slow_vacancy_job
+    assert fetcher.run_queue_worker(queue, ack_batch=64, max_idle_wait=0.1) == 7
+    assert api.counts['/vacancies/{id}'] == 6
+    assert queue.stats() == {('page', 'done'): 1, ('vacancy', 'done'): 6}
+    queue.close()
+
+
+class TimedMockHHApi(MockHHApi):
+    '''
+    Тестовый сервер, запоминающий время каждого запроса.
+    '''
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.times = []
+
+    def count(self, key):
+        self.times.append(time.monotonic())
+        super().count(key)
+
+
+def test_queue_workers_share_the_request_rate(workdir, mock_fetcher):
+    api, fetcher = mock_fetcher(found=10, regions=1, api_class=TimedMockHHApi)
+    queue = make_queue(workdir)
+    fetcher.enqueue_crawl(queue)
+    queue.close()
+    kwargs = dict(professional_roles=['96'], access_token='token', api_url=api.url)
+    with pytest.raises(ValueError):
+        run_queue_workers(str(workdir / 'queue.sqlite'), processes=2, rate_limiter=RateLimiter(rate=10), **kwargs)
+    assert run_queue_workers(str(workdir / 'queue.sqlite'), processes=2, requests_per_second=4,
+                             max_requests_per_second=4, **kwargs) == 11
+    assert api.counts['/vacancies/{id}'] == 10
+    # 11 запросов при суммарной частоте 4 в секунду: у каждого процесса частота 2 и всплеск в 2 запроса, поэтому
+    # запросы растягиваются больше чем на 3 секунды (при частоте 4 в каждом процессе хватило бы 2 секунд)
+    assert max(api.times) - min(api.times) >= 3.0
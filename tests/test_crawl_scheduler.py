@@ -0,0 +1,51 @@
+import time
+
+from parser_hh_token import CrawlScheduler, RequestBudget, VacancyIndex
+
+
+def test_request_budget():
+    budget = RequestBudget(limit=3)
+    assert [budget.take() for _ in range(4)] == [True, True, True, False]
+    assert budget.exhausted and budget.remaining == 0
+    assert RequestBudget(limit=10).share_used(0.3) is False
+    assert RequestBudget(seconds=0).exhausted
+    unlimited = RequestBudget()
+    assert all(unlimited.take() for _ in range(100)) and unlimited.remaining is None
+
+
+def test_priorities(tmp_path):
+    scheduler = CrawlScheduler(str(tmp_path / 'schedule.sqlite'))
+    now = time.time()
+    scheduler.record('96', '1', found=1000, changes=1000, crawled_at=now - 10 * 3600)
+    scheduler.record('96', '2', found=100, changes=100, crawled_at=now - 10 * 3600, backlog=50)
+    ranked = scheduler.rank([('96', '1'), ('96', '2'), ('96', '3')], now=now)
+    # Необходившаяся комбинация - первой, затем по ожидаемому количеству изменений
+    assert [(role, area) for _, role, area in ranked] == [('96', '3'), ('96', '2'), ('96', '1')]
+    assert ranked[1][0] == 50 + 100 / (30 * 24) * 10
+
+    # Второй обход обновляет оценку скорости изменений экспоненциальным сглаживанием
+    scheduler.record('96', '1', found=1000, changes=20, crawled_at=now)
+    assert scheduler.change_rate('96', '1') == 0.5 * 2 + 0.5 * 1000 / (30 * 24)
+    scheduler.close()
+    reopened = CrawlScheduler(str(tmp_path / 'schedule.sqlite'))
+    assert reopened.stats()[('96', '1')]['crawls'] == 2
+
+
+def test_vacancies_are_ranked_new_first(tmp_path):
+    index = VacancyIndex(str(tmp_path / 'index.sqlite'), vacancies_folder=None)
+    scheduler = CrawlScheduler(str(tmp_path / 'schedule.sqlite'))
+    items = [{'id': str(i), 'url': f'https://api.hh.ru/vacancies/{i}', 'published_at': f'2024-01-0{i}T10:00:00+0300'}
+             for i in range(1, 5)]
+    index.mark_fetched(items[3], b'{}')
+    assert [item['id'] for item in scheduler.rank_vacancies(items, index)] == ['3', '2', '1', '4']
+
+
+def test_prioritized_crawl_respects_budget(mock_fetcher):
+    api, fetcher = mock_fetcher(found=30, regions=2)
+    assert fetcher.fetch_prioritized(budget=20) == 18
+    assert api.counts['/vacancies'] + api.counts['/vacancies/{id}'] == 20
+    assert sum(stats['backlog'] for stats in fetcher.scheduler.stats().values()) == 42
+
+    # Следующий запуск загружает оставшиеся вакансии
+    assert fetcher.fetch_prioritized() == 42
+    assert api.counts['/vacancies/{id}'] == 60
@@ -0,0 +1,11 @@
+def test_search_pages_are_logged_not_printed(mock_fetcher, capsys):
+    api, fetcher = mock_fetcher(found=30, regions=2)
+    assert [page[:4] for page in fetcher.iter_search_pages()] == [('96', '1', '96_1', 0), ('96', '2', '96_2', 0)]
+
+    def broken_request(*args, **kwargs):
+        raise ValueError('ошибка разбора ответа')
+
+    fetcher.request_with_retry = broken_request
+    assert fetcher.get_page(0, '96', '1') is None
+    assert capsys.readouterr().out == ''
+    assert fetcher.metrics.counters[('pages_failed_total', ())] == 1
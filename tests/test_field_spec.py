@@ -0,0 +1,64 @@
+import pytest
+
+from parser_hh_token import FieldSpec, HHDataParser
+from corpus import listing_item, synthetic_vacancy
+
+
+def test_extract_record_follows_field_spec_paths():
+    parser = HHDataParser()
+    vacancy = synthetic_vacancy(101)
+    record = parser.extract_record(vacancy)
+    assert record.id == '101'
+    assert record.employer_name == vacancy['employer']['name']
+    assert record.employer_logo_90 == vacancy['employer']['logo_urls']['90']
+    assert record.key_skills == [skill['name'] for skill in vacancy['key_skills']]
+
+
+def test_missing_key_gives_default_and_metric():
+    parser = HHDataParser()
+    vacancy = synthetic_vacancy(102)
+    del vacancy['employer']
+    record = parser.extract_record(vacancy)
+    assert record.employer_id is None and record.employer_name is None
+    assert parser.metrics.counters[('parse_missing_fields_total', (('field', 'employer_name'),))] == 1
+
+
+def test_missing_id_is_an_error():
+    parser = HHDataParser()
+    vacancy = synthetic_vacancy(103)
+    del vacancy['id']
+    with pytest.raises(KeyError):
+        parser.extract_record(vacancy)
+
+
+def test_selected_fields_and_cache():
+    parser = HHDataParser()
+    extractor = parser.compile_extractor(['id', 'name'])
+    assert parser.compile_extractor(['id', 'name']) is extractor
+    record = extractor(synthetic_vacancy(104))
+    assert record.id == '104' and record.description is None
+    with pytest.raises(ValueError):
+        parser.compile_extractor(['id', 'no_such_column'])
+
+
+def test_extra_field_spec_column():
+    parser = HHDataParser(field_spec=[FieldSpec('logo_url', 'employer.logo_urls.original'),
+                                      FieldSpec('area_id', 'area.id', type=int)])
+    vacancy = synthetic_vacancy(105)
+    record = parser.extract_record(vacancy)
+    assert record.logo_url == vacancy['employer']['logo_urls']['original']
+    assert record.area_id == int(vacancy['area']['id'])
+    assert parser.columns[-1] == 'logo_url'
+
+
+def test_listing_record_uses_field_spec():
+    parser = HHDataParser()
+    vacancy = synthetic_vacancy(106)
+    item = listing_item(vacancy)
+    record = parser.extract_listing_record(item)
+    detail = parser.extract_record(vacancy)
+    for field in HHDataParser.LISTING_FIELDS:
+        if not field.startswith('snippet_'):
+            assert record[field] == detail[field], field
+    assert record.snippet_requirement == item['snippet']['requirement']
+    assert record.description is None and record.key_skills is None
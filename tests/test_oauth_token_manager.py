@@ -0,0 +1,140 @@
+import threading
+import time
+
+import requests
+
+from parser_hh_token import OAuthTokenManager
+
+
+class FakeResponse:
+    def __init__(self, status_code, data):
+        self.status_code = status_code
+        self.data = data
+        self.text = str(data)
+
+    def json(self):
+        return self.data
+
+
+class SlowTokenClient:
+    '''
+    HTTP-клиент, выдающий новый токен на POST /oauth/token с задержкой delay секунд.
+    '''
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.posts = 0
+        self.gets = 0
+        self.lock = threading.Lock()
+
+    def post(self, url, data=None, headers=None):
+        time.sleep(self.delay)
+        with self.lock:
+            self.posts += 1
+            number = self.posts
+        return FakeResponse(200, {'access_token': f'token-{number}', 'expires_in': 3600,
+                                  'refresh_token': f'refresh-{number}'})
+
+    def get(self, url, params=None, headers=None):
+        self.gets += 1
+        return FakeResponse(200, {})
+
+
+class UnreachableTokenClient(SlowTokenClient):
+    '''
+    HTTP-клиент, у которого сервер авторизации недоступен.
+    '''
+    def post(self, url, data=None, headers=None):
+        with self.lock:
+            self.posts += 1
+        raise requests.ConnectionError('сервер авторизации недоступен')
+
+
+def make_manager(tmp_path, client, expires_in):
+    manager = OAuthTokenManager('id', 'secret', 'token-0', http_client=client,
+                                token_file=str(tmp_path / 'token_info.txt'), refresh_margin=300)
+    manager.loaded = True
+    manager.refresh_token = 'refresh-0'
+    manager.expires_at = time.time() + expires_in
+    return manager
+
+
+def test_valid_token_is_served_from_memory(tmp_path):
+    client = SlowTokenClient()
+    manager = make_manager(tmp_path, client, expires_in=3600)
+    assert manager.get_oauth_token() == 'token-0'
+    assert client.posts == 0
+
+
+def test_background_refresh_does_not_block_callers(tmp_path):
+    # Токен истекает через 100 с (меньше refresh_margin): запускается фоновое обновление длительностью 1 с
+    client = SlowTokenClient(delay=1.0)
+    manager = make_manager(tmp_path, client, expires_in=100)
+    assert manager.get_oauth_token() == 'token-0'
+    # Пока фоновый поток ждет ответа сервера авторизации, остальные вызовы сразу получают текущий токен
+    time.sleep(0.1)
+    for _ in range(5):
+        started = time.perf_counter()
+        assert manager.get_oauth_token() == 'token-0'
+        assert time.perf_counter() - started < 0.1
+
+    manager.background_refresh.join(timeout=5)
+    assert client.posts == 1
+    assert manager.get_oauth_token() == 'token-1'
+    assert (tmp_path / 'token_info.txt').read_text().splitlines()[0] == 'token-1'
+
+
+def test_concurrent_expired_callers_share_one_refresh(tmp_path):
+    client = SlowTokenClient(delay=0.2)
+    manager = make_manager(tmp_path, client, expires_in=-1)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(manager.get_oauth_token())) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == ['token-1'] * 8
+    assert client.posts == 1
+
+
+def test_on_401_skips_refresh_if_token_already_replaced(tmp_path):
+    client = SlowTokenClient()
+    manager = make_manager(tmp_path, client, expires_in=3600)
+    assert manager.on_401('token-0') == 'token-1'
+    # Другой поток получил 401 со старым токеном уже после обновления
+    assert manager.on_401('token-0') == 'token-1'
+    assert client.posts == 1
+
+
+def test_token_without_known_expiry_is_rechecked_not_replaced(tmp_path):
+    client = SlowTokenClient()
+    manager = OAuthTokenManager('id', 'secret', 'token-0', http_client=client,
+                                token_file=str(tmp_path / 'token_info.txt'), validation_ttl=600)
+    assert manager.get_oauth_token() == 'token-0'
+    assert client.gets == 1
+    assert manager.expires_at == 0
+    # Повторные вызовы в пределах validation_ttl не обращаются к API и не запускают фоновое обновление
+    assert manager.get_oauth_token() == 'token-0'
+    assert client.gets == 1 and manager.background_refresh is None
+
+    # Срок проверки истек: токен проверяется через /me снова, а не заменяется новым
+    manager.validated_until = time.time() - 1
+    assert manager.get_oauth_token() == 'token-0'
+    assert client.gets == 2
+    assert client.posts == 0
+
+
+def test_unreachable_auth_server_keeps_current_token(tmp_path):
+    client = UnreachableTokenClient()
+    manager = make_manager(tmp_path, client, expires_in=-1)
+    assert manager.get_oauth_token() == 'token-0'
+    assert client.posts == 1
+
+
+def test_background_refresh_logs_network_errors(tmp_path, caplog):
+    client = UnreachableTokenClient()
+    manager = make_manager(tmp_path, client, expires_in=100)
+    assert manager.get_oauth_token() == 'token-0'
+    manager.background_refresh.join(timeout=5)
+    assert client.posts == 1
+    assert 'сервер авторизации недоступен' in caplog.text
+    assert manager.get_oauth_token() == 'token-0'
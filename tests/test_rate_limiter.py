@@ -0,0 +1,72 @@
+import threading
+import time
+
+import pytest
+
+from parser_hh_token import AdaptiveRateLimiter, RateLimiter, RetryPolicy, RetryQueue
+
+
+def test_token_bucket_limits_rate_across_threads():
+    limiter = RateLimiter(rate=50, burst=5)
+    started = time.monotonic()
+    threads = [threading.Thread(target=lambda: [limiter.acquire() for _ in range(5)]) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # 20 запросов: 5 сразу (всплеск) и 15 с частотой 50 в секунду
+    assert time.monotonic() - started >= 0.25
+
+
+def test_reservations_are_served_in_order():
+    limiter = RateLimiter(rate=10, burst=1)
+    waits = [limiter.reserve() for _ in range(4)]
+    assert waits[0] == 0.0
+    assert waits[1:] == sorted(waits[1:])
+    assert waits[3] == pytest.approx(0.3, abs=0.01)
+
+
+def test_adaptive_limiter_backs_off_and_recovers():
+    limiter = AdaptiveRateLimiter(rate=8, min_rate=1, decrease_factor=0.5, increase_step=1, success_threshold=2,
+                                  cooldown=60)
+    limiter.on_throttle(retry_after=2)
+    assert limiter.rate == 4
+    # Ответы 429 на уже отправленные запросы частоту повторно не снижают
+    limiter.on_throttle()
+    assert limiter.rate == 4
+    # Выдача токенов приостановлена на Retry-After
+    assert limiter.reserve() >= 2
+    for _ in range(4):
+        limiter.on_success()
+    assert limiter.rate == 6
+    for _ in range(10):
+        limiter.on_success()
+    assert limiter.rate == 8
+
+
+def test_retry_policy_delays():
+    policy = RetryPolicy(base_delay=1, max_delay=10)
+    assert policy.parse_retry_after({'Retry-After': '3'}) == 3
+    assert policy.parse_retry_after({'Retry-After': 'Wed, 21 Oct 2015 07:28:00 GMT'}) is None
+    assert policy.get_delay(0, retry_after=30) == 10
+    assert all(0 <= policy.get_delay(attempt) <= min(10, 2 ** attempt) for attempt in range(8) for _ in range(20))
+
+
+def test_retry_queue_returns_ready_items_first():
+    queue = RetryQueue()
+    queue.push('retry', attempt=1, delay=0.05)
+    queue.push('first')
+    queue.push('second')
+    assert [queue.pop() for _ in range(3)] == [('first', 0), ('second', 0), ('retry', 1)]
+
+
+def test_fetcher_retries_throttled_requests(workdir, mock_fetcher):
+    limiter = AdaptiveRateLimiter(rate=1000, cooldown=0)
+    api, fetcher = mock_fetcher(found=20, regions=1, server=dict(error_rate=0.3, retry_after=0, seed=7),
+                                rate_limiter=limiter, retry_policy=RetryPolicy(max_retries=20, base_delay=0.01))
+    fetcher.fetch_data()
+    fetcher.fetch_vacancy_details()
+    assert api.counts['/vacancies/{id}'] == 20
+    assert api.counts['/vacancies/{id} 429'] > 0
+    assert limiter.rate < 1000
+    assert len(list((workdir / 'docs' / 'vacancies').glob('*.json'))) == 20
@@ -0,0 +1,71 @@
+import json
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+from parser_hh_token import RawSegmentStore, fcntl, zstandard
+
+
+def test_append_get_and_overwrite(tmp_path):
+    store = RawSegmentStore(str(tmp_path), block_records=3)
+    for i in range(10):
+        store.append(i, json.dumps({'id': i}))
+    # Запись из незаписанного блока читается из памяти
+    assert json.loads(store.get(9)) == {'id': 9}
+    store.append(4, '{"id": 4,\n "v": 2}')
+    store.close()
+
+    store = RawSegmentStore(str(tmp_path))
+    assert len(store) == 10
+    assert json.loads(store.get(4)) == {'id': 4, 'v': 2}
+    assert store.get('missing') is None
+    assert sorted(int(record_id) for record_id, _ in store.iter_records()) == list(range(10))
+    store.close()
+
+
+def test_segments_roll_over(tmp_path):
+    store = RawSegmentStore(str(tmp_path), block_records=1, segment_size=200)
+    for i in range(20):
+        store.append(i, json.dumps({'id': i, 'text': 'x' * 100}))
+    store.close()
+    assert len(list(tmp_path.glob('segment-*'))) > 1
+    store = RawSegmentStore(str(tmp_path))
+    assert all(json.loads(store.get(i))['id'] == i for i in range(20))
+    store.close()
+
+
+@pytest.mark.skipif(zstandard is None, reason='нужен пакет zstandard')
+def test_zstd_codec(tmp_path):
+    store = RawSegmentStore(str(tmp_path), codec='zstd')
+    store.append('a', '{}')
+    store.close()
+    assert RawSegmentStore(str(tmp_path)).get('a') == '{}'
+
+
+def write_records(folder, worker, count):
+    store = RawSegmentStore(folder, block_records=7, segment_size=4096)
+    for i in range(count):
+        store.append(f'{worker}-{i}', json.dumps({'worker': worker, 'i': i, 'text': 'y' * 50}))
+    store.close()
+    return count
+
+
+@pytest.mark.skipif(fcntl is None, reason='межпроцессная запись требует fcntl')
+def test_concurrent_writers_from_several_processes(tmp_path):
+    with ProcessPoolExecutor(max_workers=4) as executor:
+        total = sum(executor.map(write_records, [str(tmp_path)] * 4, range(4), [300] * 4))
+    store = RawSegmentStore(str(tmp_path))
+    assert len(store) == total
+    for worker in range(4):
+        for i in range(300):
+            assert json.loads(store.get(f'{worker}-{i}')) == {'worker': worker, 'i': i, 'text': 'y' * 50}
+    store.close()
+
+
+def test_get_sees_records_written_by_another_store(tmp_path):
+    reader = RawSegmentStore(str(tmp_path))
+    writer = RawSegmentStore(str(tmp_path))
+    writer.append('late', '{"id": "late"}')
+    writer.close()
+    assert reader.get('late') == '{"id": "late"}'
+    reader.close()
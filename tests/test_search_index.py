@@ -0,0 +1,75 @@
+import pytest
+
+from parser_hh_token import VacancySearchIndex, normalize_salary
+
+
+def vacancy(vacancy_id, name, description='', skills=(), employer='', area_id='1', experience_id='noExperience',
+            salary=None):
+    return {'id': vacancy_id, 'name': name, 'description': description, 'key_skills': list(skills),
+            'employer_name': employer, 'area_id': area_id, 'experience_id': experience_id, 'salary': salary}
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = VacancySearchIndex(str(tmp_path / 'search.sqlite'), batch_size=2)
+    index.add_many([
+        vacancy('1', 'Аналитик данных', 'SQL и Python, построение отчетов', ['SQL', 'Power BI'], 'Рога и копыта',
+                salary={'from': 100000, 'to': 150000, 'currency': 'RUR', 'gross': False}),
+        vacancy('2', 'Python разработчик', 'Разработка сервисов на Django', ['Python', 'Django'], 'Яндекс',
+                area_id='2', experience_id='between1And3',
+                salary={'from': 2000, 'currency': 'USD', 'gross': True}),
+        vacancy('3', 'Data Scientist', 'Machine learning, Python', ['Machine Learning', 'Python'], 'Сбер'),
+        vacancy('10', 'Ведущий аналитик', 'Аналитика данных, SQL', ['SQL'], 'Сбер', area_id='2'),
+    ])
+    yield index
+    index.close()
+
+
+def test_query_parser_tokens(index):
+    assert index.parse_query('name:аналитик AND (sql OR "power bi") NOT skill:python') == [
+        ('term', 'name', 'аналитик'), ('op', 'AND'), ('(',), ('term', None, 'sql'), ('op', 'OR'),
+        ('term', None, 'power bi'), (')',), ('op', 'NOT'), ('term', 'skill', 'python')]
+    with pytest.raises(ValueError):
+        index.search('(sql')
+    with pytest.raises(ValueError):
+        index.search('unknown:sql')
+
+
+def test_boolean_phrase_and_field_queries(index):
+    assert index.search('python') == ['3', '2', '1']
+    assert index.search('python NOT django') == ['3', '1']
+    assert index.search('name:аналитик OR employer:яндекс') == ['10', '2', '1']
+    assert index.search('"machine learning"') == ['3']
+    assert index.search('"learning machine"') == []
+    # Фраза не совпадает на стыке двух навыков
+    assert index.search('skill:"sql power"') == []
+    assert index.search('skill:"power bi"') == ['1']
+
+
+def test_filters(index):
+    assert index.search(area_id='2') == ['10', '2']
+    assert index.search('python', experience_id=['between1And3']) == ['2']
+    # 2000 USD до вычета налогов: 2000 / 0.011 * 0.87 руб. на руки
+    assert index.search(salary_from=150000) == ['2']
+    assert index.search(salary_to=130000) == ['1']
+    assert index.search(limit=2) == ['10', '3']
+
+
+def test_order_is_stable_across_updates_and_optimize(index, tmp_path):
+    before = index.search('python OR sql')
+    index.add(vacancy('1', 'Аналитик данных', 'SQL и Python, построение отчетов и дашбордов', ['SQL']))
+    after_update = index.search('python OR sql')
+    index.optimize()
+    assert before == after_update == index.search('python OR sql') == ['10', '3', '2', '1']
+    index.close()
+    reopened = VacancySearchIndex(str(tmp_path / 'search.sqlite'))
+    assert reopened.search('python OR sql') == before
+    assert reopened.search('дашбордов') == ['1']
+
+
+def test_normalize_salary():
+    rates = {'RUR': 1.0, 'USD': 0.01}
+    assert normalize_salary({'from': 100, 'to': 200, 'currency': 'RUR'}, rates) == 150
+    assert normalize_salary({'to': 10, 'currency': 'USD', 'gross': True}, rates) == pytest.approx(870)
+    assert normalize_salary({'from': 100, 'currency': 'XXX'}, rates) is None
+    assert normalize_salary(None, rates) is None
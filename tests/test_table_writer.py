@@ -0,0 +1,65 @@
+import pytest
+
+from parser_hh_token import FieldSpec, HHDataParser, VacancyTableWriter, pa, pq
+from corpus import synthetic_vacancy
+
+pytestmark = pytest.mark.skipif(pa is None, reason='нужен pyarrow')
+
+ADDRESS = {
+    'id': '7', 'city': 'Москва', 'street': 'Тверская', 'building': '1', 'description': 'офис',
+    'lat': 55.76, 'lng': 37.61, 'raw': 'Москва, Тверская, 1',
+    'metro': {'station_id': '1.1', 'station_name': 'Охотный ряд', 'line_id': '1', 'line_name': 'Сокольническая',
+              'lat': 55.75, 'lng': 37.61},
+    'metro_stations': [{'station_id': '1.1', 'station_name': 'Охотный ряд', 'line_id': '1',
+                        'line_name': 'Сокольническая', 'lat': 55.75, 'lng': 37.61}],
+}
+CONTACTS = {
+    'name': 'Иван', 'email': 'hr@example.com',
+    'phones': [{'country': '7', 'city': '495', 'number': '1234567', 'comment': 'с 10 до 18'}],
+}
+
+
+def read(path, format):
+    if format == 'parquet':
+        return pq.read_table(path)
+    with pa.ipc.open_file(path) as reader:
+        return reader.read_all()
+
+
+@pytest.mark.parametrize('format', ['parquet', 'arrow'])
+def test_nested_address_and_contacts_roundtrip(workdir, format):
+    parser = HHDataParser()
+    vacancy = synthetic_vacancy(201)
+    vacancy['address'], vacancy['contacts'] = ADDRESS, CONTACTS
+    records = [parser.extract_record(vacancy), parser.extract_record(synthetic_vacancy(202))]
+    path = workdir / f'vacancies.{format}'
+    with VacancyTableWriter(path, format) as writer:
+        assert writer.write(parser.record_class.columns(records)) == 2
+    rows = read(path, format).to_pylist()
+    assert rows[0]['address'] == ADDRESS
+    assert rows[0]['contacts'] == CONTACTS
+    assert rows[1]['address'] is None and rows[1]['contacts'] is None
+
+
+def test_unknown_column_with_only_none_in_first_batch(workdir):
+    parser = HHDataParser(field_spec=[FieldSpec('logo_url', 'employer.logo_urls.original')])
+    first, second = synthetic_vacancy(301), synthetic_vacancy(302)
+    del first['employer']['logo_urls']
+    path = workdir / 'vacancies.parquet'
+    with VacancyTableWriter(path, 'parquet', parser.field_spec) as writer:
+        writer.write(parser.record_class.columns([parser.extract_record(first)]))
+        writer.write(parser.record_class.columns([parser.extract_record(second)]))
+    table = pq.read_table(path)
+    assert table.schema.field('logo_url').type == pa.string()
+    assert table['logo_url'].to_pylist() == [None, second['employer']['logo_urls']['original']]
+
+
+def test_field_spec_type_sets_column_type(workdir):
+    parser = HHDataParser(field_spec=[FieldSpec('area_code', 'area.id', type=int)])
+    vacancy = synthetic_vacancy(401)
+    path = workdir / 'vacancies.arrow'
+    with VacancyTableWriter(path, 'arrow', parser.field_spec) as writer:
+        writer.write(parser.record_class.columns([parser.extract_record(vacancy)]))
+    table = read(path, 'arrow')
+    assert table.schema.field('area_code').type == pa.int64()
+    assert table['area_code'].to_pylist() == [int(vacancy['area']['id'])]
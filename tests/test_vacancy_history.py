@@ -0,0 +1,29 @@
+from parser_hh_token import VacancyHistory
+
+
+def test_history_is_opt_in(workdir, mock_fetcher):
+    api, fetcher = mock_fetcher(found=10, regions=1)
+    assert fetcher.history is None
+    assert not (workdir / 'docs' / 'vacancy_history.sqlite').exists()
+    _, fetcher = mock_fetcher(api=api, keep_history=True)
+    assert isinstance(fetcher.history, VacancyHistory)
+
+
+def test_revisions_store_deltas_and_ignore_volatile_fields(tmp_path):
+    history = VacancyHistory(str(tmp_path / 'history.sqlite'), snapshot_every=3)
+    base = {'id': '1', 'name': 'Python', 'salary': {'from': 100}, 'counters': {'responses': 1}}
+    revisions = [base, dict(base, counters={'responses': 5}), dict(base, name='Go'),
+                 {key: value for key, value in base.items() if key != 'salary'}]
+    for data in revisions:
+        stable, content_hash = VacancyHistory.normalize(data)
+        history.record('1', stable, content_hash=content_hash)
+    history.flush()
+
+    # Изменение только счетчиков не дает новой ревизии
+    assert len(history.revisions('1')) == 3
+    assert history.get_revision('1', 2)['name'] == 'Go'
+    assert 'salary' not in history.get_revision('1', 3)
+    assert [value for _, _, value in history.field_history('1', 'name')][:2] == ['Python', 'Go']
+    kinds = [row[3] for row in history.rows('1')]
+    assert kinds[0] == 'full' and 'delta' in kinds
+    history.close()
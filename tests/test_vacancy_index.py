@@ -0,0 +1,65 @@
+import pytest
+
+from parser_hh_token import AsyncHHDataFetcher, HHDataFetcher, VacancyIndex, aiohttp
+
+
+def listing(vacancy_id, name='Python'):
+    return {'id': vacancy_id, 'url': f'https://api.hh.ru/vacancies/{vacancy_id}', 'name': name,
+            'published_at': '2024-01-01T00:00:00+0300', 'counters': {'responses': 1}}
+
+
+def test_needs_fetch_follows_listing_changes(tmp_path):
+    index = VacancyIndex(str(tmp_path / 'index.sqlite'), vacancies_folder=None)
+    item = listing('1')
+    assert index.needs_fetch(item)
+    index.mark_fetched(item, b'{"id": "1"}')
+    assert not index.needs_fetch(item)
+    # Изменчивые поля выдачи не учитываются
+    assert not index.needs_fetch(dict(item, counters={'responses': 7}))
+    assert index.needs_fetch(listing('1', name='Go'))
+
+
+def test_gone_vacancy_is_not_fetched_again(tmp_path):
+    index = VacancyIndex(str(tmp_path / 'index.sqlite'), vacancies_folder=None)
+    index.mark_fetched(listing('1'), b'{"id": "1"}')
+    content_hash = index.entries['1'][2]
+    index.mark_fetched(listing('1'), None, status=404)
+    assert index.entries['1'][2] == content_hash
+    assert not index.needs_fetch(listing('1'))
+    assert index.needs_fetch(listing('1', name='Go'))
+
+    # Временные ошибки повторяются при следующем запуске
+    index.mark_fetched(listing('2'), None, status=503)
+    assert index.needs_fetch(listing('2'))
+
+    index.close()
+    reopened = VacancyIndex(str(tmp_path / 'index.sqlite'), vacancies_folder=None)
+    assert reopened.entries['1'][3] == 404 and not reopened.needs_fetch(listing('1'))
+
+
+def crawl(fetcher):
+    fetcher.fetch_data()
+    fetcher.fetch_vacancy_details()
+    fetcher.vacancy_index.close()
+
+
+def check_gone_vacancies(mock_fetcher, fetcher_class):
+    gone = {'10000003', '10000007'}
+    api, fetcher = mock_fetcher(found=10, regions=1, server=dict(gone=gone), fetcher_class=fetcher_class)
+    crawl(fetcher)
+    assert api.counts['/vacancies/{id} 404'] == 2
+    assert api.counts['/vacancies/{id}'] == 8
+    crawl(mock_fetcher(api=api, fetcher_class=fetcher_class)[1])
+    assert api.counts['/vacancies/{id} 404'] == 2
+    assert api.counts['/vacancies/{id}'] == 8
+    index = VacancyIndex(vacancies_folder=None)
+    assert {vacancy_id for vacancy_id, entry in index.entries.items() if entry[3] == 404} == gone
+
+
+def test_sync_fetcher_records_gone_vacancies(mock_fetcher):
+    check_gone_vacancies(mock_fetcher, HHDataFetcher)
+
+
+@pytest.mark.skipif(aiohttp is None, reason='нужен пакет aiohttp')
+def test_async_fetcher_records_gone_vacancies(mock_fetcher):
+    check_gone_vacancies(mock_fetcher, AsyncHHDataFetcher)